@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Mide el rendimiento de yt-dlp con distintos ajustes de fragmentos y bloques.
+
+Genera con ffmpeg un vídeo sintético en HLS, DASH y MP4 progresivo, lo sirve
+desde un servidor HTTP local (con latencia y límite de velocidad por conexión
+opcionales para imitar el enlace real) y lo descarga con cada combinación de
+``concurrent_fragment_downloads``, ``http_chunk_size`` y ``buffersize``. Los
+valores ganadores se trasladan a ``YTDLP_CONCURRENT_FRAGMENTS``,
+``YTDLP_HTTP_CHUNK_SIZE``, ``YTDLP_BUFFER_SIZE`` o ``YTDLP_DOWNLOAD_TUNING``.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp  # noqa: E402
+
+from vhs.main import (  # noqa: E402
+    AUDIO_FORMAT_PROFILES,
+    FFMPEG_BINARY,
+    VIDEO_FORMAT_PROFILES,
+    download_tuning_options,
+)
+
+KINDS = {
+    "hls": "hls/stream.m3u8",
+    "dash": "dash/stream.mpd",
+    "progressive": "progressive/stream.mp4",
+}
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class ThrottledRequestHandler(SimpleHTTPRequestHandler):
+    """Sirve archivos estáticos con Range, latencia y límite de velocidad."""
+
+    extensions_map = {
+        **SimpleHTTPRequestHandler.extensions_map,
+        ".m3u8": "application/vnd.apple.mpegurl",
+        ".mpd": "application/dash+xml",
+        ".m4s": "video/iso.segment",
+        ".ts": "video/mp2t",
+    }
+    latency = 0.0
+    rate = 0  # bytes/s por conexión; 0 = sin límite
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, *, send_body: bool) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        match = RANGE_PATTERN.fullmatch(self.headers.get("Range", "").strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), size - 1)
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if not send_body:
+            return
+
+        block = 64 * 1024
+        remaining = end - start + 1
+        with path.open("rb") as handle:
+            handle.seek(start)
+            while remaining > 0:
+                data = handle.read(min(block, remaining))
+                if not data:
+                    break
+                began = time.monotonic()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                remaining -= len(data)
+                if self.rate:
+                    pause = len(data) / self.rate - (time.monotonic() - began)
+                    if pause > 0:
+                        time.sleep(pause)
+
+
+def parse_sizes(raw: str) -> List[int]:
+    values = []
+    for item in raw.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        factor = 1
+        if item[-1] in "km":
+            factor = 1024 if item[-1] == "k" else 1024 * 1024
+            item = item[:-1]
+        values.append(int(float(item) * factor))
+    return values
+
+
+def generate_media(root: Path, duration: int, bitrate: str) -> None:
+    source = [
+        FFMPEG_BINARY,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc2=size=1280x720:rate=30:duration={duration}",
+        "-an",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-b:v",
+        bitrate,
+        "-maxrate",
+        bitrate,
+        "-bufsize",
+        bitrate,
+        "-g",
+        "60",
+    ]
+    outputs = {
+        "hls": ["-f", "hls", "-hls_time", "2", "-hls_playlist_type", "vod"],
+        "dash": ["-f", "dash", "-seg_duration", "2"],
+        "progressive": ["-movflags", "+faststart"],
+    }
+    for kind, args in outputs.items():
+        target = root / KINDS[kind]
+        target.parent.mkdir(parents=True, exist_ok=True)
+        subprocess.run([*source, *args, str(target)], check=True)
+
+
+def run_download(url: str, options: Dict[str, int]) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory(prefix="vhs-bench-") as tmp:
+        ydl_opts = {
+            "quiet": True,
+            "noprogress": True,
+            "no_warnings": True,
+            "noplaylist": True,
+            "outtmpl": str(Path(tmp) / "out.%(ext)s"),
+            "overwrites": True,
+            "retries": 0,
+            # Solo se mide la descarga: sin correcciones posteriores con ffmpeg.
+            "fixup": "never",
+            **options,
+        }
+        started = time.perf_counter()
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([url])
+        elapsed = time.perf_counter() - started
+        size = sum(item.stat().st_size for item in Path(tmp).iterdir() if item.is_file())
+    return {"seconds": elapsed, "bytes": size, "mbps": size * 8 / elapsed / 1_000_000}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kinds", default="hls,dash,progressive", help="Tipos de fuente a medir.")
+    parser.add_argument("--fragments", default="1,4,8", help="Valores de concurrent_fragment_downloads.")
+    parser.add_argument(
+        "--chunk-sizes",
+        default="0,1m,10m",
+        help="Valores de http_chunk_size (admite sufijos k/m; 0 = sin bloques).",
+    )
+    parser.add_argument("--buffer-sizes", default="1k,64k", help="Valores de buffersize (admite k/m).")
+    parser.add_argument("--duration", type=int, default=60, help="Segundos del vídeo sintético (por defecto 60).")
+    parser.add_argument("--bitrate", default="4M", help="Bitrate del vídeo sintético (por defecto 4M).")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=50,
+        help="Latencia añadida a cada petición en milisegundos (por defecto 50).",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="Límite por conexión en KiB/s (0 = sin límite).",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por combinación; se usa la mediana.")
+    parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON.")
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        parser.error(f"Tipos desconocidos: {', '.join(unknown)}")
+    fragments = [max(1, int(value)) for value in args.fragments.split(",") if value.strip()]
+    chunk_sizes = parse_sizes(args.chunk_sizes)
+    buffer_sizes = parse_sizes(args.buffer_sizes)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="vhs-bench-media-") as media_dir:
+        root = Path(media_dir)
+        print(f"Generando {args.duration} s de vídeo sintético a {args.bitrate}...", file=sys.stderr)
+        generate_media(root, args.duration, args.bitrate)
+
+        handler = type(
+            "BenchmarkHandler",
+            (ThrottledRequestHandler,),
+            {"latency": args.latency / 1000, "rate": int(args.rate * 1024)},
+        )
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(root)))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            for kind in kinds:
+                url = f"{base_url}/{KINDS[kind]}"
+                for fragment_count, chunk_size, buffer_size in itertools.product(
+                    fragments, chunk_sizes, buffer_sizes
+                ):
+                    options = {"concurrent_fragment_downloads": fragment_count, "buffersize": buffer_size}
+                    if chunk_size:
+                        options["http_chunk_size"] = chunk_size
+                    runs = sorted(
+                        (run_download(url, options) for _ in range(max(1, args.repeat))),
+                        key=lambda item: item["seconds"],
+                    )
+                    median = runs[len(runs) // 2]
+                    results.append(
+                        {
+                            "kind": kind,
+                            "concurrent_fragment_downloads": fragment_count,
+                            "http_chunk_size": chunk_size,
+                            "buffersize": buffer_size,
+                            **median,
+                        }
+                    )
+                    if not args.json:
+                        print(
+                            f"{kind:<12} fragmentos={fragment_count:<3} bloque={chunk_size:<10} "
+                            f"búfer={buffer_size:<8} {median['seconds']:7.2f} s "
+                            f"{median['mbps']:8.1f} Mbit/s"
+                        )
+        finally:
+            server.shutdown()
+
+    current = {
+        name: download_tuning_options(name)
+        for name in (*VIDEO_FORMAT_PROFILES, *AUDIO_FORMAT_PROFILES)
+    }
+    if args.json:
+        print(json.dumps({"results": results, "current": current}, indent=2, ensure_ascii=False))
+        return 0
+
+    print()
+    for kind in kinds:
+        candidates = [item for item in results if item["kind"] == kind]
+        if candidates:
+            best = max(candidates, key=lambda item: item["mbps"])
+            print(
+                f"Mejor {kind}: fragmentos={best['concurrent_fragment_downloads']} "
+                f"bloque={best['http_chunk_size']} búfer={best['buffersize']} "
+                f"({best['mbps']:.1f} Mbit/s)"
+            )
+    print("Configuración actual por perfil:")
+    for name, options in current.items():
+        print(f"  {name}: {json.dumps(options)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Recoloca una caché plana en el diseño fragmentado (``ab/cd/<clave>``).
+
+Se puede ejecutar con el servicio en marcha: los lectores localizan cada
+archivo tanto en la ruta fragmentada como en la plana mientras dura la
+migración. Usa las mismas variables de entorno que el servicio
+(``CACHE_DIR``, ``CACHE_SHARD_DEPTH``...).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vhs.main import CACHE_DIR, CACHE_SHARD_DEPTH, migrate_cache_layout  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--min-age",
+        type=float,
+        default=60,
+        help="Segundos sin modificar antes de mover un archivo (por defecto 60).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Solo cuenta los archivos que se moverían.",
+    )
+    args = parser.parse_args()
+
+    print(f"Migrando {CACHE_DIR} a profundidad {CACHE_SHARD_DEPTH}...")
+    counts = migrate_cache_layout(min_age_seconds=args.min_age, dry_run=args.dry_run)
+    label = "Por mover" if args.dry_run else "Movidos"
+    print(
+        f"{label}: {counts['moved']} · ya en su sitio: {counts['already']} · "
+        f"omitidos: {counts['skipped']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
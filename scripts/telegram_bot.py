@@ -22,16 +22,14 @@ from telegram.ext import (
 )
 
 from vhs.main import (
-    CACHE_DIR,
     FFMPEG_PRESETS,
     YTDLP_CACHE_DIR,
+    cache_file_path,
     download_media,
     ensure_storage_ready,
-    extract_audio_profile_from_file,
     generate_transcription_file,
-    transcribe_audio_file,
-    translate_transcription_payload,
     render_transcription_payload,
+    transcribe_local_file,
 )
 from openai import OpenAI
 
@@ -229,25 +227,18 @@ async def handle_transcribe(
 ) -> None:
     def _transcribe() -> Path:
         ensure_storage_ready()
+        output_format = "transcript_translate_text" if translate else "transcript_text"
         if payload["type"] == "url":
-            file_path, _ = generate_transcription_file(payload["value"], "transcript_text")
-            if translate:
-                source_text = file_path.read_text(encoding="utf-8")
-                translated_payload = translate_transcription_payload({"text": source_text})
-                translated_text = render_transcription_payload(
-                    translated_payload, "transcript_text"
-                )
-                translated_path = CACHE_DIR / f"telebot_{file_path.stem}_es.txt"
-                translated_path.write_text(translated_text.decode("utf-8"), encoding="utf-8")
-                return translated_path
+            file_path, _ = generate_transcription_file(payload["value"], output_format)
             return file_path
+        # Los archivos reenviados se cachean por contenido: el mismo archivo
+        # no se vuelve a transcribir ni a traducir.
         source_path = Path(payload["value"])
-        audio_path = extract_audio_profile_from_file(source_path, "audio_med")
-        transcript = transcribe_audio_file(audio_path, "transcript_text")
-        if translate:
-            transcript = translate_transcription_payload(transcript)
-        text = render_transcription_payload(transcript, "transcript_text")
-        out = CACHE_DIR / f"telebot_{source_path.stem}.txt"
+        transcript, _ = transcribe_local_file(
+            source_path, output_format, title=source_path.stem
+        )
+        text = render_transcription_payload(transcript, output_format)
+        out = cache_file_path(f"telebot_{source_path.stem}.txt", create=True)
         out.write_text(text.decode("utf-8"), encoding="utf-8")
         return out
 
@@ -1,18 +1,38 @@
+import asyncio
+import base64
+import copy
+import functools
 import hashlib
+import ipaddress
 import json
 import os
+import queue
 import random
 import re
 import unicodedata
+import uuid
 import shutil
+import zipfile
+import sqlite3
 import subprocess
 import sys
+import tarfile
 import tempfile
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, closing, contextmanager, suppress
 from datetime import datetime, timedelta, timezone
+from heapq import heapify, heappop, heappush
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-from urllib.parse import quote
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - plataformas sin flock (Windows)
+    fcntl = None  # type: ignore[assignment]
 
 import certifi
 from dotenv import load_dotenv
@@ -28,7 +48,13 @@ from fastapi import (
     UploadFile,
 )
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -56,8 +82,88 @@ CACHE_DIR = Path(os.getenv("CACHE_DIR", "data/cache"))
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 META_DIR = CACHE_DIR / "_meta"
 META_DIR.mkdir(parents=True, exist_ok=True)
+LOCK_DIR = CACHE_DIR / "_locks"
+LOCK_DIR.mkdir(parents=True, exist_ok=True)
+# Niveles de subdirectorios por prefijo de hash (``ab/cd/<clave>``) para datos
+# y metadatos; 0 mantiene el diseño plano heredado.
+CACHE_SHARD_DEPTH = max(0, min(4, int(os.getenv("CACHE_SHARD_DEPTH", "2") or 0)))
 YTDLP_CACHE_DIR = Path(os.getenv("YTDLP_CACHE_DIR", CACHE_DIR / "yt_dlp_cache"))
 CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 60 * 60 * 24))
+# Backend del catálogo de metadatos: "json" (un fichero por entrada en _meta)
+# o "sqlite" (catálogo compartido en WAL, apto para varios workers).
+CACHE_CATALOG_BACKEND = os.getenv("CACHE_CATALOG_BACKEND", "json").strip().lower() or "json"
+CACHE_CATALOG_PATH = Path(os.getenv("CACHE_CATALOG_PATH", CACHE_DIR / "_catalog.sqlite3"))
+# Presupuesto de bytes de la caché (0 = sin límite) y política de expulsión.
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", "0") or 0)
+CACHE_EVICTION_POLICY = os.getenv("CACHE_EVICTION_POLICY", "lru").strip().lower() or "lru"
+# Intervalo mínimo entre escrituras a disco de los accesos (recencia y
+# frecuencia) de una misma entrada del catálogo JSON; en memoria son exactos.
+CACHE_ACCESS_PERSIST_SECONDS = max(0.0, float(os.getenv("CACHE_ACCESS_PERSIST_SECONDS", "60")))
+# Resolver la identidad canónica (extractor, id) con una extracción plana de
+# yt-dlp cuando las reglas de URL no la reconocen.
+MEDIA_IDENTITY_EXTRACT_FALLBACK = os.getenv(
+    "MEDIA_IDENTITY_EXTRACT_FALLBACK", "true"
+).strip().lower() in {"1", "true", "yes", "on"}
+# Barrido de expiraciones en segundo plano (0 desactiva el barrido periódico).
+CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "60"))
+CACHE_SWEEP_BATCH_SIZE = max(1, int(os.getenv("CACHE_SWEEP_BATCH_SIZE", "200")))
+# Caché de consultas (probe y búsqueda): TTL de cada tipo (0 la desactiva) y
+# número de resultados que se guardan también en memoria.
+PROBE_CACHE_TTL_SECONDS = float(os.getenv("PROBE_CACHE_TTL_SECONDS", "1800"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "900"))
+LOOKUP_CACHE_MEMORY_ITEMS = max(0, int(os.getenv("LOOKUP_CACHE_MEMORY_ITEMS", "512")))
+LOOKUP_CACHE_DIR = CACHE_DIR / "_lookups"
+# Descargas parciales de yt-dlp (.part, estado de fragmentos) por clave de caché:
+# se reanudan en el siguiente intento y se reclaman tras este tiempo sin tocar.
+PARTIAL_DIR = CACHE_DIR / "_partial"
+PARTIAL_MAX_AGE_SECONDS = float(os.getenv("PARTIAL_MAX_AGE_SECONDS", "86400"))
+# Trabajos asíncronos (/api/jobs): cuántos se ejecutan a la vez por worker y
+# cuántos segundos se conserva el estado de los terminados.
+JOB_MAX_CONCURRENCY = max(1, int(os.getenv("JOB_MAX_CONCURRENCY", "4")))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+JOBS_DIR = CACHE_DIR / "_jobs"
+# Progreso de los trabajos: intervalo mínimo entre escrituras del estado y
+# frecuencia con la que /api/jobs/{id}/events lo consulta.
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.getenv("JOB_PROGRESS_INTERVAL_SECONDS", "0.5"))
+# Lotes (/api/batch): URLs máximas por petición y descargas sin caché que un
+# lote ejecuta a la vez (los aciertos de caché no esperan a este límite).
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = max(1, int(os.getenv("BATCH_CONCURRENCY", "4")))
+# Listas y canales (/api/jobs con playlist=true): entradas máximas por trabajo y
+# entradas que se procesan a la vez dentro de cada trabajo.
+PLAYLIST_MAX_ENTRIES = max(1, int(os.getenv("PLAYLIST_MAX_ENTRIES", "200")))
+PLAYLIST_CONCURRENCY = max(1, int(os.getenv("PLAYLIST_CONCURRENCY", "3")))
+# Límites de concurrencia por recurso: descargas/extracciones de yt-dlp, procesos
+# ffmpeg (por defecto la mitad de los núcleos), llamadas al API de
+# transcripción/traducción y trabajo de disco de los endpoints ligeros.
+NETWORK_CONCURRENCY = int(os.getenv("NETWORK_CONCURRENCY", "4"))
+FFMPEG_CONCURRENCY = int(
+    os.getenv("FFMPEG_CONCURRENCY", "") or max(1, (os.cpu_count() or 2) // 2)
+)
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+FILESYSTEM_CONCURRENCY = int(os.getenv("FILESYSTEM_CONCURRENCY", "16"))
+# Planificador por carriles: trabajos pesados simultáneos (web y api) y cupo
+# adicional reservado al carril rápido (aciertos de caché y consultas).
+SCHEDULER_SLOTS = max(1, int(os.getenv("SCHEDULER_SLOTS", "8")))
+SCHEDULER_FAST_SLOTS = max(0, int(os.getenv("SCHEDULER_FAST_SLOTS", "4")))
+# Proxies de confianza (IPs o redes CIDR separadas por comas) cuyo
+# X-Forwarded-For identifica al cliente; sin ellos se usa la IP remota.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(item.strip(), strict=False)
+    for item in os.getenv("TRUSTED_PROXIES", "").split(",")
+    if item.strip()
+]
+# Reutilizar el info_dict de un probe o de otra descarga de la misma fuente
+# (0 lo desactiva) y margen mínimo antes de que caduquen sus URLs de formato.
+INFO_DICT_CACHE_TTL_SECONDS = float(os.getenv("INFO_DICT_CACHE_TTL_SECONDS", "1800"))
+INFO_DICT_EXPIRY_MARGIN_SECONDS = float(os.getenv("INFO_DICT_EXPIRY_MARGIN_SECONDS", "600"))
+# Caché negativa: segundos que se recuerda un fallo de origen según su clase
+# (0 desactiva la clase).
+NEGATIVE_CACHE_TTLS = {
+    "permanent": float(os.getenv("NEGATIVE_CACHE_TTL_PERMANENT_SECONDS", "3600")),
+    "transient": float(os.getenv("NEGATIVE_CACHE_TTL_TRANSIENT_SECONDS", "30")),
+    "bot_check": float(os.getenv("NEGATIVE_CACHE_TTL_BOT_CHECK_SECONDS", "600")),
+}
 USAGE_LOG_PATH = Path(os.getenv("USAGE_LOG_PATH", "data/usage_log.jsonl"))
 USAGE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 SUPPORTED_SERVICES = [
@@ -90,6 +196,26 @@ if _raw_extractor_args:
         YTDLP_EXTRACTOR_ARGS = {"youtube": [_raw_extractor_args]}
 else:
     YTDLP_EXTRACTOR_ARGS = {"youtube": ["player_client=default"]}
+# Instancias de yt_dlp.YoutubeDL reutilizables: cuántas se conservan libres por
+# combinación de opciones (0 desactiva el pool) y cuántas combinaciones distintas.
+YTDLP_POOL_SIZE = int(os.getenv("YTDLP_POOL_SIZE", "4"))
+YTDLP_POOL_MAX_KEYS = max(1, int(os.getenv("YTDLP_POOL_MAX_KEYS", "32")))
+# Ajustes de descarga por defecto de yt-dlp: fragmentos HLS/DASH en paralelo,
+# tamaño de bloque HTTP (peticiones Range; 0 lo desactiva) y búfer inicial de
+# lectura. Cada perfil puede sobrescribirlos y YTDLP_DOWNLOAD_TUNING (JSON por
+# perfil) tiene la última palabra. scripts/benchmark_download_tuning.py ayuda a
+# elegirlos para cada enlace.
+YTDLP_CONCURRENT_FRAGMENTS = int(os.getenv("YTDLP_CONCURRENT_FRAGMENTS", "4"))
+YTDLP_HTTP_CHUNK_SIZE = int(os.getenv("YTDLP_HTTP_CHUNK_SIZE", str(10 * 1024 * 1024)))
+YTDLP_BUFFER_SIZE = int(os.getenv("YTDLP_BUFFER_SIZE", str(64 * 1024)))
+_raw_download_tuning = os.getenv("YTDLP_DOWNLOAD_TUNING", "").strip()
+try:
+    YTDLP_DOWNLOAD_TUNING: Dict[str, Dict[str, Any]] = (
+        json.loads(_raw_download_tuning) if _raw_download_tuning else {}
+    )
+except json.JSONDecodeError:
+    print("YTDLP_DOWNLOAD_TUNING no es JSON válido; se ignora", file=sys.stderr)
+    YTDLP_DOWNLOAD_TUNING = {}
 TRANSCRIPTION_ENDPOINT = os.getenv("TRANSCRIPTION_ENDPOINT", "https://api.openai.com/v1")
 TRANSCRIPTION_API_KEY = os.getenv("TRANSCRIPTION_API_KEY")
 _TRANSCRIPTION_MODEL_RAW = os.getenv("TRANSCRIPTION_MODEL", "gpt-4o-mini-transcribe").strip()
@@ -294,16 +420,19 @@ AUDIO_FORMAT_PROFILES = {
     "audio_max": {
         "format": "bestaudio/best",
         "passthrough": True,
+        "concurrent_fragment_downloads": 2,
         "description": "Mejor audio disponible desde la fuente (sin recomprimir)",
     },
     "audio_med": {
         "codec": "mp3",
         "preferred_quality": "96",
+        "concurrent_fragment_downloads": 2,
         "description": "MP3 a 96 kbps equilibrado",
     },
     "audio_low": {
         "codec": "mp3",
         "preferred_quality": "48",
+        "concurrent_fragment_downloads": 2,
         "description": "MP3 a 48 kbps optimizado para tamaños pequeños",
     },
 }
@@ -311,11 +440,13 @@ VIDEO_FORMAT_PROFILES = {
     "video_max": {
         "format": "bv*+ba/b",
         "merge_output_format": "mp4",
+        "concurrent_fragment_downloads": 8,
         "description": "Video en la mejor calidad disponible desde la fuente",
     },
     "video_1080": {
         "format": "bv*[height<=1080]+ba/b[height<=1080]/worst",
         "merge_output_format": "mp4",
+        "concurrent_fragment_downloads": 8,
         "description": "Video hasta 1080p equilibrado",
     },
     "video_med": {
@@ -329,6 +460,9 @@ VIDEO_FORMAT_PROFILES = {
         "description": "Video comprimido hasta 480p",
     },
 }
+# Claves de AUDIO/VIDEO_FORMAT_PROFILES que se pasan tal cual a yt-dlp. Los perfiles
+# sin ellas usan YTDLP_CONCURRENT_FRAGMENTS, YTDLP_HTTP_CHUNK_SIZE y YTDLP_BUFFER_SIZE.
+DOWNLOAD_TUNING_KEYS = ("concurrent_fragment_downloads", "http_chunk_size", "buffersize")
 DEFAULT_VIDEO_FORMAT = "video_max"
 VIDEO_FORMAT_ALIASES = {
     "video": DEFAULT_VIDEO_FORMAT,
@@ -336,6 +470,8 @@ VIDEO_FORMAT_ALIASES = {
 }
 for old_audio in ("audio_high",):
     AUDIO_FORMAT_PROFILES[old_audio] = AUDIO_FORMAT_PROFILES["audio_max"]
+# Cada preset declara en "source_format" el perfil de origen más pequeño que
+# basta para producirlo; si ya hay en caché una fuente suficiente se reutiliza.
 FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
     "ffmpeg_480p": {
         "description": "Transcodifica a 480p (h.264 CRF 24 máx. ~1.8 Mbps / AAC 128 kbps)",
@@ -360,6 +496,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
             "-b:a",
             "128k",
         ],
+        "source_format": "video_low",
         "video_height": 480,
         "video_bitrate_kbps": 1800,
         "audio_bitrate_kbps": 128,
@@ -387,6 +524,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
             "-b:a",
             "160k",
         ],
+        "source_format": "video_med",
         "video_height": 720,
         "video_bitrate_kbps": 3200,
         "audio_bitrate_kbps": 160,
@@ -414,6 +552,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
             "-b:a",
             "176k",
         ],
+        "source_format": "video_1080",
         "video_height": 1080,
         "video_bitrate_kbps": 4800,
         "audio_bitrate_kbps": 176,
@@ -441,6 +580,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
             "-b:a",
             "192k",
         ],
+        "source_format": "video_max",
         "video_height": 1440,
         "video_bitrate_kbps": 8000,
         "audio_bitrate_kbps": 192,
@@ -468,6 +608,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
             "-b:a",
             "256k",
         ],
+        "source_format": "video_max",
         "video_height": 2160,
         "video_bitrate_kbps": 12000,
         "audio_bitrate_kbps": 256,
@@ -477,6 +618,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
         "extension": ".wav",
         "media_type": "audio/wav",
         "args": ["-vn", "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2"],
+        "source_format": "audio_max",
         "audio_bitrate_kbps": 1411,
     },
     "ffmpeg_mp3-192": {
@@ -484,6 +626,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
         "extension": ".mp3",
         "media_type": "audio/mpeg",
         "args": ["-vn", "-acodec", "libmp3lame", "-b:a", "192k"],
+        "source_format": "audio_max",
         "audio_bitrate_kbps": 192,
     },
     "ffmpeg_mp3-128": {
@@ -491,6 +634,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
         "extension": ".mp3",
         "media_type": "audio/mpeg",
         "args": ["-vn", "-acodec", "libmp3lame", "-b:a", "128k"],
+        "source_format": "audio_max",
         "audio_bitrate_kbps": 128,
     },
     "ffmpeg_mp3-96": {
@@ -498,6 +642,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
         "extension": ".mp3",
         "media_type": "audio/mpeg",
         "args": ["-vn", "-acodec", "libmp3lame", "-b:a", "96k"],
+        "source_format": "audio_max",
         "audio_bitrate_kbps": 96,
     },
     "ffmpeg_mp3-64": {
@@ -505,6 +650,7 @@ FFMPEG_PRESETS: Dict[str, Dict[str, Any]] = {
         "extension": ".mp3",
         "media_type": "audio/mpeg",
         "args": ["-vn", "-acodec", "libmp3lame", "-b:a", "64k"],
+        "source_format": "audio_max",
         "audio_bitrate_kbps": 64,
     },
 }
@@ -613,7 +759,26 @@ for preset_name, preset in FFMPEG_PRESETS.items():
         {"name": preset_name, "description": preset["description"]}
     )
 
-app = FastAPI(title=APP_TITLE)
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    background_tasks = []
+    if CACHE_SWEEP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_cache_sweeper()))
+    await resume_pending_jobs()
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        for task in background_tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        YTDLP_POOL.close()
+        shutdown_job_executors()
+        REQUEST_SCHEDULER.close()
+
+
+app = FastAPI(title=APP_TITLE, lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 app.mount("/assets", StaticFiles(directory="assets"), name="assets")
 
@@ -658,7 +823,62 @@ def is_translation_format(media_format: str) -> bool:
     return normalized.startswith("transcript_translate")
 
 
-def meta_path(key: str) -> Path:
+def shard_subdir(name: str) -> Path:
+    """Subdirectorio ``ab/cd`` que corresponde a ``name`` según CACHE_SHARD_DEPTH.
+
+    Todos los archivos de una entrada empiezan por su clave (un SHA-1), así que
+    el prefijo del nombre reparte de forma uniforme y agrupa los hermanos.
+    """
+
+    prefix = name[: CACHE_SHARD_DEPTH * 2].lower()
+    if len(prefix) < CACHE_SHARD_DEPTH * 2 or any(ch not in "0123456789abcdef" for ch in prefix):
+        return Path()
+    return Path(*(prefix[index : index + 2] for index in range(0, len(prefix), 2)))
+
+
+def _sharded_path(base_dir: Path, filename: str, create: bool) -> Path:
+    path = base_dir / shard_subdir(filename) / filename
+    if create:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _existing_sharded_path(base_dir: Path, filename: str) -> Path:
+    """Ruta fragmentada si existe; si no, la plana heredada cuando aún está ahí.
+
+    Se vuelve a mirar la fragmentada tras fallar la plana para no perder un
+    archivo que la herramienta de migración mueva entre ambas comprobaciones.
+    """
+
+    sharded = _sharded_path(base_dir, filename, create=False)
+    if sharded.exists():
+        return sharded
+    flat = base_dir / filename
+    if flat != sharded and flat.exists():
+        return flat
+    return sharded
+
+
+def cache_file_path(filename: str, create: bool = False) -> Path:
+    """Único punto de resolución de rutas de archivos de datos en CACHE_DIR.
+
+    Con ``create=True`` devuelve la ruta canónica para escribir (creando su
+    subdirectorio); sin él, localiza el archivo en la ruta fragmentada o en la
+    plana heredada de cachés aún no migradas.
+    """
+
+    if create:
+        return _sharded_path(CACHE_DIR, filename, create=True)
+    return _existing_sharded_path(CACHE_DIR, filename)
+
+
+def meta_path(key: str, create: bool = False) -> Path:
+    if create:
+        return _sharded_path(META_DIR, f"{key}.json", create=True)
+    return _existing_sharded_path(META_DIR, f"{key}.json")
+
+
+def flat_meta_path(key: str) -> Path:
     return META_DIR / f"{key}.json"
 
 
@@ -666,9 +886,105 @@ def legacy_meta_path(key: str) -> Path:
     return CACHE_DIR / f"{key}.json"
 
 
-def is_expired(meta: Dict) -> bool:
+# Descargas a medio escribir de yt-dlp/ffmpeg: no se mueven nunca.
+_UNSTABLE_CACHE_SUFFIXES = (".part", ".ytdl", ".temp", ".tmp")
+
+
+def _iter_layout_files(base_dir: Path) -> Iterator[Path]:
+    """Archivos de ``base_dir`` que pertenecen al diseño de caché.
+
+    Solo se recorren el nivel superior y los subdirectorios de fragmentos
+    (nombres hexadecimales de dos caracteres), de modo que ``_meta``,
+    ``_locks`` o la caché de yt-dlp quedan fuera.
+    """
+
+    stack = [base_dir]
+    while stack:
+        current = stack.pop()
+        try:
+            children = list(current.iterdir())
+        except OSError:
+            continue
+        for child in children:
+            if child.is_dir():
+                name = child.name.lower()
+                if len(name) == 2 and all(ch in "0123456789abcdef" for ch in name):
+                    stack.append(child)
+            elif child.is_file():
+                yield child
+
+
+def _move_without_clobber(source: Path, target: Path) -> bool:
+    """Mueve ``source`` a ``target`` salvo que ya exista una copia más nueva."""
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        # Las escrituras nuevas ya van a la ruta fragmentada: esa copia manda.
+        source.unlink(missing_ok=True)
+        return False
+    except OSError:
+        if target.exists():
+            source.unlink(missing_ok=True)
+            return False
+        os.replace(source, target)
+        return True
+    source.unlink(missing_ok=True)
+    return True
+
+
+def migrate_cache_layout(min_age_seconds: float = 60, dry_run: bool = False) -> Dict[str, int]:
+    """Recoloca datos y metadatos según CACHE_SHARD_DEPTH sin detener el servicio.
+
+    Los lectores buscan en la ruta fragmentada y en la plana, así que cada
+    archivo sigue localizable durante todo el proceso. Se ignoran los archivos
+    modificados hace menos de ``min_age_seconds`` por si aún se están escribiendo.
+    """
+
+    counts = {"moved": 0, "skipped": 0, "already": 0}
+    cutoff = time.time() - min_age_seconds
+    for base_dir in (CACHE_DIR, META_DIR):
+        for path in _iter_layout_files(base_dir):
+            name = path.name
+            target = _sharded_path(base_dir, name, create=False)
+            if path == target:
+                counts["already"] += 1
+                continue
+            if name.endswith(_UNSTABLE_CACHE_SUFFIXES) or name.startswith("_"):
+                counts["skipped"] += 1
+                continue
+            if base_dir == CACHE_DIR and name.endswith(".json") and path.parent == CACHE_DIR:
+                # Los metadatos heredados junto a los datos los migra ``load_meta``.
+                try:
+                    if _is_legacy_meta_payload(_read_meta_file(path, path.stem)):
+                        counts["skipped"] += 1
+                        continue
+                except (OSError, json.JSONDecodeError, UnicodeDecodeError):
+                    pass
+            try:
+                if path.stat().st_mtime > cutoff:
+                    counts["skipped"] += 1
+                    continue
+                if dry_run or _move_without_clobber(path, target):
+                    counts["moved"] += 1
+                else:
+                    counts["already"] += 1
+            except FileNotFoundError:
+                continue
+            except OSError as exc:
+                counts["skipped"] += 1
+                print(f"[vhs] No se pudo mover {path}: {exc}", file=sys.stderr)
+    return counts
+
+
+def entry_expires_at(meta: Dict) -> float:
     downloaded_at = meta.get("downloaded_at") or 0
-    return (time.time() - float(downloaded_at)) > CACHE_TTL_SECONDS
+    return float(downloaded_at) + CACHE_TTL_SECONDS
+
+
+def is_expired(meta: Dict) -> bool:
+    return time.time() > entry_expires_at(meta)
 
 
 FORMAT_EXTENSIONS = {
@@ -699,6 +1015,10 @@ FORMAT_EXTENSIONS["video_high"] = FORMAT_EXTENSIONS["video_max"]
 FORMAT_EXTENSIONS["audio_high"] = FORMAT_EXTENSIONS["audio_max"]
 
 TRANSCRIPTION_FILE_SUFFIX = ".transcript.json"
+# Entrada interna con la respuesta completa del modelo (verbose_json) de la que
+# se derivan todas las salidas transcript_* de una misma fuente.
+TRANSCRIPT_PAYLOAD_FORMAT = "transcript_payload"
+FORMAT_EXTENSIONS[TRANSCRIPT_PAYLOAD_FORMAT] = ".json"
 
 
 def media_type_for_format(media_format: str) -> str:
@@ -729,7 +1049,7 @@ def categorize_media_format(media_format: str) -> str:
     normalized = normalize_media_format(media_format)
     if normalized in FFMPEG_PRESETS:
         return "recoding"
-    if normalized in TRANSCRIPTION_FORMATS:
+    if normalized in TRANSCRIPTION_FORMATS or normalized == TRANSCRIPT_PAYLOAD_FORMAT:
         return "transcription"
     if normalized in AUDIO_FORMAT_PROFILES:
         return "audio"
@@ -1153,24 +1473,951 @@ def build_content_disposition_header(filename: str) -> str:
         )
 
 
-def load_meta(key: str) -> Optional[Dict]:
-    primary_path = meta_path(key)
-    if primary_path.exists():
-        with primary_path.open("r", encoding="utf-8") as handle:
+class CacheMetadataIndex:
+    """Índice en memoria de metadatos de caché, ordenado por expiración."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Montículo (expira_en, clave) con borrado perezoso: las entradas
+        # obsoletas se descartan al extraerlas si ya no coinciden con el índice.
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._total_bytes = 0
+        # Claves agrupadas por identidad canónica para localizar hermanos.
+        self._by_identity: Dict[str, set] = {}
+
+    def _unlink_identity(self, key: str, metadata: Dict[str, Any]) -> None:
+        identity = metadata.get("media_identity")
+        if identity and identity in self._by_identity:
+            self._by_identity[identity].discard(key)
+            if not self._by_identity[identity]:
+                del self._by_identity[identity]
+
+    def _store(self, key: str, metadata: Dict[str, Any]) -> None:
+        previous = self._entries.get(key)
+        if previous is not None:
+            self._total_bytes -= int(previous.get("filesize_bytes") or 0)
+            self._unlink_identity(key, previous)
+        self._entries[key] = metadata
+        self._total_bytes += int(metadata.get("filesize_bytes") or 0)
+        identity = metadata.get("media_identity")
+        if identity:
+            self._by_identity.setdefault(identity, set()).add(key)
+        heappush(self._expiry_heap, (entry_expires_at(metadata), key))
+        # Compactar cuando las entradas obsoletas dominan el montículo.
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [
+                (entry_expires_at(meta), cached_key)
+                for cached_key, meta in self._entries.items()
+            ]
+            heapify(self._expiry_heap)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data = self._entries.get(key)
+            return dict(data) if data is not None else None
+
+    def put(self, key: str, metadata: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store(key, dict(metadata))
+
+    def _remove(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self._entries.pop(key, None)
+        if data is not None:
+            self._total_bytes -= int(data.get("filesize_bytes") or 0)
+            self._unlink_identity(key, data)
+        return data
+
+    def find_by_identity(self, identity: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(self._entries[key])
+                for key in self._by_identity.get(identity, ())
+                if key in self._entries
+            ]
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def update(self, key: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                return None
+            # Copia al escribir: las instantáneas tomadas fuera del bloqueo
+            # nunca ven un diccionario a medio modificar.
+            data = {**data, **fields}
+            self._entries[key] = data
+            return dict(data)
+
+    def pop_expired(
+        self, now: Optional[float] = None, limit: Optional[int] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        current = time.time() if now is None else now
+        expired: List[Tuple[str, Dict[str, Any]]] = []
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < current:
+                if limit is not None and len(expired) >= limit:
+                    break
+                expires_at, key = heappop(self._expiry_heap)
+                data = self._entries.get(key)
+                if data is None or entry_expires_at(data) != expires_at:
+                    continue
+                expired.append((key, self._remove(key)))
+        return expired
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(data) for data in self._entries.values()]
+
+    def query(
+        self,
+        predicate: Callable[[Dict[str, Any]], bool],
+        sort_value: Callable[[Dict[str, Any]], Any],
+        descending: bool,
+        after: Optional[Tuple[Any, str]],
+        limit: int,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]], Dict[str, int]]:
+        """Página ordenada por ``(sort_value, clave)`` y agregados del filtro.
+
+        Bajo el bloqueo solo se toman las referencias de las entradas (que no
+        se modifican en sitio); el filtrado y la ordenación van fuera de él.
+        Solo se copian las entradas de la página.
+        """
+
+        with self._lock:
+            entries = list(self._entries.items())
+        matches: List[Tuple[Any, str]] = []
+        by_key: Dict[str, Dict[str, Any]] = {}
+        total_bytes = 0
+        for key, data in entries:
+            if not predicate(data):
+                continue
+            matches.append((sort_value(data), key))
+            by_key[key] = data
+            total_bytes += int(data.get("filesize_bytes") or 0)
+        aggregates = {"count": len(matches), "total_bytes": total_bytes}
+        matches.sort(reverse=descending)
+        if after is not None:
+            matches = [item for item in matches if (item < after if descending else item > after)]
+        page = matches[:limit]
+        items = [dict(by_key[key]) for _, key in page]
+        next_after = page[-1] if len(matches) > limit else None
+        return items, next_after, aggregates
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def _read_meta_file(path: Path, key: str) -> Optional[Dict]:
+    try:
+        with path.open("r", encoding="utf-8") as handle:
             data = json.load(handle)
+    except FileNotFoundError:
+        return None
+    # Transcripciones .json y otros ficheros ajenos pueden ser listas o escalares.
+    if not isinstance(data, dict):
+        return None
+    data.setdefault("cache_key", key)
+    return data
+
+
+def _write_meta_file(path: Path, data: Dict) -> None:
+    """Escritura atómica: los lectores nunca ven un JSON a medias."""
+
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with temp_path.open("w", encoding="utf-8") as handle:
+            json.dump(data, handle, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    except OSError:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def _is_legacy_meta_payload(data: Any) -> bool:
+    # En CACHE_DIR conviven metadatos heredados y transcripciones .json; solo
+    # los primeros describen un archivo de datos.
+    return isinstance(data, dict) and "filename" in data and "downloaded_at" in data
+
+
+class CacheCatalog:
+    """Interfaz común de los catálogos de metadatos de la caché."""
+
+    backend = "base"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, key: str, metadata: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def discard(self, key: str) -> None:
+        raise NotImplementedError
+
+    def pop_expired(
+        self, now: Optional[float] = None, limit: Optional[int] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """Entradas vigentes ordenadas de la más reciente a la más antigua."""
+        raise NotImplementedError
+
+    def query_entries(
+        self,
+        filters: Dict[str, Any],
+        sort: str = "downloaded_at",
+        descending: bool = True,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: int = 100,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]], Dict[str, int]]:
+        """Página de entradas vigentes filtradas y ordenadas por ``(sort, cache_key)``.
+
+        Devuelve la página, la posición desde la que continuar (``None`` si no
+        hay más) y los agregados ``count``/``total_bytes`` de todo el filtro.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def touch(self, key: str, now: Optional[float] = None) -> None:
+        """Registra un acceso (recencia y frecuencia) a la entrada."""
+        raise NotImplementedError
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Dict[str, Any]]:
+        """Entradas no fijadas, de la más fría a la más caliente según la política."""
+        raise NotImplementedError
+
+    def increment_counter(self, name: str, amount: int = 1) -> None:
+        raise NotImplementedError
+
+    def counters(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def get_alias(self, url: str) -> Optional[str]:
+        """Identidad canónica registrada para una URL normalizada."""
+        raise NotImplementedError
+
+    def find_by_identity(
+        self, identity: str, media_formats: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Entradas vigentes de la misma fuente, opcionalmente filtradas por formato."""
+        raise NotImplementedError
+
+    def put_alias(self, url: str, identity: str) -> None:
+        raise NotImplementedError
+
+    def get_negative(self, ref: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Fallo de origen vigente registrado para la referencia de la fuente."""
+        raise NotImplementedError
+
+    def put_negative(self, ref: str, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def purge_negative(self, now: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+
+def _eviction_sort_key(policy: str, metadata: Dict[str, Any]) -> Tuple[float, ...]:
+    last_access = float(metadata.get("last_accessed_at") or metadata.get("downloaded_at") or 0)
+    if policy == "lfu":
+        return (float(metadata.get("access_count") or 0), last_access)
+    return (last_access,)
+
+
+# Campos por los que se puede ordenar el listado de la caché.
+CACHE_SORT_FIELDS = (
+    "downloaded_at",
+    "filesize_bytes",
+    "title",
+    "last_accessed_at",
+    "access_count",
+    "expires_at",
+)
+
+
+def cache_sort_value(field: str, metadata: Dict[str, Any]) -> Any:
+    if field == "title":
+        return str(metadata.get("title") or "").lower()
+    if field == "filesize_bytes":
+        return int(metadata.get("filesize_bytes") or 0)
+    if field == "access_count":
+        return int(metadata.get("access_count") or 0)
+    if field == "last_accessed_at":
+        return float(metadata.get("last_accessed_at") or metadata.get("downloaded_at") or 0)
+    if field == "expires_at":
+        return entry_expires_at(metadata)
+    return float(metadata.get("downloaded_at") or 0)
+
+
+def cache_entry_matches(filters: Dict[str, Any], metadata: Dict[str, Any], now: float) -> bool:
+    """Evalúa en memoria los filtros del listado (ver ``CacheCatalog.query_entries``)."""
+
+    if entry_expires_at(metadata) < now:
+        return False
+    media_formats = filters.get("media_formats")
+    if media_formats is not None and metadata.get("media_format") not in media_formats:
+        return False
+    downloaded_at = float(metadata.get("downloaded_at") or 0)
+    if filters.get("downloaded_after") is not None and downloaded_at < filters["downloaded_after"]:
+        return False
+    if filters.get("downloaded_before") is not None and downloaded_at > filters["downloaded_before"]:
+        return False
+    size = int(metadata.get("filesize_bytes") or 0)
+    if filters.get("min_size") is not None and size < filters["min_size"]:
+        return False
+    if filters.get("max_size") is not None and size > filters["max_size"]:
+        return False
+    title = filters.get("title")
+    if title and title.lower() not in str(metadata.get("title") or "").lower():
+        return False
+    return True
+
+
+class JsonCacheCatalog(CacheCatalog):
+    """Catálogo con un JSON por entrada en ``META_DIR`` e índice en memoria.
+
+    El índice se construye una sola vez al primer uso y después se mantiene
+    sincronizado en cada escritura o borrado.
+    """
+
+    backend = "json"
+
+    def __init__(self, meta_dir: Path) -> None:
+        self._meta_dir = meta_dir
+        self._index = CacheMetadataIndex()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._counters: Dict[str, int] = {}
+        self._counters_lock = threading.Lock()
+        self._aliases_path = meta_dir / "aliases.jsonl"
+        self._aliases: Optional[Dict[str, str]] = None
+        self._aliases_lock = threading.Lock()
+        # Los fallos recordados duran minutos: basta con tenerlos en memoria.
+        self._negative: Dict[str, Dict[str, Any]] = {}
+        self._negative_lock = threading.Lock()
+        # Último instante en que se escribieron a disco los accesos de cada clave.
+        self._access_persisted: Dict[str, float] = {}
+        self._access_lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for meta_file in self._meta_dir.rglob("*.json"):
+                try:
+                    data = _read_meta_file(meta_file, meta_file.stem)
+                except (OSError, json.JSONDecodeError) as exc:
+                    print(
+                        f"[vhs] Metadatos de caché ilegibles en {meta_file}: {exc}",
+                        file=sys.stderr,
+                    )
+                    continue
+                if isinstance(data, dict):
+                    self._index.put(data["cache_key"], data)
+            self._loaded = True
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        indexed = self._index.get(key)
+        if indexed is not None:
+            return indexed
+        # Otro worker puede haber escrito la entrada después de construir el índice.
+        data = _read_meta_file(meta_path(key), key)
+        if data is not None:
+            self._index.put(key, data)
+        return data
+
+    def put(self, key: str, metadata: Dict[str, Any]) -> None:
+        self._ensure_loaded()
+        target = meta_path(key, create=True)
+        _write_meta_file(target, metadata)
+        if flat_meta_path(key) != target:
+            flat_meta_path(key).unlink(missing_ok=True)
+        self._index.put(key, metadata)
+        with self._access_lock:
+            self._access_persisted[key] = time.time()
+
+    def discard(self, key: str) -> None:
+        self._ensure_loaded()
+        meta_path(key, create=False).unlink(missing_ok=True)
+        flat_meta_path(key).unlink(missing_ok=True)
+        self._index.discard(key)
+        with self._access_lock:
+            self._access_persisted.pop(key, None)
+
+    def pop_expired(
+        self, now: Optional[float] = None, limit: Optional[int] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        self._ensure_loaded()
+        return self._index.pop_expired(now, limit)
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        entries = [data for data in self._index.snapshot() if not is_expired(data)]
+        entries.sort(key=lambda item: float(item.get("downloaded_at") or 0), reverse=True)
+        return entries
+
+    def query_entries(
+        self,
+        filters: Dict[str, Any],
+        sort: str = "downloaded_at",
+        descending: bool = True,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: int = 100,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]], Dict[str, int]]:
+        self._ensure_loaded()
+        now = time.time()
+        return self._index.query(
+            lambda data: cache_entry_matches(filters, data, now),
+            lambda data: cache_sort_value(sort, data),
+            descending,
+            after,
+            limit,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return {
+            "backend": self.backend,
+            "entries": len(self._index),
+            "total_bytes": self._index.total_bytes,
+        }
+
+    def touch(self, key: str, now: Optional[float] = None) -> None:
+        self._ensure_loaded()
+        current = self._index.get(key)
+        if current is None:
+            return
+        accessed_at = time.time() if now is None else now
+        updated = self._index.update(
+            key,
+            last_accessed_at=accessed_at,
+            access_count=int(current.get("access_count") or 0) + 1,
+        )
+        if updated is None:
+            return
+        # En cada acierto solo se actualiza el índice; el disco, como mucho una
+        # vez cada CACHE_ACCESS_PERSIST_SECONDS por clave.
+        with self._access_lock:
+            if accessed_at - self._access_persisted.get(key, 0.0) < CACHE_ACCESS_PERSIST_SECONDS:
+                return
+            self._access_persisted[key] = accessed_at
+        try:
+            target = meta_path(key, create=True)
+            _write_meta_file(target, updated)
+            if flat_meta_path(key) != target:
+                flat_meta_path(key).unlink(missing_ok=True)
+        except OSError:
+            # El registro de accesos es best-effort.
+            pass
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        entries = [data for data in self._index.snapshot() if not data.get("pinned")]
+        entries.sort(key=lambda item: _eviction_sort_key(policy, item))
+        return entries[:limit]
+
+    def increment_counter(self, name: str, amount: int = 1) -> None:
+        with self._counters_lock:
+            self._counters[name] = self._counters.get(name, 0) + int(amount)
+
+    def counters(self) -> Dict[str, int]:
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def find_by_identity(
+        self, identity: str, media_formats: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        wanted = set(media_formats) if media_formats is not None else None
+        return [
+            data
+            for data in self._index.find_by_identity(identity)
+            if (wanted is None or data.get("media_format") in wanted) and not is_expired(data)
+        ]
+
+    def _load_aliases(self) -> Dict[str, str]:
+        if self._aliases is None:
+            aliases: Dict[str, str] = {}
+            if self._aliases_path.exists():
+                with self._aliases_path.open("r", encoding="utf-8") as handle:
+                    for line in handle:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if isinstance(record, dict) and record.get("url"):
+                            aliases[record["url"]] = record.get("identity") or ""
+            self._aliases = aliases
+        return self._aliases
+
+    def get_alias(self, url: str) -> Optional[str]:
+        with self._aliases_lock:
+            return self._load_aliases().get(url) or None
+
+    def put_alias(self, url: str, identity: str) -> None:
+        with self._aliases_lock:
+            aliases = self._load_aliases()
+            if aliases.get(url) == identity:
+                return
+            aliases[url] = identity
+            try:
+                with self._aliases_path.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps({"url": url, "identity": identity}) + "\n")
+            except OSError as exc:
+                print(f"[vhs] No se pudo registrar el alias de {url}: {exc}", file=sys.stderr)
+
+    def get_negative(self, ref: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        current = time.time() if now is None else now
+        with self._negative_lock:
+            record = self._negative.get(ref)
+            if record is None:
+                return None
+            if record["expires_at"] <= current:
+                del self._negative[ref]
+                return None
+            return dict(record)
+
+    def put_negative(self, ref: str, record: Dict[str, Any]) -> None:
+        with self._negative_lock:
+            self._negative[ref] = dict(record)
+
+    def purge_negative(self, now: Optional[float] = None) -> int:
+        current = time.time() if now is None else now
+        with self._negative_lock:
+            expired = [
+                ref for ref, record in self._negative.items() if record["expires_at"] <= current
+            ]
+            for ref in expired:
+                del self._negative[ref]
+        return len(expired)
+
+
+class SqliteCacheCatalog(CacheCatalog):
+    """Catálogo SQLite (WAL) compartido por todos los workers de uvicorn.
+
+    Cada hilo abre su propia conexión; las escrituras usan transacciones
+    ``BEGIN IMMEDIATE`` para que varios procesos puedan compartir el fichero.
+    """
+
+    backend = "sqlite"
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            cache_key TEXT PRIMARY KEY,
+            media_format TEXT,
+            source_url TEXT,
+            downloaded_at REAL NOT NULL DEFAULT 0,
+            expires_at REAL NOT NULL DEFAULT 0,
+            size_bytes INTEGER NOT NULL DEFAULT 0,
+            last_access REAL NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_cache_media_format ON cache_entries (media_format)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_source_url ON cache_entries (source_url)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_downloaded_at ON cache_entries (downloaded_at)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache_entries (expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_size ON cache_entries (size_bytes)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries (last_access)",
+        """
+        CREATE TABLE IF NOT EXISTS catalog_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS media_aliases (
+            url TEXT PRIMARY KEY,
+            identity TEXT NOT NULL,
+            created_at REAL NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_alias_identity ON media_aliases (identity)",
+        """
+        CREATE TABLE IF NOT EXISTS catalog_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS negative_cache (
+            ref TEXT PRIMARY KEY,
+            error_class TEXT NOT NULL,
+            message TEXT,
+            created_at REAL NOT NULL DEFAULT 0,
+            expires_at REAL NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_negative_expires_at ON negative_cache (expires_at)",
+    )
+
+    # Columnas añadidas después de la primera versión del esquema.
+    EXTRA_COLUMNS = (
+        ("hits", "INTEGER NOT NULL DEFAULT 0"),
+        ("pinned", "INTEGER NOT NULL DEFAULT 0"),
+        ("media_identity", "TEXT"),
+    )
+    EXTRA_INDEXES = (
+        "CREATE INDEX IF NOT EXISTS idx_cache_eviction ON cache_entries (pinned, last_access)",
+        "CREATE INDEX IF NOT EXISTS idx_cache_identity ON cache_entries (media_identity, media_format)",
+    )
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self._path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            # ``lower`` de SQLite solo conoce ASCII; los títulos no.
+            conn.create_function(
+                "vhs_lower", 1, lambda value: str(value or "").lower(), deterministic=True
+            )
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._initialize(conn)
+                    self._initialized = True
+        return conn
+
+    def _initialize(self, conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            existing_columns = {
+                row[1] for row in conn.execute("PRAGMA table_info(cache_entries)").fetchall()
+            }
+            for column, definition in self.EXTRA_COLUMNS:
+                if column not in existing_columns:
+                    conn.execute(f"ALTER TABLE cache_entries ADD COLUMN {column} {definition}")
+            for statement in self.EXTRA_INDEXES:
+                conn.execute(statement)
+            state = dict(conn.execute("SELECT name, value FROM catalog_state").fetchall())
+            if state.get("ttl_seconds") != str(CACHE_TTL_SECONDS):
+                # Recalcular la expiración si cambió CACHE_TTL_SECONDS.
+                conn.execute(
+                    "UPDATE cache_entries SET expires_at = downloaded_at + ?",
+                    (CACHE_TTL_SECONDS,),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog_state (name, value) VALUES ('ttl_seconds', ?)",
+                    (str(CACHE_TTL_SECONDS),),
+                )
+            migrated_files: List[Path] = []
+            if state.get("json_migrated") != "1":
+                migrated_files = self._migrate_json_files(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog_state (name, value) VALUES ('json_migrated', '1')"
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for migrated in migrated_files:
+            migrated.unlink(missing_ok=True)
+
+    def _migrate_json_files(self, conn: sqlite3.Connection) -> List[Path]:
+        """Importa una sola vez ``_meta/*.json`` y los metadatos heredados de CACHE_DIR."""
+
+        migrated: List[Path] = []
+        candidates = [*META_DIR.rglob("*.json"), *CACHE_DIR.glob("*.json")]
+        for meta_file in candidates:
+            try:
+                data = _read_meta_file(meta_file, meta_file.stem)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if not _is_legacy_meta_payload(data):
+                continue
+            self._upsert(conn, data["cache_key"], data)
+            migrated.append(meta_file)
+        if migrated:
+            print(
+                f"[vhs] Migradas {len(migrated)} entradas de metadatos JSON a {self._path}",
+                file=sys.stderr,
+            )
+        return migrated
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, key: str, metadata: Dict[str, Any]) -> None:
+        downloaded_at = float(metadata.get("downloaded_at") or 0)
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO cache_entries (
+                cache_key, media_format, source_url, downloaded_at, expires_at,
+                size_bytes, last_access, hits, pinned, media_identity, data
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                key,
+                metadata.get("media_format"),
+                metadata.get("source_url"),
+                downloaded_at,
+                entry_expires_at(metadata),
+                int(metadata.get("filesize_bytes") or 0),
+                float(metadata.get("last_accessed_at") or downloaded_at),
+                int(metadata.get("access_count") or 0),
+                int(bool(metadata.get("pinned"))),
+                metadata.get("media_identity"),
+                json.dumps(metadata, ensure_ascii=False),
+            ),
+        )
+
+    # Los contadores de acceso viven solo en columnas para que ``touch`` sea
+    # un UPDATE barato; se vuelven a mezclar con el JSON al leer.
+    ROW_COLUMNS = "data, last_access, hits"
+
+    @staticmethod
+    def _row_to_meta(row: Tuple[Any, ...]) -> Dict[str, Any]:
+        data = json.loads(row[0])
+        data["last_accessed_at"] = row[1]
+        data["access_count"] = row[2]
+        return data
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            f"SELECT {self.ROW_COLUMNS} FROM cache_entries WHERE cache_key = ?", (key,)
+        ).fetchone()
+        return self._row_to_meta(row) if row else None
+
+    def put(self, key: str, metadata: Dict[str, Any]) -> None:
+        self._upsert(self._connection(), key, metadata)
+
+    def discard(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache_entries WHERE cache_key = ?", (key,))
+
+    def pop_expired(
+        self, now: Optional[float] = None, limit: Optional[int] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        current = time.time() if now is None else now
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT cache_key, {self.ROW_COLUMNS} FROM cache_entries "
+                "WHERE expires_at < ? ORDER BY expires_at LIMIT ?",
+                (current, -1 if limit is None else int(limit)),
+            ).fetchall()
+            conn.executemany(
+                "DELETE FROM cache_entries WHERE cache_key = ?", [(row[0],) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], self._row_to_meta(row[1:])) for row in rows]
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            f"SELECT {self.ROW_COLUMNS} FROM cache_entries WHERE expires_at >= ? "
+            "ORDER BY downloaded_at DESC",
+            (time.time(),),
+        ).fetchall()
+        return [self._row_to_meta(row) for row in rows]
+
+    # Expresiones SQL equivalentes a ``cache_sort_value``.
+    SORT_EXPRESSIONS = {
+        "downloaded_at": "downloaded_at",
+        "filesize_bytes": "size_bytes",
+        "title": "vhs_lower(json_extract(data, '$.title'))",
+        "last_accessed_at": "last_access",
+        "access_count": "hits",
+        "expires_at": "expires_at",
+    }
+
+    def query_entries(
+        self,
+        filters: Dict[str, Any],
+        sort: str = "downloaded_at",
+        descending: bool = True,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: int = 100,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]], Dict[str, int]]:
+        sort_expr = self.SORT_EXPRESSIONS.get(sort, "downloaded_at")
+        clauses = ["expires_at >= ?"]
+        params: List[Any] = [time.time()]
+        media_formats = filters.get("media_formats")
+        if media_formats is not None:
+            if not media_formats:
+                return [], None, {"count": 0, "total_bytes": 0}
+            clauses.append(f"media_format IN ({', '.join('?' for _ in media_formats)})")
+            params.extend(sorted(media_formats))
+        for name, clause in (
+            ("downloaded_after", "downloaded_at >= ?"),
+            ("downloaded_before", "downloaded_at <= ?"),
+            ("min_size", "size_bytes >= ?"),
+            ("max_size", "size_bytes <= ?"),
+        ):
+            if filters.get(name) is not None:
+                clauses.append(clause)
+                params.append(filters[name])
+        if filters.get("title"):
+            clauses.append("instr(vhs_lower(json_extract(data, '$.title')), ?) > 0")
+            params.append(str(filters["title"]).lower())
+        where = " AND ".join(clauses)
+        conn = self._connection()
+        count, total_bytes = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache_entries WHERE {where}",
+            params,
+        ).fetchone()
+        page_params = list(params)
+        if after is not None:
+            where += f" AND ({sort_expr}, cache_key) {'<' if descending else '>'} (?, ?)"
+            page_params.extend(after)
+        direction = "DESC" if descending else "ASC"
+        rows = conn.execute(
+            f"SELECT {self.ROW_COLUMNS}, {sort_expr}, cache_key FROM cache_entries "
+            f"WHERE {where} ORDER BY {sort_expr} {direction}, cache_key {direction} LIMIT ?",
+            [*page_params, int(limit) + 1],
+        ).fetchall()
+        page = rows[:limit]
+        next_after = (page[-1][3], page[-1][4]) if len(rows) > limit else None
+        aggregates = {"count": count, "total_bytes": total_bytes}
+        return [self._row_to_meta(row) for row in page], next_after, aggregates
+
+    def stats(self) -> Dict[str, Any]:
+        count, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache_entries"
+        ).fetchone()
+        return {"backend": self.backend, "entries": count, "total_bytes": total_bytes}
+
+    def touch(self, key: str, now: Optional[float] = None) -> None:
+        self._connection().execute(
+            "UPDATE cache_entries SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+            (time.time() if now is None else now, key),
+        )
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Dict[str, Any]]:
+        order = "hits ASC, last_access ASC" if policy == "lfu" else "last_access ASC"
+        rows = self._connection().execute(
+            f"SELECT {self.ROW_COLUMNS} FROM cache_entries WHERE pinned = 0 "
+            f"ORDER BY {order} LIMIT ?",
+            (int(limit),),
+        ).fetchall()
+        return [self._row_to_meta(row) for row in rows]
+
+    def increment_counter(self, name: str, amount: int = 1) -> None:
+        self._connection().execute(
+            "INSERT INTO catalog_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, int(amount)),
+        )
+
+    def counters(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT name, value FROM catalog_counters").fetchall()
+        return {name: value for name, value in rows}
+
+    def find_by_identity(
+        self, identity: str, media_formats: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        query = (
+            f"SELECT {self.ROW_COLUMNS} FROM cache_entries "
+            "WHERE media_identity = ? AND expires_at >= ?"
+        )
+        params: List[Any] = [identity, time.time()]
+        if media_formats is not None:
+            if not media_formats:
+                return []
+            query += f" AND media_format IN ({', '.join('?' for _ in media_formats)})"
+            params.extend(media_formats)
+        rows = self._connection().execute(query, params).fetchall()
+        return [self._row_to_meta(row) for row in rows]
+
+    def get_alias(self, url: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT identity FROM media_aliases WHERE url = ?", (url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put_alias(self, url: str, identity: str) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO media_aliases (url, identity, created_at) VALUES (?, ?, ?)",
+            (url, identity, time.time()),
+        )
+
+    def get_negative(self, ref: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT error_class, message, created_at, expires_at FROM negative_cache "
+            "WHERE ref = ? AND expires_at > ?",
+            (ref, time.time() if now is None else now),
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "error_class": row[0],
+            "message": row[1],
+            "created_at": row[2],
+            "expires_at": row[3],
+        }
+
+    def put_negative(self, ref: str, record: Dict[str, Any]) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO negative_cache "
+            "(ref, error_class, message, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                ref,
+                record["error_class"],
+                record.get("message"),
+                float(record.get("created_at") or time.time()),
+                float(record["expires_at"]),
+            ),
+        )
+
+    def purge_negative(self, now: Optional[float] = None) -> int:
+        cursor = self._connection().execute(
+            "DELETE FROM negative_cache WHERE expires_at <= ?",
+            (time.time() if now is None else now,),
+        )
+        return cursor.rowcount
+
+
+def build_cache_catalog() -> CacheCatalog:
+    if CACHE_CATALOG_BACKEND == "sqlite":
+        return SqliteCacheCatalog(CACHE_CATALOG_PATH)
+    if CACHE_CATALOG_BACKEND != "json":
+        print(
+            f"[vhs] CACHE_CATALOG_BACKEND desconocido '{CACHE_CATALOG_BACKEND}', usando json",
+            file=sys.stderr,
+        )
+    return JsonCacheCatalog(META_DIR)
+
+
+CACHE_CATALOG = build_cache_catalog()
+
+
+def load_meta(key: str) -> Optional[Dict]:
+    data = CACHE_CATALOG.get(key)
+    if data is not None:
         data.setdefault("cache_key", key)
         return data
 
-    legacy_path = legacy_meta_path(key)
-    if not legacy_path.exists():
+    data = _read_meta_file(legacy_meta_path(key), key)
+    if data is None:
         return None
-
-    with legacy_path.open("r", encoding="utf-8") as handle:
-        data = json.load(handle)
-    data.setdefault("cache_key", key)
     # Migrar a la nueva ubicación para evitar conflictos con archivos de datos.
     save_meta(key, data)
-    legacy_path.unlink(missing_ok=True)
+    legacy_meta_path(key).unlink(missing_ok=True)
     return data
 
 
@@ -1178,14 +2425,16 @@ def delete_cache_entry(key: str, metadata: Optional[Dict] = None) -> None:
     meta = metadata or load_meta(key) or {}
     data_file = meta.get("filename")
     if data_file:
-        stored_file = CACHE_DIR / data_file
+        stored_file = cache_file_path(data_file)
         if stored_file.exists():
             stored_file.unlink(missing_ok=True)
-    meta_path(key).unlink(missing_ok=True)
+    CACHE_CATALOG.discard(key)
     legacy_meta_path(key).unlink(missing_ok=True)
 
 
-def fetch_cached_file(key: str) -> Tuple[Optional[Path], Optional[Dict]]:
+def _valid_cached_file(key: str) -> Tuple[Optional[Path], Optional[Dict]]:
+    """Entrada vigente con su archivo presente; borra la que ya no lo esté."""
+
     metadata = load_meta(key)
     if not metadata:
         return None, None
@@ -1198,92 +2447,1120 @@ def fetch_cached_file(key: str) -> Tuple[Optional[Path], Optional[Dict]]:
         delete_cache_entry(key, metadata)
         return None, None
 
-    file_path = CACHE_DIR / filename
+    file_path = cache_file_path(filename)
     if not file_path.exists():
         delete_cache_entry(key, metadata)
         return None, None
+    return file_path, metadata
+
 
+def fetch_cached_file(key: str) -> Tuple[Optional[Path], Optional[Dict]]:
+    file_path, metadata = _valid_cached_file(key)
+    if file_path is None or metadata is None:
+        return None, None
+    CACHE_CATALOG.touch(key)
     cached_meta = {**metadata, "_cache_hit": True}
     return file_path, cached_meta
 
 
-def purge_expired_entries() -> None:
-    for meta_file in META_DIR.glob("*.json"):
-        with meta_file.open("r", encoding="utf-8") as handle:
-            data = json.load(handle)
-        if is_expired(data):
-            delete_cache_entry(meta_file.stem, data)
+def purge_expired_entries(limit: Optional[int] = None) -> int:
+    expired = CACHE_CATALOG.pop_expired(limit=limit)
+    for key, data in expired:
+        delete_cache_entry(key, data)
+        CACHE_CATALOG.increment_counter("expirations")
+    return len(expired)
 
 
-def save_meta(key: str, metadata: Dict) -> None:
-    sanitized = {k: v for k, v in metadata.items() if not k.startswith("_")}
-    sanitized["cache_key"] = key
-    with meta_path(key).open("w", encoding="utf-8") as handle:
-        json.dump(sanitized, handle, ensure_ascii=False, indent=2)
+async def run_cache_sweeper() -> None:
+    """Barre expiraciones en lotes acotados fuera del camino de las peticiones.
 
+    Si un lote sale lleno se repite enseguida para drenar el atraso sin
+    bloquear nunca más de ``CACHE_SWEEP_BATCH_SIZE`` borrados por tick.
+    """
 
-def build_ydl_options(
-    media_format: str, *, cache_key_value: str, force_no_proxy: bool = False
-) -> Dict:
-    js_runtimes: Dict[str, Dict[str, str]] = {}
-    for candidate in ("node", "nodejs"):
-        path = shutil.which(candidate)
-        if path:
-            js_runtimes[candidate] = {"executable": path}
-            break
+    delay = CACHE_SWEEP_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            removed = await run_in_threadpool(purge_expired_entries, CACHE_SWEEP_BATCH_SIZE)
+            await run_in_threadpool(
+                purge_stale_lock_files, max(CACHE_TTL_SECONDS, 3600), CACHE_SWEEP_BATCH_SIZE
+            )
+            await run_in_threadpool(CACHE_CATALOG.purge_negative)
+            for lookup_cache in (PROBE_CACHE, SEARCH_CACHE, INFO_CACHE):
+                await run_in_threadpool(lookup_cache.purge_expired, CACHE_SWEEP_BATCH_SIZE)
+            await run_in_threadpool(purge_finished_jobs, CACHE_SWEEP_BATCH_SIZE)
+            await run_in_threadpool(
+                purge_stale_partials, PARTIAL_MAX_AGE_SECONDS, CACHE_SWEEP_BATCH_SIZE
+            )
+        except Exception as exc:  # pragma: no cover - el barrido es best-effort
+            print(f"[vhs] Error en el barrido de caché: {exc}", file=sys.stderr)
+            removed = 0
+        delay = 1.0 if removed >= CACHE_SWEEP_BATCH_SIZE else CACHE_SWEEP_INTERVAL_SECONDS
 
-    normalized_format = normalize_media_format(media_format)
-    base_opts: Dict = {
-        "quiet": True,
-        "noprogress": True,
-        "noplaylist": True,
-        # Force yt-dlp to rely on the bundled CA certificates instead of the
-        # (possibly missing) system store. This avoids SSL failures when the
-        # container lacks CA data or a proxy injects a custom CA path.
-        "nocheckcertificate": False,
-        "ca_certs": CERT_BUNDLE,
-        "outtmpl": str(CACHE_DIR / f"{cache_key_value}.%(ext)s"),
-        "overwrites": True,
-        "retries": 3,
-        "http_headers": {"User-Agent": YTDLP_USER_AGENT},
-        "js_runtimes": js_runtimes or None,
-        "remote_components": ["ejs:github"],
-        "cachedir": str(YTDLP_CACHE_DIR),
-    }
 
-    if YTDLP_EXTRACTOR_ARGS:
-        base_opts["extractor_args"] = YTDLP_EXTRACTOR_ARGS
+# Bytes reservados por descargas y codificaciones en curso, por clave.
+_CACHE_RESERVATIONS: Dict[str, int] = {}
+_CACHE_RESERVATIONS_LOCK = threading.Lock()
 
-    if not force_no_proxy and YTDLP_PROXY:
-        base_opts["proxy"] = YTDLP_PROXY
-    if YTDLP_COOKIES_FILE:
-        base_opts["cookiefile"] = YTDLP_COOKIES_FILE
 
-    if normalized_format in AUDIO_FORMAT_PROFILES:
-        profile = AUDIO_FORMAT_PROFILES[normalized_format]
-        if profile.get("passthrough"):
-            return {**base_opts, "format": profile.get("format", "bestaudio/best")}
+def enforce_cache_budget(incoming_bytes: int = 0, protect: Optional[set] = None) -> int:
+    """Expulsa entradas frías hasta que ``incoming_bytes`` quepan en CACHE_MAX_BYTES.
 
-        return {
-            **base_opts,
-            "format": profile.get("format", "bestaudio/best"),
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": profile.get("codec", "mp3"),
-                    "preferredquality": str(profile.get("preferred_quality", "192")),
-                }
-            ],
-        }
+    Las entradas fijadas y las claves de ``protect`` nunca se expulsan. Las
+    reservas de otras claves en curso cuentan como ya ocupadas. Devuelve el
+    número de entradas eliminadas.
+    """
 
-    profile_key = (
-        normalized_format
-        if normalized_format in VIDEO_FORMAT_PROFILES
-        else DEFAULT_VIDEO_FORMAT
-    )
-    profile = VIDEO_FORMAT_PROFILES[profile_key]
+    if CACHE_MAX_BYTES <= 0:
+        return 0
+    protected = protect or set()
+    with _CACHE_RESERVATIONS_LOCK:
+        reserved = sum(
+            size for name, size in _CACHE_RESERVATIONS.items() if name not in protected
+        )
+    total = int(CACHE_CATALOG.stats().get("total_bytes") or 0) + reserved
+    evicted = 0
+    while total + incoming_bytes > CACHE_MAX_BYTES:
+        candidates = [
+            item
+            for item in CACHE_CATALOG.eviction_candidates(
+                CACHE_EVICTION_POLICY, limit=len(protected) + 32
+            )
+            if item.get("cache_key") not in protected
+        ]
+        if not candidates:
+            break
+        for item in candidates:
+            if total + incoming_bytes <= CACHE_MAX_BYTES:
+                break
+            size = int(item.get("filesize_bytes") or 0)
+            delete_cache_entry(item["cache_key"], item)
+            total -= size
+            evicted += 1
+            CACHE_CATALOG.increment_counter("evictions")
+            CACHE_CATALOG.increment_counter("evicted_bytes", size)
+    if total + incoming_bytes > CACHE_MAX_BYTES:
+        print(
+            "[vhs] CACHE_MAX_BYTES excedido: solo quedan entradas fijadas o protegidas",
+            file=sys.stderr,
+        )
+    return evicted
+
+
+def reserve_cache_budget(key: str, estimated_bytes: int) -> None:
+    """Hace hueco para ``key`` antes de descargar o codificar.
+
+    La reserva se mantiene hasta ``register_cache_entry`` (que corrige con el
+    tamaño real) o hasta que termina el relleno de la clave.
+    """
+
+    if CACHE_MAX_BYTES <= 0 or estimated_bytes <= 0:
+        return
+    with _CACHE_RESERVATIONS_LOCK:
+        _CACHE_RESERVATIONS[key] = int(estimated_bytes)
+    enforce_cache_budget(int(estimated_bytes), protect={key})
+
+
+def release_cache_budget(key: str) -> None:
+    with _CACHE_RESERVATIONS_LOCK:
+        _CACHE_RESERVATIONS.pop(key, None)
+
+
+def estimate_download_bytes(info: Dict[str, Any]) -> int:
+    """Tamaño esperado de los formatos elegidos por yt-dlp (0 si se desconoce)."""
+
+    total = 0
+    for fmt in info.get("requested_formats") or [info]:
+        size = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not size and fmt.get("tbr") and info.get("duration"):
+            size = float(fmt["tbr"]) * 1000 / 8 * float(info["duration"])
+        try:
+            total += int(size or 0)
+        except (TypeError, ValueError):
+            continue
+    return total
+
+
+def estimate_encoded_bytes(source_path: Path, source_meta: Dict, target_kbps: int) -> int:
+    """Estimación del resultado de ffmpeg escalando la fuente al bitrate del preset."""
+
+    try:
+        source_bytes = source_path.stat().st_size
+    except OSError:
+        source_bytes = int(source_meta.get("filesize_bytes") or 0)
+    source_kbps = int(source_meta.get("video_bitrate_kbps") or 0) + int(
+        source_meta.get("audio_bitrate_kbps") or 0
+    )
+    if target_kbps and source_kbps > target_kbps:
+        return int(source_bytes * target_kbps / source_kbps)
+    return source_bytes
+
+
+def cache_budget_hook(key: str) -> Callable[[Dict[str, Any]], None]:
+    """Hook de progreso que reserva presupuesto al conocerse el formato elegido."""
+
+    reserved: List[bool] = []
+
+    def hook(status: Dict[str, Any]) -> None:
+        if reserved or status.get("status") != "downloading":
+            return
+        reserved.append(True)
+        estimate = estimate_download_bytes(status.get("info_dict") or {}) or int(
+            status.get("total_bytes") or status.get("total_bytes_estimate") or 0
+        )
+        reserve_cache_budget(key, estimate)
+
+    return hook
+
+
+def register_cache_entry(key: str, metadata: Dict, file_path: Path) -> None:
+    """Guarda una entrada nueva haciendo hueco antes dentro del presupuesto.
+
+    Si hubo reserva previa, esta llamada la corrige con el tamaño real.
+    """
+
+    try:
+        metadata["filesize_bytes"] = file_path.stat().st_size
+    except OSError:
+        pass
+    enforce_cache_budget(int(metadata.get("filesize_bytes") or 0), protect={key})
+    save_meta(key, metadata)
+    release_cache_budget(key)
+
+
+def set_cache_entry_pinned(key: str, pinned: bool) -> Optional[Dict]:
+    metadata = load_meta(key)
+    if not metadata:
+        return None
+    metadata["pinned"] = bool(pinned)
+    save_meta(key, metadata)
+    return metadata
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    La primera llamada ejecuta el trabajo; las que llegan mientras tanto
+    esperan el mismo ``Future`` y reciben su resultado (o su excepción).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def run(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result(), True
+        try:
+            result = func()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+class ResourcePool:
+    """Límite de concurrencia con nombre para un tipo de recurso.
+
+    ``slot()`` acota una sección desde cualquier hilo; ``run()`` además ejecuta
+    la función en hilos propios del pool, fuera del threadpool compartido de
+    Starlette. Ambos comparten el cupo y anotan la cola y la espera.
+    """
+
+    def __init__(self, name: str, size: int) -> None:
+        self.name = name
+        self.size = max(1, size)
+        self._semaphore = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.waiting = 0
+        self.active = 0
+        self.acquired = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @contextmanager
+    def slot(self, queued_at: Optional[float] = None) -> Iterator[None]:
+        # Reentrante: un hilo que ya tiene cupo no vuelve a esperar por él.
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        if queued_at is None:
+            queued_at = time.monotonic()
+            with self._lock:
+                self.waiting += 1
+        try:
+            self._semaphore.acquire()
+        finally:
+            waited = time.monotonic() - queued_at
+            with self._lock:
+                self.waiting -= 1
+        with self._lock:
+            self.active += 1
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            self._semaphore.release()
+            with self._lock:
+                self.active -= 1
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.size, thread_name_prefix=f"vhs-{self.name}"
+                )
+            self.waiting += 1
+        queued_at = time.monotonic()
+
+        def call() -> Any:
+            with self.slot(queued_at):
+                return func(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "active": self.active,
+                "queued": self.waiting,
+                "acquired": self.acquired,
+                "avg_wait_ms": round(1000 * self.total_wait_seconds / self.acquired, 2)
+                if self.acquired
+                else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait_seconds, 2),
+            }
+
+
+NETWORK_POOL = ResourcePool("network", NETWORK_CONCURRENCY)
+FFMPEG_POOL = ResourcePool("ffmpeg", FFMPEG_CONCURRENCY)
+TRANSCRIPTION_POOL = ResourcePool("transcription", TRANSCRIPTION_CONCURRENCY)
+FILESYSTEM_POOL = ResourcePool("filesystem", FILESYSTEM_CONCURRENCY)
+RESOURCE_POOLS = {
+    pool.name: pool for pool in (NETWORK_POOL, FFMPEG_POOL, TRANSCRIPTION_POOL, FILESYSTEM_POOL)
+}
+
+
+class PriorityScheduler:
+    """Admisión de trabajo por carriles con turno rotatorio por cliente.
+
+    Los carriles se atienden en orden (``fast`` antes que ``web`` antes que
+    ``api``) y, dentro de cada uno, los clientes por turnos, de modo que un
+    cliente con cien peticiones en cola no retrasa al siguiente más que una.
+    El carril rápido dispone además de ``fast_slots`` reservados, así que un
+    acierto de caché no espera a que termine una recodificación. El trabajo
+    admitido se ejecuta en hilos propios (uno para el carril rápido y otro
+    para los pesados), nunca en el threadpool compartido de Starlette. La
+    admisión solo se usa desde el bucle de eventos, por lo que no necesita
+    bloqueos.
+    """
+
+    LANES = ("fast", "web", "api")
+
+    def __init__(self, slots: int, fast_slots: int) -> None:
+        self.slots = slots
+        self.fast_slots = fast_slots
+        self._running = 0
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {
+            lane: OrderedDict() for lane in self.LANES
+        }
+        self._stats = {
+            lane: {"admitted": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for lane in self.LANES
+        }
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+
+    def _executor(self, lane: str) -> ThreadPoolExecutor:
+        # La admisión ya limita lo que corre a la vez, así que los hilos de
+        # cada ejecutor nunca hacen cola.
+        name = "fast" if lane == "fast" else "heavy"
+        executor = self._executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=self._capacity(lane), thread_name_prefix=f"vhs-scheduler-{name}"
+            )
+            self._executors[name] = executor
+        return executor
+
+    def _capacity(self, lane: str) -> int:
+        return self.slots + self.fast_slots if lane == "fast" else self.slots
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for lane in self.LANES:
+            if self._running >= self._capacity(lane):
+                continue
+            clients = self._queues[lane]
+            while clients:
+                client, waiters = next(iter(clients.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    clients.move_to_end(client)
+                else:
+                    del clients[client]
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._running += 1
+            waiter.set_result(None)
+
+    async def _admit(self, lane: str, client: str) -> None:
+        has_queue = any(self._queues[name] for name in self.LANES[: self.LANES.index(lane) + 1])
+        if not has_queue and self._running < self._capacity(lane):
+            self._running += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[lane].setdefault(client, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Se concedió el turno justo al cancelar: devolverlo.
+                self._running -= 1
+                self._dispatch()
+            raise
+
+    async def run(self, lane: str, client: str, func: Callable[..., Any], *args: Any) -> Any:
+        lane = lane if lane in self._queues else "api"
+        queued_at = time.monotonic()
+        await self._admit(lane, client or "-")
+        waited = time.monotonic() - queued_at
+        stats = self._stats[lane]
+        stats["admitted"] += 1
+        stats["total_wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor(lane), lambda: func(*args)
+            )
+        except BaseException:
+            self._release()
+            raise
+        # El turno se devuelve cuando termina el hilo, no cuando el llamante
+        # deja de esperar: cancelar la petición no detiene la función.
+        future.add_done_callback(self._release)
+        return await asyncio.shield(future)
+
+    def _release(self, future: Optional[asyncio.Future] = None) -> None:
+        if future is not None and not future.cancelled():
+            # Marca la excepción como recogida si nadie la espera ya.
+            future.exception()
+        self._running -= 1
+        self._dispatch()
+
+    def close(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for lane in self.LANES:
+            stats = self._stats[lane]
+            admitted = stats["admitted"]
+            lanes[lane] = {
+                "queued": sum(len(waiters) for waiters in self._queues[lane].values()),
+                "admitted": admitted,
+                "avg_wait_ms": round(1000 * stats["total_wait_seconds"] / admitted, 2)
+                if admitted
+                else 0.0,
+                "max_wait_ms": round(1000 * stats["max_wait_seconds"], 2),
+            }
+        return {
+            "slots": self.slots,
+            "fast_slots": self.fast_slots,
+            "running": self._running,
+            "lanes": lanes,
+        }
+
+
+REQUEST_SCHEDULER = PriorityScheduler(SCHEDULER_SLOTS, SCHEDULER_FAST_SLOTS)
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def request_client_id(request: Request) -> str:
+    """Cliente para el reparto justo: IP remota, o la de X-Forwarded-For tras un proxy de confianza.
+
+    Se toma el último salto que no sea otro proxy de confianza, de modo que un
+    cliente no puede cambiar de identidad enviando la cabecera.
+    """
+
+    client = request.client.host if request.client else "-"
+    if not _is_trusted_proxy(client):
+        return client
+    hops = [
+        hop.strip()
+        for hop in (request.headers.get("x-forwarded-for") or "").split(",")
+        if hop.strip()
+    ]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else client
+
+
+def scheduler_lane(source: str, cache_hit: bool = False) -> str:
+    if cache_hit:
+        return "fast"
+    return "web" if source == "web" else "api"
+
+
+class LookupCache:
+    """Caché de dos niveles (LRU en memoria + JSON en disco) para respuestas de yt-dlp.
+
+    El nivel en disco se comparte entre workers y sobrevive a reinicios; el de
+    memoria evita leerlo en las consultas repetidas del mismo proceso.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, memory_items: int) -> None:
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._dir = LOOKUP_CACHE_DIR / name
+        self._memory_items = memory_items
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Recorrido del disco pendiente entre barridos (se retoma donde quedó).
+        self._purge_cursor: Optional[Iterator[Path]] = None
+        self._purge_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _path(self, key: str, create: bool = False) -> Path:
+        return _sharded_path(self._dir, f"{key}.json", create=create)
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        if self._memory_items <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if cached[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(cached[1])
+                del self._memory[key]
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                record = json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            record = None
+        if not isinstance(record, dict) or float(record.get("expires_at") or 0) <= now:
+            if record is not None:
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(key, float(record["expires_at"]), record.get("value"))
+        with self._lock:
+            self.hits += 1
+        return copy.deepcopy(record.get("value"))
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        self._remember(key, expires_at, copy.deepcopy(value))
+        path = self._path(key, create=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with temp_path.open("w", encoding="utf-8") as handle:
+                json.dump(
+                    {"stored_at": now, "expires_at": expires_at, "value": value},
+                    handle,
+                    ensure_ascii=False,
+                )
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as exc:
+            temp_path.unlink(missing_ok=True)
+            print(f"[vhs] No se pudo guardar la consulta {self.name}: {exc}", file=sys.stderr)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        self._path(key).unlink(missing_ok=True)
+
+    def purge_expired(self, limit: Optional[int] = None) -> int:
+        """Borra del disco los resultados caducados examinando como mucho ``limit``.
+
+        La caducidad se deduce de ``st_mtime + ttl_seconds`` (``put`` reemplaza
+        el fichero entero) sin leer el JSON, y cada llamada continúa el
+        recorrido donde lo dejó la anterior.
+        """
+
+        now = time.time()
+        removed = 0
+        with self._lock:
+            for key in [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+        with self._purge_lock:
+            if self._purge_cursor is None:
+                if not self._dir.exists():
+                    return 0
+                self._purge_cursor = self._dir.rglob("*.json")
+            examined = 0
+            for path in self._purge_cursor:
+                try:
+                    expired = path.stat().st_mtime + self.ttl_seconds <= now
+                except OSError:
+                    expired = False
+                if expired:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                examined += 1
+                if limit is not None and examined >= limit:
+                    break
+            else:
+                self._purge_cursor = None
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "memory_items": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+PROBE_CACHE = LookupCache("probe", PROBE_CACHE_TTL_SECONDS, LOOKUP_CACHE_MEMORY_ITEMS)
+SEARCH_CACHE = LookupCache("search", SEARCH_CACHE_TTL_SECONDS, LOOKUP_CACHE_MEMORY_ITEMS)
+# Los info_dict completos pesan cientos de KB: pocos en memoria, el resto en disco.
+INFO_CACHE = LookupCache("info", INFO_DICT_CACHE_TTL_SECONDS, min(LOOKUP_CACHE_MEMORY_ITEMS, 32))
+
+
+def lock_file_path(key: str) -> Path:
+    return LOCK_DIR / f"{key}.lock"
+
+
+@contextmanager
+def cache_key_file_lock(key: str) -> Iterator[None]:
+    """Bloqueo exclusivo entre procesos (flock) para una clave de caché."""
+
+    if fcntl is None:
+        yield
+        return
+    path = lock_file_path(key)
+    while True:
+        handle = path.open("a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            # Si el fichero se borró mientras esperábamos, el bloqueo obtenido
+            # es sobre un inodo huérfano: reintentar con el fichero actual.
+            try:
+                current = path.stat()
+            except FileNotFoundError:
+                current = None
+            if current is None or current.st_ino != os.fstat(handle.fileno()).st_ino:
+                handle.close()
+                continue
+            break
+        except BaseException:
+            handle.close()
+            raise
+    try:
+        yield
+    finally:
+        handle.close()
+
+
+@contextmanager
+def cache_key_file_trylock(key: str) -> Iterator[bool]:
+    """Como ``cache_key_file_lock`` pero sin esperar: indica si se obtuvo."""
+
+    if fcntl is None:
+        yield True
+        return
+    path = lock_file_path(key)
+    with path.open("a+") as handle:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            current = path.stat()
+        except (OSError, FileNotFoundError):
+            yield False
+            return
+        # Un fichero de bloqueo borrado y recreado ya no protege nada.
+        yield current.st_ino == os.fstat(handle.fileno()).st_ino
+
+
+def partial_download_dir(key: str, create: bool = False) -> Path:
+    """Directorio estable donde yt-dlp deja los parciales de ``key``."""
+
+    path = _sharded_path(PARTIAL_DIR, key, create=create)
+    if create:
+        path.mkdir(exist_ok=True)
+    return path
+
+
+def promote_partial_download(filepath: Path, key: str) -> Path:
+    """Mueve a la caché el archivo terminado y borra el resto de parciales."""
+
+    target = cache_file_path(filepath.name, create=True)
+    os.replace(filepath, target)
+    shutil.rmtree(partial_download_dir(key), ignore_errors=True)
+    return target
+
+
+def purge_stale_partials(
+    max_age_seconds: float = PARTIAL_MAX_AGE_SECONDS, limit: Optional[int] = None
+) -> int:
+    """Reclama los parciales abandonados (sin escribir desde hace ``max_age_seconds``).
+
+    Se toma el bloqueo de la clave sin esperar: si una descarga la tiene, el
+    parcial está en uso y se deja.
+    """
+
+    if not PARTIAL_DIR.exists():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for directory in [
+        path
+        for path in PARTIAL_DIR.rglob("*")
+        if path.is_dir() and re.fullmatch(r"[0-9a-f]{40}", path.name)
+    ]:
+        if limit is not None and removed >= limit:
+            break
+        try:
+            newest = max(
+                (entry.stat().st_mtime for entry in directory.iterdir()),
+                default=directory.stat().st_mtime,
+            )
+        except OSError:
+            continue
+        if newest > cutoff:
+            continue
+        if fcntl is None:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+            continue
+        try:
+            with lock_file_path(directory.name).open("a+") as handle:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def purge_stale_lock_files(max_age_seconds: float = 3600, limit: Optional[int] = None) -> int:
+    """Elimina ficheros de bloqueo antiguos que nadie tiene tomados."""
+
+    if fcntl is None:
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for path in LOCK_DIR.glob("*.lock"):
+        if limit is not None and removed >= limit:
+            break
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+            with path.open("a+") as handle:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                path.unlink(missing_ok=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def coalesced_cache_fill(
+    key: str, produce: Callable[[], Tuple[Path, Dict]]
+) -> Tuple[Path, Dict]:
+    """Sirve ``key`` desde caché o la genera una sola vez aunque haya peticiones concurrentes.
+
+    Dentro del proceso las peticiones duplicadas esperan al mismo ``Future``;
+    entre workers se serializan con un fichero de bloqueo y la caché se vuelve
+    a consultar tras obtenerlo.
+    """
+
+    cached_path, cached_meta = fetch_cached_file(key)
+    if cached_path:
+        return cached_path, cached_meta or {}
+
+    def _leader() -> Tuple[Path, Dict]:
+        with cache_key_file_lock(key):
+            locked_path, locked_meta = fetch_cached_file(key)
+            if locked_path:
+                return locked_path, locked_meta or {}
+            try:
+                return produce()
+            finally:
+                release_cache_budget(key)
+
+    (file_path, metadata), shared = SINGLE_FLIGHT.run(key, _leader)
+    if shared:
+        return file_path, {**metadata, "_cache_hit": True, "_coalesced": True}
+    return file_path, metadata
+
+
+def save_meta(key: str, metadata: Dict) -> None:
+    sanitized = {k: v for k, v in metadata.items() if not k.startswith("_")}
+    sanitized["cache_key"] = key
+    CACHE_CATALOG.put(key, sanitized)
+
+
+def download_tuning_options(media_format: str) -> Dict[str, int]:
+    """Devuelve los ajustes de fragmentos y bloques de yt-dlp para un perfil."""
+
+    normalized = normalize_media_format(media_format)
+    profile = AUDIO_FORMAT_PROFILES.get(normalized) or VIDEO_FORMAT_PROFILES.get(
+        normalized, {}
+    )
+    tuning: Dict[str, Any] = {
+        "concurrent_fragment_downloads": YTDLP_CONCURRENT_FRAGMENTS,
+        "http_chunk_size": YTDLP_HTTP_CHUNK_SIZE,
+        "buffersize": YTDLP_BUFFER_SIZE,
+    }
+    for source in (profile, YTDLP_DOWNLOAD_TUNING.get(normalized) or {}):
+        tuning.update({key: source[key] for key in DOWNLOAD_TUNING_KEYS if key in source})
+
+    options: Dict[str, int] = {
+        "concurrent_fragment_downloads": max(1, int(tuning["concurrent_fragment_downloads"] or 1))
+    }
+    # 0 (o vacío) deja el comportamiento por defecto de yt-dlp.
+    for key in ("http_chunk_size", "buffersize"):
+        value = int(tuning[key] or 0)
+        if value > 0:
+            options[key] = value
+    return options
+
+
+def detect_js_runtimes() -> Dict[str, Dict[str, str]]:
+    for candidate in ("node", "nodejs"):
+        path = shutil.which(candidate)
+        if path:
+            return {candidate: {"executable": path}}
+    return {}
+
+
+# Opciones comunes a todas las llamadas de yt-dlp, calculadas una vez al arrancar
+# (incluida la búsqueda del runtime de JS).
+YTDLP_JS_RUNTIMES = detect_js_runtimes()
+YTDLP_BASE_OPTIONS: Dict[str, Any] = {
+    "quiet": True,
+    "noprogress": True,
+    "noplaylist": True,
+    # Force yt-dlp to rely on the bundled CA certificates instead of the
+    # (possibly missing) system store. This avoids SSL failures when the
+    # container lacks CA data or a proxy injects a custom CA path.
+    "nocheckcertificate": False,
+    "ca_certs": CERT_BUNDLE,
+    "overwrites": True,
+    "retries": 3,
+    "http_headers": {"User-Agent": YTDLP_USER_AGENT},
+    "js_runtimes": YTDLP_JS_RUNTIMES or None,
+    "remote_components": ["ejs:github"],
+    "cachedir": str(YTDLP_CACHE_DIR),
+}
+if YTDLP_EXTRACTOR_ARGS:
+    YTDLP_BASE_OPTIONS["extractor_args"] = YTDLP_EXTRACTOR_ARGS
+
+
+class YoutubeDLPool:
+    """Instancias de ``yt_dlp.YoutubeDL`` ya inicializadas, por huella de opciones.
+
+    Crear una instancia carga los extractores, la configuración de red y las
+    cookies. Aquí se reutilizan entre peticiones con las mismas opciones (proxy,
+    perfil de formato, agente de usuario…). Lo que cambia en cada petición
+    (plantilla de salida, formato, hooks de progreso, cachedir…) no forma parte
+    de la huella y se aplica al sacar la instancia del pool. Todas comparten el
+    tarro de cookies de YTDLP_COOKIES_FILE, cargado una sola vez.
+    """
+
+    REQUEST_OPTIONS = ("outtmpl", "format", "progress_hooks", "overwrites", "continuedl", "cachedir")
+    # Internos de yt-dlp que se reajustan al reutilizar una instancia.
+    REUSE_ATTRIBUTES = (
+        "_parse_outtmpl",
+        "build_format_selector",
+        "format_selector",
+        "_progress_hooks",
+        "_num_downloads",
+        "_download_retcode",
+    )
+
+    def __init__(self, size: int, max_keys: int) -> None:
+        self.size = size
+        self.max_keys = max_keys
+        self._idle: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._cookiejar: Any = None
+        self._checked = False
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @staticmethod
+    def fingerprint(opts: Dict[str, Any]) -> str:
+        stable = {
+            name: value for name, value in opts.items() if name not in YoutubeDLPool.REQUEST_OPTIONS
+        }
+        raw = json.dumps(stable, sort_keys=True, default=repr)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _check_support(self) -> None:
+        """Desactiva el pool si esta versión de yt-dlp no expone lo que reajusta."""
+
+        with self._lock:
+            if self._checked:
+                return
+            self._checked = True
+        try:
+            probe = yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True})
+            missing = [name for name in self.REUSE_ATTRIBUTES if not hasattr(probe, name)]
+            if not isinstance(getattr(yt_dlp.YoutubeDL, "cookiejar", None), functools.cached_property):
+                missing.append("cookiejar")
+            probe.close()
+        except Exception as exc:  # pragma: no cover - depende de la versión instalada
+            missing = [repr(exc)]
+        if missing:
+            print(
+                f"[vhs] yt-dlp {yt_dlp.version.__version__} no permite reutilizar instancias "
+                f"({', '.join(missing)}); YTDLP_POOL_SIZE pasa a 0",
+                file=sys.stderr,
+            )
+            self.size = 0
+
+    def _shared_cookiejar(self, opts: Dict[str, Any]) -> Any:
+        if opts.get("cookiefile") != YTDLP_COOKIES_FILE or not YTDLP_COOKIES_FILE:
+            return None
+        with self._lock:
+            if self._cookiejar is None:
+                self._cookiejar = yt_dlp.cookies.load_cookies(YTDLP_COOKIES_FILE, None, None)
+            return self._cookiejar
+
+    def _create(self, opts: Dict[str, Any]) -> Any:
+        base = {name: value for name, value in opts.items() if name not in self.REQUEST_OPTIONS}
+        ydl = yt_dlp.YoutubeDL(base)
+        cookiejar = self._shared_cookiejar(opts)
+        if cookiejar is not None:
+            # ``cookiejar`` es un cached_property: se fija antes del primer uso.
+            ydl.__dict__["cookiejar"] = cookiejar
+        with self._lock:
+            self.created += 1
+        return ydl
+
+    @staticmethod
+    def _apply_request_options(ydl: Any, opts: Dict[str, Any]) -> None:
+        params = ydl.params
+        for name in ("overwrites", "continuedl", "cachedir"):
+            if name in opts:
+                params[name] = opts[name]
+            else:
+                params.pop(name, None)
+        params["outtmpl"] = opts.get("outtmpl") or {}
+        ydl._parse_outtmpl()
+        requested_format = opts.get("format")
+        if requested_format != params.get("format") or "format" not in params:
+            params["format"] = requested_format
+            ydl.format_selector = (
+                requested_format
+                if requested_format in (None, "-") or callable(requested_format)
+                else ydl.build_format_selector(requested_format)
+            )
+        ydl._progress_hooks = list(opts.get("progress_hooks") or [])
+        ydl._num_downloads = 0
+        ydl._download_retcode = 0
+
+    @contextmanager
+    def instance(self, opts: Dict[str, Any]) -> Iterator[Any]:
+        """Equivalente a ``with yt_dlp.YoutubeDL(opts)`` que reutiliza instancias."""
+
+        if self.size > 0 and not self._checked:
+            self._check_support()
+        if self.size <= 0:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                yield ydl
+            return
+        key = self.fingerprint(opts)
+        ydl = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                ydl = idle.pop()
+                self._idle.move_to_end(key)
+                self.reused += 1
+        if ydl is None:
+            ydl = self._create(opts)
+        try:
+            self._apply_request_options(ydl, opts)
+            yield ydl
+        except BaseException:
+            # Tras un error no se sabe en qué estado quedó: no se reutiliza.
+            self._close(ydl)
+            raise
+        ydl._progress_hooks = []
+        evicted: List[Any] = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.size:
+                idle.append(ydl)
+                ydl = None
+            while len(self._idle) > self.max_keys:
+                _, dropped = self._idle.popitem(last=False)
+                evicted.extend(dropped)
+        for item in ([ydl] if ydl is not None else []) + evicted:
+            self._close(item)
+
+    def _close(self, ydl: Any) -> None:
+        with self._lock:
+            self.discarded += 1
+        if self._cookiejar is not None and ydl.params.get("cookiefile") == YTDLP_COOKIES_FILE:
+            # El tarro compartido se guarda una sola vez, en close().
+            ydl.params["cookiefile"] = None
+        try:
+            ydl.close()
+        except Exception as exc:  # pragma: no cover - best-effort
+            print(f"[vhs] No se pudo cerrar una instancia de yt-dlp: {exc}", file=sys.stderr)
+
+    def close(self) -> None:
+        with self._lock:
+            instances = [ydl for idle in self._idle.values() for ydl in idle]
+            self._idle.clear()
+        for ydl in instances:
+            self._close(ydl)
+        with self._lock:
+            if self._cookiejar is None:
+                return
+            target = Path(YTDLP_COOKIES_FILE)
+            temp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+            try:
+                self._cookiejar.save(filename=str(temp_path))
+                os.replace(temp_path, target)
+            except OSError as exc:
+                temp_path.unlink(missing_ok=True)
+                print(f"[vhs] No se pudieron guardar las cookies de yt-dlp: {exc}", file=sys.stderr)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "keys": len(self._idle),
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+            }
+
+
+YTDLP_POOL = YoutubeDLPool(YTDLP_POOL_SIZE, YTDLP_POOL_MAX_KEYS)
+
+
+def build_ydl_options(
+    media_format: str, *, cache_key_value: str, force_no_proxy: bool = False
+) -> Dict:
+    normalized_format = normalize_media_format(media_format)
+    base_opts: Dict = {
+        **copy.deepcopy(YTDLP_BASE_OPTIONS),
+        # Sin crear directorios: los probes y las rutas sin caché no deben dejar
+        # subdirectorios vacíos. Quien descarga a la caché crea su destino.
+        "outtmpl": str(_sharded_path(CACHE_DIR, f"{cache_key_value}.%(ext)s", create=False)),
+    }
+
+    if not force_no_proxy and YTDLP_PROXY:
+        base_opts["proxy"] = YTDLP_PROXY
+    if YTDLP_COOKIES_FILE:
+        base_opts["cookiefile"] = YTDLP_COOKIES_FILE
+
+    if normalized_format in AUDIO_FORMAT_PROFILES:
+        profile = AUDIO_FORMAT_PROFILES[normalized_format]
+        if profile.get("passthrough"):
+            return {
+                **base_opts,
+                **download_tuning_options(normalized_format),
+                "format": profile.get("format", "bestaudio/best"),
+            }
+
+        return {
+            **base_opts,
+            **download_tuning_options(normalized_format),
+            "format": profile.get("format", "bestaudio/best"),
+            "postprocessors": [
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": profile.get("codec", "mp3"),
+                    "preferredquality": str(profile.get("preferred_quality", "192")),
+                }
+            ],
+        }
+
+    profile_key = (
+        normalized_format
+        if normalized_format in VIDEO_FORMAT_PROFILES
+        else DEFAULT_VIDEO_FORMAT
+    )
+    profile = VIDEO_FORMAT_PROFILES[profile_key]
     return {
         **base_opts,
+        **download_tuning_options(profile_key),
         "format": profile.get("format", "bv*+ba/b"),
         "merge_output_format": profile.get("merge_output_format", "mp4"),
     }
@@ -1329,7 +3606,7 @@ def extract_info_with_user_agent_retries(
         headers["User-Agent"] = current_agent
         opts["http_headers"] = headers
         try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
+            with NETWORK_POOL.slot(), YTDLP_POOL.instance(opts) as ydl:
                 return ydl.extract_info(url, download=download)
         except Exception as exc:  # pragma: no cover - passthrough errors
             last_error = exc
@@ -1338,80 +3615,538 @@ def extract_info_with_user_agent_retries(
             current_agent = _generate_user_agent()
             time.sleep(delay)
 
-    if last_error:
-        raise last_error
-    raise DownloadError("Fallo inesperado al extraer información")
+    if last_error:
+        raise last_error
+    raise DownloadError("Fallo inesperado al extraer información")
+
+
+# Fragmentos (en minúsculas) de errores de yt-dlp que no se arreglan reintentando.
+PERMANENT_ERROR_MARKERS = (
+    "private video",
+    "video unavailable",
+    "this video is unavailable",
+    "is not available in your country",
+    "geo restrict",
+    "geo-restrict",
+    "has been removed",
+    "has been terminated",
+    "copyright",
+    "unsupported url",
+    "members-only",
+    "join this channel",
+    "confirm your age",
+    "age-restricted",
+    "video does not exist",
+    "channel does not exist",
+    "playlist does not exist",
+    "http error 404",
+    "http error 410",
+)
+# Errores que dependen del formato pedido y no de la fuente: no se recuerdan.
+FORMAT_ERROR_MARKERS = ("requested format is not available",)
+
+
+# Fallos del extractor o de la red: los únicos que describen a la fuente.
+SOURCE_ERROR_TYPES = (
+    yt_dlp.utils.ExtractorError,
+    yt_dlp.utils.ContentTooShortError,
+    yt_dlp.networking.exceptions.RequestError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def _source_error(error: BaseException) -> Optional[BaseException]:
+    """Fallo de extracción o de red en el origen de ``error`` (``None`` si es local).
+
+    Recorre las causas encadenadas y el ``exc_info`` de los DownloadError de
+    yt-dlp; un error de postprocesado (fusión con ffmpeg, disco lleno…) no cuenta.
+    """
+
+    current: Optional[BaseException] = error
+    seen: set = set()
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if isinstance(current, yt_dlp.utils.PostProcessingError):
+            return None
+        if isinstance(current, SOURCE_ERROR_TYPES):
+            return current
+        exc_info = getattr(current, "exc_info", None)
+        nested = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        current = nested or current.__cause__
+    return None
+
+
+def classify_download_error(error: Exception) -> Optional[str]:
+    """Clase del fallo para la caché negativa: ``bot_check``, ``permanent`` o ``transient``.
+
+    Devuelve ``None`` si el error no debe afectar a otras peticiones de la misma
+    fuente: errores del formato pedido o locales (postprocesado, disco, rutas).
+    """
+
+    if _source_error(error) is None:
+        return None
+    message = str(error).lower()
+    if any(marker in message for marker in FORMAT_ERROR_MARKERS):
+        return None
+    if _should_retry_with_new_user_agent(error):
+        return "bot_check"
+    if any(marker in message for marker in PERMANENT_ERROR_MARKERS):
+        return "permanent"
+    return "transient"
+
+
+def negative_cache_ref(url: str, identity: Optional[str]) -> str:
+    return f"media:{identity}" if identity else url.strip()
+
+
+def raise_if_negatively_cached(url: str, identity: Optional[str]) -> None:
+    """Repite al instante un fallo reciente de la misma fuente en lugar de volver a la red."""
+
+    record = CACHE_CATALOG.get_negative(negative_cache_ref(url, identity))
+    if not record:
+        return
+    CACHE_CATALOG.increment_counter("negative_hits")
+    CACHE_CATALOG.increment_counter(f"negative_hits_{record['error_class']}")
+    remaining = max(1, int(float(record["expires_at"]) - time.time()))
+    raise DownloadError(
+        f"{record.get('message') or 'Fallo en el origen'} "
+        f"(fallo reciente en caché; se reintentará dentro de {remaining} s)"
+    )
+
+
+def record_negative_result(url: str, identity: Optional[str], error: Exception) -> None:
+    error_class = classify_download_error(error)
+    ttl = NEGATIVE_CACHE_TTLS.get(error_class, 0) if error_class else 0
+    if ttl <= 0:
+        return
+    now = time.time()
+    try:
+        CACHE_CATALOG.put_negative(
+            negative_cache_ref(url, identity),
+            {
+                "error_class": error_class,
+                "message": str(error)[:500],
+                "created_at": now,
+                "expires_at": now + ttl,
+            },
+        )
+        CACHE_CATALOG.increment_counter("negative_stores")
+        CACHE_CATALOG.increment_counter(f"negative_stores_{error_class}")
+    except Exception as exc:  # pragma: no cover - la caché negativa es best-effort
+        print(f"[vhs] No se pudo registrar el fallo de {url}: {exc}", file=sys.stderr)
+
+
+def negative_cache_stats() -> Dict[str, Any]:
+    counters = CACHE_CATALOG.counters()
+    return {
+        "hits": counters.get("negative_hits", 0),
+        "stores": counters.get("negative_stores", 0),
+        "hits_by_class": {
+            name: counters.get(f"negative_hits_{name}", 0) for name in NEGATIVE_CACHE_TTLS
+        },
+        "stores_by_class": {
+            name: counters.get(f"negative_stores_{name}", 0) for name in NEGATIVE_CACHE_TTLS
+        },
+        "ttl_seconds": dict(NEGATIVE_CACHE_TTLS),
+    }
+
+
+def _extract_media_stats(info: Dict[str, Any]) -> Dict[str, Any]:
+    def _as_int(value: Any) -> Optional[int]:
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+
+    candidate: Dict[str, Any] = {}
+    requested = info.get("requested_downloads") or []
+    if isinstance(requested, list) and requested:
+        maybe = requested[0]
+        if isinstance(maybe, dict):
+            candidate = maybe
+    if not candidate:
+        candidate = info
+
+    width = _as_int(candidate.get("width") or info.get("width"))
+    height = _as_int(candidate.get("height") or info.get("height"))
+    abr = _as_int(candidate.get("abr") or info.get("abr"))
+    vbr = _as_int(candidate.get("vbr") or candidate.get("tbr") or info.get("tbr"))
+    fps = _as_int(candidate.get("fps") or info.get("fps"))
+    filesize = _as_int(
+        candidate.get("filesize")
+        or candidate.get("filesize_approx")
+        or info.get("filesize")
+        or info.get("filesize_approx")
+    )
+
+    metadata: Dict[str, Any] = {}
+    if width:
+        metadata["width"] = width
+    if height:
+        metadata["height"] = height
+    if abr:
+        metadata["audio_bitrate_kbps"] = abr
+    if vbr:
+        metadata["video_bitrate_kbps"] = vbr
+    if fps:
+        metadata["fps"] = fps
+    if filesize:
+        metadata["filesize_bytes"] = filesize
+    format_id = candidate.get("format_id") or info.get("format_id")
+    if isinstance(format_id, str):
+        metadata["format_id"] = format_id
+    return metadata
+
+
+YOUTUBE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+YOUTUBE_HOSTS = {
+    "youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+}
+# Reglas baratas (sin red) para los servicios más habituales. Las claves de
+# extractor coinciden con ``extractor_key`` de yt-dlp para que las identidades
+# obtenidas por reglas y por extracción sean idénticas.
+MEDIA_PATH_RULES: List[Tuple[Tuple[str, ...], "re.Pattern[str]", str]] = [
+    (("vimeo.com",), re.compile(r"^/(?:channels/[^/]+/|groups/[^/]+/videos/)?(\d+)(?:/|$)"), "Vimeo"),
+    (("player.vimeo.com",), re.compile(r"^/video/(\d+)(?:/|$)"), "Vimeo"),
+    (("dailymotion.com",), re.compile(r"^/video/([A-Za-z0-9]+)"), "Dailymotion"),
+    (("dai.ly",), re.compile(r"^/([A-Za-z0-9]+)/?$"), "Dailymotion"),
+    (("tiktok.com",), re.compile(r"^/@[^/]+/video/(\d+)"), "TikTok"),
+    (("twitter.com", "x.com", "mobile.twitter.com"), re.compile(r"^/[^/]+/status/(\d+)"), "Twitter"),
+    (("instagram.com",), re.compile(r"^/(?:[^/]+/)?(?:p|reel|reels|tv)/([A-Za-z0-9_-]+)"), "Instagram"),
+]
+
+
+def normalize_source_url(url: str) -> str:
+    """Normaliza una URL para usarla como alias (sin fragmento, host en minúsculas)."""
+
+    value = (url or "").strip()
+    try:
+        parts = urlsplit(value)
+    except ValueError:
+        return value
+    if not parts.scheme or not parts.netloc:
+        return value
+    return parts._replace(netloc=parts.netloc.lower(), fragment="").geturl()
+
+
+def identity_from_url_rules(url: str) -> Optional[str]:
+    try:
+        parts = urlsplit((url or "").strip())
+    except ValueError:
+        return None
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path or "/"
+
+    if host == "youtu.be":
+        candidate = path.strip("/").split("/", 1)[0]
+        return f"Youtube:{candidate}" if YOUTUBE_ID_PATTERN.match(candidate) else None
+    if host in YOUTUBE_HOSTS:
+        if path in {"/watch", "/watch/"}:
+            candidate = (parse_qs(parts.query).get("v") or [""])[0]
+        else:
+            match = re.match(r"^/(?:shorts|embed|live|v|e)/([^/?#]+)", path)
+            candidate = match.group(1) if match else ""
+        return f"Youtube:{candidate}" if YOUTUBE_ID_PATTERN.match(candidate) else None
+
+    for hosts, pattern, extractor_key in MEDIA_PATH_RULES:
+        if host in hosts:
+            match = pattern.match(path)
+            if match:
+                return f"{extractor_key}:{match.group(1)}"
+    return None
+
+
+def identity_from_info(info: Dict[str, Any]) -> Optional[str]:
+    extractor_key = info.get("extractor_key") or info.get("ie_key")
+    media_id = info.get("id")
+    if extractor_key and media_id:
+        return f"{extractor_key}:{media_id}"
+    return None
+
+
+def record_media_alias(url: str, info: Dict[str, Any]) -> Optional[str]:
+    """Asocia la URL a la identidad que yt-dlp ya devolvió (sin coste de red)."""
+
+    identity = identity_from_info(info)
+    if identity:
+        try:
+            CACHE_CATALOG.put_alias(normalize_source_url(url), identity)
+        except Exception as exc:  # pragma: no cover - best-effort
+            print(f"[vhs] No se pudo registrar el alias de {url}: {exc}", file=sys.stderr)
+    return identity
+
+
+def _extract_identity_flat(url: str) -> Optional[str]:
+    ydl_opts = build_ydl_options(DEFAULT_VIDEO_FORMAT, cache_key_value="identity")
+    ydl_opts["skip_download"] = True
+    try:
+        with NETWORK_POOL.slot(), YTDLP_POOL.instance(ydl_opts) as ydl:
+            # process=False ejecuta solo el extractor: sin selección de formatos
+            # ni resolución de firmas.
+            info = ydl.extract_info(url, download=False, process=False)
+    except Exception as exc:  # pragma: no cover - errores de red/extractor
+        print(f"[vhs] No se pudo resolver la identidad de {url}: {exc}", file=sys.stderr)
+        return None
+    if not isinstance(info, dict):
+        return None
+    identity = identity_from_info(info)
+    if not identity and info.get("_type") in {"url", "url_transparent"} and info.get("url"):
+        identity = identity_from_url_rules(str(info["url"]))
+    return identity
+
+
+def extract_playlist_entries(url: str, limit: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Extracción plana de una lista o canal: URL, título e id de cada entrada.
+
+    Las entradas quedan registradas como alias de su identidad, así que luego
+    se cachean con la misma clave que si se pidieran sueltas. Las sublistas del
+    mismo extractor (pestañas de un canal) se expanden un nivel.
+    """
+
+    ydl_opts = build_ydl_options(DEFAULT_VIDEO_FORMAT, cache_key_value="playlist")
+    ydl_opts.update(
+        noplaylist=False, extract_flat="in_playlist", skip_download=True, playlistend=limit
+    )
+    entries: List[Dict[str, Any]] = []
+    seen: set = set()
+
+    def extract(target: str) -> Dict[str, Any]:
+        with NETWORK_POOL.slot():
+            info = extract_info_with_user_agent_retries(target, ydl_opts=ydl_opts, download=False)
+        if not isinstance(info, dict):
+            raise DownloadError("yt-dlp no devolvió información de la lista")
+        return info
+
+    def collect(node: Dict[str, Any], depth: int) -> None:
+        container_key = node.get("extractor_key") or node.get("ie_key")
+        for entry in node.get("entries") or []:
+            if len(entries) >= limit:
+                return
+            if not isinstance(entry, dict):
+                continue
+            if entry.get("_type") == "playlist" and depth < 2:
+                collect(entry, depth + 1)
+                continue
+            entry_url = str(entry.get("url") or entry.get("webpage_url") or "")
+            if not entry_url.startswith(("http://", "https://")):
+                entry_url = str(entry.get("webpage_url") or "")
+            if not entry_url.startswith(("http://", "https://")) or entry_url in seen:
+                continue
+            if entry.get("_type") == "url" and entry.get("ie_key") == container_key and depth < 2:
+                collect(extract(entry_url), depth + 1)
+                continue
+            seen.add(entry_url)
+            record_media_alias(entry_url, entry)
+            entries.append(
+                {
+                    "url": entry_url,
+                    "title": entry.get("title"),
+                    "id": entry.get("id"),
+                    "duration": entry.get("duration"),
+                }
+            )
+
+    info = extract(url)
+    if info.get("_type") in {"playlist", "multi_video"} or info.get("entries") is not None:
+        collect(info, 0)
+    else:
+        # Un vídeo suelto en modo lista es una lista de una entrada.
+        record_media_alias(url, info)
+        entries.append(
+            {
+                "url": url,
+                "title": info.get("title"),
+                "id": info.get("id"),
+                "duration": info.get("duration"),
+            }
+        )
+    if not entries:
+        raise DownloadError("La lista no tiene entradas descargables")
+    return info, entries
+
+
+def resolve_media_identity(url: str, allow_network: bool = True) -> Optional[str]:
+    """Devuelve ``extractor_key:id`` para la URL o ``None`` si no se puede resolver.
+
+    Primero aplica reglas de URL, después los alias registrados y, solo si se
+    permite, una extracción plana de yt-dlp cuyo resultado queda como alias.
+    """
+
+    identity = identity_from_url_rules(url)
+    if identity:
+        return identity
+    normalized = normalize_source_url(url)
+    identity = CACHE_CATALOG.get_alias(normalized)
+    if identity or not allow_network or not MEDIA_IDENTITY_EXTRACT_FALLBACK:
+        return identity
+    identity = _extract_identity_flat(url)
+    if identity:
+        CACHE_CATALOG.put_alias(normalized, identity)
+    return identity
+
+
+def media_cache_ref(url: str, allow_network: bool = True) -> str:
+    """Referencia estable de la fuente usada para derivar las claves de caché."""
 
+    identity = resolve_media_identity(url, allow_network=allow_network)
+    return f"media:{identity}" if identity else url.strip()
 
-def _extract_media_stats(info: Dict[str, Any]) -> Dict[str, Any]:
-    def _as_int(value: Any) -> Optional[int]:
-        try:
-            return int(float(value))
-        except (TypeError, ValueError):
-            return None
 
-    candidate: Dict[str, Any] = {}
-    requested = info.get("requested_downloads") or []
-    if isinstance(requested, list) and requested:
-        maybe = requested[0]
-        if isinstance(maybe, dict):
-            candidate = maybe
-    if not candidate:
-        candidate = info
+def resolve_request_identity(url: str) -> Optional[str]:
+    """Identidad para una petición que va a la red.
 
-    width = _as_int(candidate.get("width") or info.get("width"))
-    height = _as_int(candidate.get("height") or info.get("height"))
-    abr = _as_int(candidate.get("abr") or info.get("abr"))
-    vbr = _as_int(candidate.get("vbr") or candidate.get("tbr") or info.get("tbr"))
-    fps = _as_int(candidate.get("fps") or info.get("fps"))
-    filesize = _as_int(
-        candidate.get("filesize")
-        or candidate.get("filesize_approx")
-        or info.get("filesize")
-        or info.get("filesize_approx")
-    )
+    Reglas y alias primero; si no bastan, se consulta la caché negativa antes
+    de la extracción plana, que no se repite para una URL que acaba de fallar.
+    """
 
-    metadata: Dict[str, Any] = {}
-    if width:
-        metadata["width"] = width
-    if height:
-        metadata["height"] = height
-    if abr:
-        metadata["audio_bitrate_kbps"] = abr
-    if vbr:
-        metadata["video_bitrate_kbps"] = vbr
-    if fps:
-        metadata["fps"] = fps
-    if filesize:
-        metadata["filesize_bytes"] = filesize
-    format_id = candidate.get("format_id") or info.get("format_id")
-    if isinstance(format_id, str):
-        metadata["format_id"] = format_id
-    return metadata
+    identity = resolve_media_identity(url, allow_network=False)
+    if identity is None:
+        raise_if_negatively_cached(url, None)
+        identity = resolve_media_identity(url)
+    return identity
 
 
 def download_media(url: str, media_format: str) -> Tuple[Path, Dict]:
     normalized_format = normalize_media_format(media_format)
-    key = cache_key(url, normalized_format)
-    purge_expired_entries()
-    cached_path, cached_meta = fetch_cached_file(key)
-    if cached_path:
-        return cached_path, cached_meta or {}
+    identity = resolve_request_identity(url)
+    key = cache_key(f"media:{identity}" if identity else url.strip(), normalized_format)
+    return coalesced_cache_fill(
+        key, lambda: _download_media_into_cache(url, normalized_format, key, identity)
+    )
+
+
+# Hermanos en caché que contienen la mejor pista de audio, por orden de preferencia.
+AUDIO_SOURCE_VIDEO_FORMATS = ["video_max", "video_1080", "video_med", "video_low"]
+
+
+def derive_audio_from_cached_video(
+    url: str, normalized_format: str, key: str, identity: str
+) -> Optional[Tuple[Path, Dict]]:
+    """Genera un perfil de audio con ffmpeg a partir de un vídeo ya cacheado.
+
+    Devuelve ``None`` si no hay ningún hermano utilizable, en cuyo caso la
+    descarga sigue por la red como siempre.
+    """
+
+    profile = AUDIO_FORMAT_PROFILES.get(normalized_format)
+    if not profile:
+        return None
+    siblings = CACHE_CATALOG.find_by_identity(identity, AUDIO_SOURCE_VIDEO_FORMATS)
+    siblings.sort(key=lambda item: AUDIO_SOURCE_VIDEO_FORMATS.index(item["media_format"]))
+    for sibling in siblings:
+        source_path, source_meta = fetch_cached_file(sibling["cache_key"])
+        if not source_path or not source_meta:
+            continue
+        if profile.get("passthrough"):
+            # Copia del flujo de audio sin recomprimir (solo válida si el códec
+            # cabe en OGG, p. ej. Opus; si no, se prueba otra fuente o la red).
+            output_path = cache_file_path(f"{key}.ogg", create=True)
+            args = ["-vn", "-c:a", "copy"]
+        else:
+            codec = profile.get("codec", "mp3")
+            output_path = cache_file_path(f"{key}.{codec}", create=True)
+            encoder = "libmp3lame" if codec == "mp3" else codec
+            args = ["-vn", "-c:a", encoder, "-b:a", f"{profile.get('preferred_quality', '96')}k"]
+        if profile.get("passthrough"):
+            target_kbps = int(source_meta.get("audio_bitrate_kbps") or 0)
+        else:
+            target_kbps = int(profile.get("preferred_quality", "96"))
+        reserve_cache_budget(key, estimate_encoded_bytes(source_path, source_meta, target_kbps))
+        output_path.unlink(missing_ok=True)
+        try:
+            run_ffmpeg(source_path, output_path, args)
+        except DownloadError as exc:
+            cleanup_path(output_path)
+            print(
+                f"[vhs] No se pudo derivar {normalized_format} de {sibling['cache_key']}: {exc}",
+                file=sys.stderr,
+            )
+            continue
+
+        metadata: Dict[str, Any] = {
+            "title": source_meta.get("title") or "audio",
+            "filename": output_path.name,
+            "source_url": url,
+            "media_format": normalized_format,
+            "downloaded_at": time.time(),
+            "cache_key": key,
+            "media_identity": identity,
+            "derived_from": sibling["cache_key"],
+        }
+        if profile.get("passthrough"):
+            if source_meta.get("audio_bitrate_kbps"):
+                metadata["audio_bitrate_kbps"] = source_meta["audio_bitrate_kbps"]
+        else:
+            metadata["audio_bitrate_kbps"] = int(profile.get("preferred_quality", "96"))
+        metadata["_cache_hit"] = False
+        register_cache_entry(key, metadata, output_path)
+        return output_path, metadata
+    return None
+
+
+def _download_media_into_cache(
+    url: str, normalized_format: str, key: str, identity: Optional[str] = None
+) -> Tuple[Path, Dict]:
+    if identity and normalized_format in AUDIO_FORMAT_PROFILES:
+        derived = derive_audio_from_cached_video(url, normalized_format, key, identity)
+        if derived:
+            return derived
 
     def extract(force_no_proxy: bool = False) -> Dict:
         ydl_opts = build_ydl_options(
             normalized_format, cache_key_value=key, force_no_proxy=force_no_proxy
         )
+        # Los parciales viven en un directorio estable por clave y sin
+        # sobrescritura, de modo que un reintento (o el siguiente worker)
+        # continúa donde se quedó la descarga anterior.
+        ydl_opts.update(
+            outtmpl=str(partial_download_dir(key, create=True) / f"{key}.%(ext)s"),
+            overwrites=False,
+            continuedl=True,
+        )
+        hooks = [cache_budget_hook(key)] if CACHE_MAX_BYTES > 0 else []
+        job = current_job()
+        if job is not None:
+            hooks.append(ytdlp_progress_hook(job))
+        if hooks:
+            ydl_opts["progress_hooks"] = hooks
+        stored_info = None if force_no_proxy else load_reusable_info(url, identity)
+        if stored_info is not None:
+            # Solo selección de formato y descarga: sin volver a pasar por el
+            # extractor (ni por los desafíos JS) de la fuente.
+            try:
+                with NETWORK_POOL.slot(), YTDLP_POOL.instance(ydl_opts) as ydl:
+                    return ydl.process_ie_result(stored_info, download=True)
+            except Exception as exc:  # pragma: no cover - se reintenta extrayendo
+                forget_info_dict(url, identity)
+                print(
+                    f"[vhs] No se pudo reutilizar el info_dict de {url}, se extrae de nuevo: {exc}",
+                    file=sys.stderr,
+                )
         try:
-            return extract_info_with_user_agent_retries(
+            info = extract_info_with_user_agent_retries(
                 url, ydl_opts=ydl_opts, download=True
             )
         except Exception as exc:  # pragma: no cover - yt-dlp errors are direct
             if not force_no_proxy and should_retry_without_proxy(exc):
                 return extract(force_no_proxy=True)
             raise DownloadError(str(exc)) from exc
+        remember_info_dict(url, identity, info)
+        return info
 
-    info = extract()
+    raise_if_negatively_cached(url, identity)
+    try:
+        with job_stage("download"):
+            info = extract()
+    except DownloadError as exc:
+        record_negative_result(url, identity, exc)
+        raise
 
     requested = info.get("requested_downloads") or []
     if requested:
@@ -1427,6 +4162,7 @@ def download_media(url: str, media_format: str) -> Tuple[Path, Dict]:
     # Para audio_max, hacer remux de WebM a OGG (sin recodificar)
     if normalized_format == "audio_max":
         filepath = remux_to_ogg(filepath)
+    filepath = promote_partial_download(filepath, key)
 
     title = info.get("title") or "video"
     metadata = {
@@ -1438,17 +4174,22 @@ def download_media(url: str, media_format: str) -> Tuple[Path, Dict]:
         "cache_key": key,
         **_extract_media_stats(info),
     }
-    try:
-        metadata["filesize_bytes"] = filepath.stat().st_size
-    except OSError:
-        pass
+    identity = record_media_alias(url, info)
+    if identity:
+        metadata["media_identity"] = identity
     metadata["_cache_hit"] = False
-    save_meta(key, metadata)
+    register_cache_entry(key, metadata, filepath)
     return filepath, metadata
 
 
-def download_media_no_cache(url: str, media_format: str) -> Tuple[Path, Dict]:
-    """Descarga sin usar la caché global ni almacenar metadatos persistentes."""
+def download_media_no_cache(
+    url: str, media_format: str, info: Optional[Dict[str, Any]] = None
+) -> Tuple[Path, Dict]:
+    """Descarga sin usar la caché global ni almacenar metadatos persistentes.
+
+    Con ``info`` (ya extraído para el mismo formato) solo se descarga, sin
+    volver a pasar por el extractor.
+    """
     normalized_format = normalize_media_format(media_format)
     temp_dir = Path(tempfile.mkdtemp(prefix="vhs_incognito_"))
 
@@ -1462,18 +4203,22 @@ def download_media_no_cache(url: str, media_format: str) -> Tuple[Path, Dict]:
         ydl_opts["outtmpl"] = str(temp_dir / "%(id)s.%(ext)s")
         ydl_opts["cachedir"] = str(temp_dir)
         try:
-            info = extract_info_with_user_agent_retries(
-                url, ydl_opts=ydl_opts, download=True
-            )
+            if info is not None:
+                with NETWORK_POOL.slot(), YTDLP_POOL.instance(ydl_opts) as ydl:
+                    result = ydl.process_ie_result(info, download=True)
+            else:
+                result = extract_info_with_user_agent_retries(
+                    url, ydl_opts=ydl_opts, download=True
+                )
         except Exception as exc:  # pragma: no cover - passthrough
             cleanup_dir(temp_dir)
             raise DownloadError(str(exc)) from exc
 
-        requested = info.get("requested_downloads") or []
+        requested = result.get("requested_downloads") or []
         if requested:
             filepath = Path(requested[0]["filepath"])  # type: ignore[index]
-        elif info.get("_filename"):
-            filepath = Path(info["_filename"])  # type: ignore[index]
+        elif result.get("_filename"):
+            filepath = Path(result["_filename"])  # type: ignore[index]
         else:
             cleanup_dir(temp_dir)
             raise DownloadError("No se pudo localizar el archivo descargado")
@@ -1498,29 +4243,443 @@ def download_media_no_cache(url: str, media_format: str) -> Tuple[Path, Dict]:
             meta["filesize_bytes"] = filepath.stat().st_size
         except OSError:
             pass
-        meta.update(_extract_media_stats(info))
+        meta.update(_extract_media_stats(result))
         return filepath, meta
 
     return _run()
 
 
+# Solo se reenvían en streaming los formatos de un único archivo servido por
+# HTTP; las fusiones (vídeo + audio) y HLS/DASH siguen por el camino en disco.
+STREAMABLE_PROTOCOLS = {"http", "https"}
+# Códecs que ffmpeg puede copiar tal cual a OGG (audio_max). Con otros (AAC en
+# m4a, p. ej.) el fallo llegaría tras enviar las cabeceras: se usa el disco.
+OGG_COPY_CODECS = {"opus", "vorbis", "flac"}
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def plan_no_cache_stream(
+    url: str, normalized_format: str
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """Extrae sin descargar y decide si el formato se puede reenviar en streaming.
+
+    Devuelve ``(plan, info)``; ``plan`` es ``None`` cuando hay que descargar a
+    disco, y entonces ``info`` se reutiliza para no repetir la extracción.
+    """
+
+    ydl_opts = build_ydl_options(
+        normalized_format,
+        cache_key_value=cache_key(url, f"{normalized_format}::{random.random()}"),
+    )
+    try:
+        info = extract_info_with_user_agent_retries(url, ydl_opts=ydl_opts, download=False)
+    except Exception as exc:  # pragma: no cover - passthrough
+        raise DownloadError(str(exc)) from exc
+    if (
+        not isinstance(info, dict)
+        or info.get("requested_formats")
+        or info.get("protocol") not in STREAMABLE_PROTOCOLS
+        or not info.get("url")
+    ):
+        return None, info
+
+    profile = AUDIO_FORMAT_PROFILES.get(normalized_format)
+    if normalized_format == "audio_max":
+        acodec = str(info.get("acodec") or "").split(".")[0].lower()
+        if acodec not in OGG_COPY_CODECS:
+            return None, info
+        # Igual que remux_to_ogg: copia de la pista de audio a OGG.
+        ffmpeg_args: Optional[List[str]] = ["-vn", "-c:a", "copy", "-f", "ogg"]
+        extension = ".ogg"
+    elif profile:
+        codec = profile.get("codec", "mp3")
+        ffmpeg_args = [
+            "-vn",
+            "-acodec",
+            codec,
+            "-b:a",
+            f"{profile.get('preferred_quality', '96')}k",
+            "-f",
+            codec,
+        ]
+        extension = f".{codec}"
+    else:
+        ffmpeg_args = None
+        extension = f".{info.get('ext') or 'mp4'}"
+    plan = {
+        "url": info["url"],
+        "http_headers": info.get("http_headers") or {},
+        "ffmpeg_args": ffmpeg_args,
+        "extension": extension,
+        "ydl_opts": ydl_opts,
+        "title": info.get("title") or "no-cache",
+    }
+    return plan, info
+
+
+def no_cache_tee_target(
+    url: str, normalized_format: str, info: Dict[str, Any]
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Clave y metadatos con los que un streaming se guarda también en caché.
+
+    Devuelve ``(None, {})`` si la entrada ya existe.
+    """
+
+    identity = record_media_alias(url, info) or resolve_media_identity(url, allow_network=False)
+    key = cache_key(f"media:{identity}" if identity else url.strip(), normalized_format)
+    if load_meta(key) is not None:
+        return None, {}
+    metadata: Dict[str, Any] = {
+        "title": info.get("title") or "video",
+        "source_url": url,
+        "media_format": normalized_format,
+        "cache_key": key,
+        **_extract_media_stats(info),
+    }
+    if identity:
+        metadata["media_identity"] = identity
+    return key, metadata
+
+
+def _ffmpeg_pipe(
+    source: Any, args: List[str], stop: threading.Event
+) -> Iterator[bytes]:
+    """Pasa ``source`` por ffmpeg (stdin → stdout) y devuelve la salida por bloques."""
+
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *args, "pipe:1"]
+    try:
+        process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except FileNotFoundError as exc:
+        raise DownloadError("ffmpeg no está instalado o no es accesible en el sistema") from exc
+    errors: List[bytes] = []
+
+    def feed() -> None:
+        try:
+            for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b""):
+                if stop.is_set():
+                    break
+                process.stdin.write(chunk)  # type: ignore[union-attr]
+        except (OSError, ValueError):
+            pass
+        finally:
+            with suppress(OSError):
+                process.stdin.close()  # type: ignore[union-attr]
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    drainer = threading.Thread(
+        target=lambda: errors.append(process.stderr.read()), daemon=True  # type: ignore[union-attr]
+    )
+    feeder.start()
+    drainer.start()
+    try:
+        for chunk in iter(lambda: process.stdout.read1(STREAM_CHUNK_SIZE), b""):  # type: ignore[union-attr]
+            yield chunk
+    finally:
+        if process.poll() is None and stop.is_set():
+            process.kill()
+        returncode = process.wait()
+        feeder.join(timeout=5)
+        drainer.join(timeout=5)
+    if returncode != 0 and not stop.is_set():
+        message = b"".join(errors).decode("utf-8", errors="ignore").strip()
+        tail = message.splitlines()[-1] if message else "error desconocido de ffmpeg"
+        raise DownloadError(f"ffmpeg no pudo procesar el archivo: {tail}")
+
+
+class MediaStreamRelay:
+    """Reenvía al cliente los bytes de la fuente según llegan.
+
+    Un hilo productor lee de la fuente (y de ffmpeg si hace falta) y deja los
+    bloques en una cola acotada que consume la respuesta. Con ``tee_key`` los
+    mismos bytes se escriben en la caché y la entrada se registra solo si el
+    streaming llega al final; si el cliente corta, el parcial se descarta.
+    """
+
+    def __init__(
+        self,
+        plan: Dict[str, Any],
+        tee_key: Optional[str] = None,
+        tee_metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.plan = plan
+        self.tee_key = tee_key
+        self.tee_metadata = tee_metadata or {}
+        self._chunks: "queue.Queue[Any]" = queue.Queue(maxsize=64)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True, name="vhs-stream")
+
+    def start(self) -> "MediaStreamRelay":
+        self._thread.start()
+        return self
+
+    def _emit(self, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        if not self.tee_key:
+            self._relay(False)
+            return
+        # Solo una petición (o descarga normal) escribe la clave a la vez; si
+        # otra ya la tiene, esta se limita a reenviar los bytes.
+        with cache_key_file_trylock(self.tee_key) as locked:
+            if not locked:
+                print(
+                    f"[vhs] {self.tee_key} ya se está guardando en caché; se omite la copia",
+                    file=sys.stderr,
+                )
+            self._relay(locked)
+
+    def _relay(self, tee: bool) -> None:
+        tee_path: Optional[Path] = None
+        tee_handle = None
+        completed = False
+        try:
+            if tee and self.tee_key:
+                tee_path = cache_file_path(f"{self.tee_key}{self.plan['extension']}", create=True)
+                tee_handle = tee_path.with_name(f"{tee_path.name}.part").open("wb")
+            request = yt_dlp.networking.Request(
+                self.plan["url"], headers=self.plan["http_headers"]
+            )
+            # La respuesta se cierra siempre para devolver el socket al pool.
+            with NETWORK_POOL.slot(), YTDLP_POOL.instance(
+                self.plan["ydl_opts"]
+            ) as ydl, closing(ydl.urlopen(request)) as response:
+                if self.plan["ffmpeg_args"]:
+                    with FFMPEG_POOL.slot():
+                        for chunk in _ffmpeg_pipe(response, self.plan["ffmpeg_args"], self._stop):
+                            if tee_handle:
+                                tee_handle.write(chunk)
+                            if not self._emit(chunk):
+                                return
+                else:
+                    for chunk in iter(lambda: response.read(STREAM_CHUNK_SIZE), b""):
+                        if tee_handle:
+                            tee_handle.write(chunk)
+                        if not self._emit(chunk):
+                            return
+            completed = True
+        except Exception as exc:
+            self._emit(exc if isinstance(exc, DownloadError) else DownloadError(str(exc)))
+        finally:
+            if tee_handle and tee_path:
+                tee_handle.close()
+                part_path = Path(tee_handle.name)
+                if completed:
+                    self._register_tee(part_path, tee_path)
+                else:
+                    part_path.unlink(missing_ok=True)
+            self._emit(None)
+
+    def _register_tee(self, part_path: Path, final_path: Path) -> None:
+        try:
+            os.replace(part_path, final_path)
+            metadata = {
+                **self.tee_metadata,
+                "filename": final_path.name,
+                "downloaded_at": time.time(),
+            }
+            register_cache_entry(self.tee_key, metadata, final_path)  # type: ignore[arg-type]
+        except Exception as exc:  # pragma: no cover - la copia en caché es best-effort
+            part_path.unlink(missing_ok=True)
+            print(f"[vhs] No se pudo guardar en caché el streaming: {exc}", file=sys.stderr)
+
+    def read(self) -> bytes:
+        """Siguiente bloque (``b""`` al terminar); propaga los errores de la fuente."""
+
+        while not self._stop.is_set():
+            try:
+                item = self._chunks.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:
+                return b""
+            if isinstance(item, Exception):
+                raise item
+            return item
+        return b""
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+BATCH_ARCHIVE_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+
+
+class StreamingArchiveWriter:
+    """Genera un ZIP o un TAR al vuelo, sin archivo temporal.
+
+    Cada método devuelve un iterador con los bytes que hay que enviar; el ZIP
+    usa descriptores de datos (``ZipFile`` sobre un flujo no posicionable) y el
+    TAR escribe cabeceras PAX y relleno a mano para no tener que leer el
+    archivo entero antes de emitirlo.
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self._pending = bytearray()
+        self._written = 0
+        self._zip = (
+            zipfile.ZipFile(self, mode="w", compression=zipfile.ZIP_STORED)  # type: ignore[arg-type]
+            if kind == "zip"
+            else None
+        )
+
+    # Interfaz de fichero mínima para ZipFile (sin tell/seek).
+    def write(self, data: bytes) -> int:
+        self._pending += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _drain(self) -> Iterator[bytes]:
+        if self._pending:
+            data = bytes(self._pending)
+            self._pending.clear()
+            self._written += len(data)
+            yield data
+
+    def _tar_emit(self, data: bytes) -> Iterator[bytes]:
+        self.write(data)
+        yield from self._drain()
+
+    def _tar_header(self, name: str, size: int, mtime: float) -> bytes:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+    def _tar_padding(self, size: int) -> bytes:
+        remainder = size % tarfile.BLOCKSIZE
+        return b"\0" * (tarfile.BLOCKSIZE - remainder) if remainder else b""
+
+    def add_file(self, name: str, handle: BinaryIO, size: int, mtime: float) -> Iterator[bytes]:
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = size
+            with self._zip.open(info, mode="w") as target:
+                for chunk in iter(lambda: handle.read(STREAM_CHUNK_SIZE * 16), b""):
+                    target.write(chunk)
+                    yield from self._drain()
+            yield from self._drain()
+            return
+        yield from self._tar_emit(self._tar_header(name, size, mtime))
+        copied = 0
+        while copied < size:
+            chunk = handle.read(min(STREAM_CHUNK_SIZE * 16, size - copied))
+            if not chunk:
+                raise DownloadError(f"{name} se ha truncado mientras se empaquetaba")
+            copied += len(chunk)
+            yield from self._tar_emit(chunk)
+        yield from self._tar_emit(self._tar_padding(size))
+
+    def add_bytes(self, name: str, data: bytes) -> Iterator[bytes]:
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data)
+            yield from self._drain()
+            return
+        yield from self._tar_emit(
+            self._tar_header(name, len(data), time.time()) + data + self._tar_padding(len(data))
+        )
+
+    def close(self) -> Iterator[bytes]:
+        if self._zip is not None:
+            self._zip.close()
+            yield from self._drain()
+            return
+        # Dos bloques vacíos de fin de archivo y relleno hasta el tamaño de registro.
+        end = b"\0" * (tarfile.BLOCKSIZE * 2)
+        remainder = (self._written + len(end)) % tarfile.RECORDSIZE
+        if remainder:
+            end += b"\0" * (tarfile.RECORDSIZE - remainder)
+        yield from self._tar_emit(end)
+
+
+FFMPEG_DURATION_PATTERN = re.compile(r"Duration:\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)")
+
+
+def _run_ffmpeg_with_progress(
+    command: List[str], job: Dict[str, Any]
+) -> Tuple[int, str]:
+    """Ejecuta ffmpeg con ``-progress pipe:1`` e informa del avance al trabajo."""
+
+    command = [command[0], "-progress", "pipe:1", "-nostats", *command[1:]]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    stderr_lines: List[str] = []
+    duration: List[float] = []
+
+    def drain_stderr() -> None:
+        for line in process.stderr:  # type: ignore[union-attr]
+            stderr_lines.append(line)
+            if not duration:
+                match = FFMPEG_DURATION_PATTERN.search(line)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    duration.append(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+
+    reader = threading.Thread(target=drain_stderr, daemon=True)
+    reader.start()
+    values: Dict[str, str] = {}
+    for line in process.stdout:  # type: ignore[union-attr]
+        name, _, value = line.strip().partition("=")
+        values[name] = value.strip()
+        if name != "progress":
+            continue
+        # out_time_ms también va en microsegundos pese a su nombre.
+        raw_time = values.get("out_time_us") or values.get("out_time_ms") or ""
+        try:
+            out_time = max(0.0, int(raw_time) / 1_000_000)
+        except ValueError:
+            continue
+        progress: Dict[str, Any] = {
+            "out_time_seconds": round(out_time, 2),
+            "speed": values.get("speed"),
+        }
+        if duration and duration[0] > 0:
+            progress["percent"] = round(min(100.0, 100 * out_time / duration[0]), 1)
+        report_job_progress(job, **progress)
+    returncode = process.wait()
+    reader.join()
+    return returncode, "".join(stderr_lines)
+
+
 def run_ffmpeg(source: Path, destination: Path, args: List[str]) -> None:
     command = [FFMPEG_BINARY, "-y", "-i", str(source), *args, str(destination)]
+    job = current_job()
     try:
-        process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
-            text=True,
-        )
+        with job_stage("ffmpeg"), FFMPEG_POOL.slot():
+            if job is not None:
+                returncode, output = _run_ffmpeg_with_progress(command, job)
+            else:
+                process = subprocess.run(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    check=False,
+                    text=True,
+                )
+                returncode, output = process.returncode, process.stderr or process.stdout
     except FileNotFoundError as exc:
         raise DownloadError(
             "ffmpeg no está instalado o no es accesible en el sistema"
         ) from exc
 
-    if process.returncode != 0:
-        message = (process.stderr or process.stdout or "").strip()
+    if returncode != 0:
+        message = (output or "").strip()
         tail = message.splitlines()[-1] if message else "error desconocido de ffmpeg"
         raise DownloadError(f"ffmpeg no pudo procesar el archivo: {tail}")
 
@@ -1539,15 +4698,67 @@ def remux_to_ogg(source_path: Path) -> Path:
 
 
 def process_with_ffmpeg(url: str, media_format: str) -> Tuple[Path, Dict]:
-    preset = FFMPEG_PRESETS[media_format]
-    key = cache_key(url, media_format)
-    purge_expired_entries()
-    cached_path, cached_meta = fetch_cached_file(key)
-    if cached_path:
-        return cached_path, cached_meta or {}
+    identity = resolve_request_identity(url)
+    key = cache_key(f"media:{identity}" if identity else url.strip(), media_format)
+    return coalesced_cache_fill(
+        key, lambda: _process_with_ffmpeg_into_cache(url, media_format, key, identity)
+    )
 
-    source_path, source_metadata = download_media(url, DEFAULT_VIDEO_FORMAT)
-    output_path = CACHE_DIR / f"{key}{preset['extension']}"
+
+def find_cached_ffmpeg_source(
+    identity: str, preset: Dict[str, Any]
+) -> Optional[Tuple[Path, Dict]]:
+    """Busca en caché una fuente de la misma identidad suficiente para el preset.
+
+    Para presets de vídeo vale cualquier ``video_*`` con altura mayor o igual a
+    la de destino (se elige la menor); para presets de audio, ``audio_max`` o el
+    vídeo más ligero, que también llevan la mejor pista de audio.
+    """
+
+    target_height = int(preset.get("video_height") or 0)
+    if target_height:
+        candidates = [
+            item
+            for item in CACHE_CATALOG.find_by_identity(identity, list(VIDEO_FORMAT_PROFILES))
+            if int(item.get("height") or 0) >= target_height
+        ]
+        candidates.sort(
+            key=lambda item: (int(item.get("height") or 0), int(item.get("filesize_bytes") or 0))
+        )
+    else:
+        candidates = CACHE_CATALOG.find_by_identity(
+            identity, ["audio_max", *VIDEO_FORMAT_PROFILES]
+        )
+        candidates.sort(
+            key=lambda item: (
+                item.get("media_format") != "audio_max",
+                int(item.get("filesize_bytes") or 0),
+            )
+        )
+    for candidate in candidates:
+        source_path, source_meta = fetch_cached_file(candidate["cache_key"])
+        if source_path and source_meta:
+            return source_path, source_meta
+    return None
+
+
+def _process_with_ffmpeg_into_cache(
+    url: str, media_format: str, key: str, identity: Optional[str] = None
+) -> Tuple[Path, Dict]:
+    preset = FFMPEG_PRESETS[media_format]
+    source = find_cached_ffmpeg_source(identity, preset) if identity else None
+    if source is None:
+        source = download_media(url, preset.get("source_format", DEFAULT_VIDEO_FORMAT))
+    source_path, source_metadata = source
+    reserve_cache_budget(
+        key,
+        estimate_encoded_bytes(
+            source_path,
+            source_metadata,
+            int(preset.get("video_bitrate_kbps") or 0) + int(preset.get("audio_bitrate_kbps") or 0),
+        ),
+    )
+    output_path = cache_file_path(f"{key}{preset['extension']}", create=True)
     output_path.unlink(missing_ok=True)
     run_ffmpeg(source_path, output_path, preset["args"])
 
@@ -1560,6 +4771,9 @@ def process_with_ffmpeg(url: str, media_format: str) -> Tuple[Path, Dict]:
         "cache_key": key,
         "_cache_hit": False,
         "preset": media_format,
+        "media_identity": source_metadata.get("media_identity"),
+        "source_format": source_metadata.get("media_format"),
+        "source_cache_key": source_metadata.get("cache_key"),
         "source_media": {
             key: value
             for key, value in source_metadata.items()
@@ -1581,18 +4795,16 @@ def process_with_ffmpeg(url: str, media_format: str) -> Tuple[Path, Dict]:
         metadata["target_video_bitrate_kbps"] = preset["video_bitrate_kbps"]
     if preset.get("audio_bitrate_kbps"):
         metadata["target_audio_bitrate_kbps"] = preset["audio_bitrate_kbps"]
-    try:
-        metadata["filesize_bytes"] = output_path.stat().st_size
-    except OSError:
-        pass
-    save_meta(key, metadata)
+    register_cache_entry(key, metadata, output_path)
     return output_path, metadata
 
 
 def process_with_ffmpeg_no_cache(url: str, media_format: str) -> Tuple[Path, Dict]:
     """Procesa con ffmpeg en un directorio temporal sin persistir caché ni metadatos."""
     preset = FFMPEG_PRESETS[media_format]
-    source_path, source_metadata = download_media_no_cache(url, DEFAULT_VIDEO_FORMAT)
+    source_path, source_metadata = download_media_no_cache(
+        url, preset.get("source_format", DEFAULT_VIDEO_FORMAT)
+    )
     output_path = source_path.parent / f"output{preset['extension']}"
     output_path.unlink(missing_ok=True)
     try:
@@ -1636,8 +4848,101 @@ def process_with_ffmpeg_no_cache(url: str, media_format: str) -> Tuple[Path, Dic
     return output_path, metadata
 
 
+_EXPIRE_PATH_PATTERN = re.compile(r"/expire/(\d+)")
+
+
+def info_dict_urls_expire_at(info: Dict[str, Any]) -> Optional[float]:
+    """Primera caducidad anunciada por las URLs de formato (``expire=`` de YouTube)."""
+
+    earliest: Optional[float] = None
+    for fmt in info.get("formats") or []:
+        if not isinstance(fmt, dict):
+            continue
+        for candidate in (fmt.get("url"), fmt.get("manifest_url")):
+            if not isinstance(candidate, str):
+                continue
+            parts = urlsplit(candidate)
+            values = parse_qs(parts.query).get("expire") or _EXPIRE_PATH_PATTERN.findall(parts.path)
+            for value in values:
+                try:
+                    expires_at = float(value)
+                except ValueError:
+                    continue
+                earliest = expires_at if earliest is None else min(earliest, expires_at)
+    return earliest
+
+
+def _info_cache_key(url: str, identity: Optional[str]) -> str:
+    return cache_key(negative_cache_ref(url, identity), "info_dict")
+
+
+def remember_info_dict(url: str, identity: Optional[str], info: Dict[str, Any]) -> None:
+    """Guarda el info_dict (sin claves privadas ni rutas locales) para otras descargas."""
+
+    if not INFO_CACHE.enabled or not isinstance(info, dict) or not info.get("formats"):
+        return
+    try:
+        sanitized = yt_dlp.YoutubeDL.sanitize_info(dict(info), remove_private_keys=True)
+    except Exception as exc:  # pragma: no cover - la reutilización es best-effort
+        print(f"[vhs] No se pudo serializar el info_dict de {url}: {exc}", file=sys.stderr)
+        return
+    INFO_CACHE.put(_info_cache_key(url, identity), sanitized)
+
+
+def load_reusable_info(url: str, identity: Optional[str]) -> Optional[Dict[str, Any]]:
+    """info_dict guardado cuyas URLs de formato siguen siendo válidas, o ``None``."""
+
+    key = _info_cache_key(url, identity)
+    info = INFO_CACHE.get(key)
+    if not isinstance(info, dict):
+        return None
+    expires_at = info_dict_urls_expire_at(info)
+    if expires_at is not None and expires_at - INFO_DICT_EXPIRY_MARGIN_SECONDS <= time.time():
+        INFO_CACHE.discard(key)
+        return None
+    return info
+
+
+def forget_info_dict(url: str, identity: Optional[str]) -> None:
+    INFO_CACHE.discard(_info_cache_key(url, identity))
+
+
 def probe_media(url: str) -> Dict[str, Any]:
-    key = cache_key(url, "probe")
+    identity = resolve_media_identity(url, allow_network=False)
+    raise_if_negatively_cached(url, identity)
+    key = cache_key(media_cache_ref(url, allow_network=False), "probe")
+    info = PROBE_CACHE.get(key)
+    if info is None:
+        info, _ = SINGLE_FLIGHT.run(key, lambda: _probe_media_uncached(url, key, identity))
+    return annotate_cached_formats(dict(info))
+
+
+def annotate_cached_formats(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Añade ``cached_formats``: formatos de esa fuente que ya se sirven desde caché."""
+
+    identity = identity_from_info(item)
+    if not identity:
+        source = item.get("webpage_url") or item.get("url")
+        identity = (
+            resolve_media_identity(source, allow_network=False)
+            if isinstance(source, str)
+            else None
+        )
+    formats: set = set()
+    if identity:
+        try:
+            formats = {
+                entry.get("media_format")
+                for entry in CACHE_CATALOG.find_by_identity(identity)
+                if entry.get("media_format")
+            }
+        except Exception as exc:  # pragma: no cover - la anotación es best-effort
+            print(f"[vhs] No se pudo consultar la caché de {identity}: {exc}", file=sys.stderr)
+    item["cached_formats"] = sorted(formats)
+    return item
+
+
+def _probe_media_uncached(url: str, key: str, identity: Optional[str] = None) -> Dict[str, Any]:
     ydl_opts = build_ydl_options(DEFAULT_VIDEO_FORMAT, cache_key_value=key)
     ydl_opts["skip_download"] = True
     try:
@@ -1645,15 +4950,18 @@ def probe_media(url: str) -> Dict[str, Any]:
             url, ydl_opts=ydl_opts, download=False
         )
     except Exception as exc:  # pragma: no cover - passthrough errors
+        record_negative_result(url, identity, exc)
         raise DownloadError(str(exc)) from exc
 
+    record_media_alias(url, info)
+    remember_info_dict(url, identity or identity_from_info(info), info)
     thumbnails = info.get("thumbnails") or []
     if isinstance(thumbnails, list) and thumbnails:
         thumb_url = thumbnails[-1].get("url")
     else:
         thumb_url = info.get("thumbnail")
 
-    return {
+    result = {
         "id": info.get("id"),
         "title": info.get("title"),
         "duration": info.get("duration"),
@@ -1665,6 +4973,8 @@ def probe_media(url: str) -> Dict[str, Any]:
         "tags": info.get("tags") or [],
         "thumbnail": thumb_url,
     }
+    PROBE_CACHE.put(key, result)
+    return result
 
 
 def search_media(query: str, limit: int = 8) -> List[Dict[str, Any]]:
@@ -1673,6 +4983,17 @@ def search_media(query: str, limit: int = 8) -> List[Dict[str, Any]]:
         raise DownloadError("La búsqueda debe tener al menos 3 caracteres")
 
     safe_limit = max(1, min(limit, 25))
+    normalized_query = " ".join(cleaned_query.casefold().split())
+    key = cache_key(f"search:{normalized_query}", f"limit={safe_limit}")
+    items = SEARCH_CACHE.get(key)
+    if items is None:
+        items, _ = SINGLE_FLIGHT.run(
+            key, lambda: _search_media_uncached(cleaned_query, safe_limit, key)
+        )
+    return [annotate_cached_formats(dict(item)) for item in items]
+
+
+def _search_media_uncached(cleaned_query: str, safe_limit: int, key: str) -> List[Dict[str, Any]]:
     search_expression = f"ytsearch{safe_limit}:{cleaned_query}"
     ydl_opts: Dict[str, Any] = {
         "quiet": True,
@@ -1694,7 +5015,7 @@ def search_media(query: str, limit: int = 8) -> List[Dict[str, Any]]:
         ydl_opts["extractor_args"] = YTDLP_EXTRACTOR_ARGS
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with NETWORK_POOL.slot(), YTDLP_POOL.instance(ydl_opts) as ydl:
             results = ydl.extract_info(search_expression, download=False)
     except Exception as exc:  # pragma: no cover - passthrough errors
         raise DownloadError(str(exc)) from exc
@@ -1716,6 +5037,7 @@ def search_media(query: str, limit: int = 8) -> List[Dict[str, Any]]:
             }
         )
 
+    SEARCH_CACHE.put(key, items)
     return items
 
 
@@ -1805,16 +5127,18 @@ def _translate_texts_to_spanish(texts: List[str]) -> List[str]:
         )
     client = OpenAI(api_key=TRANSCRIPTION_API_KEY, base_url=TRANSCRIPTION_ENDPOINT)
     results: List[str] = []
-    for text in texts:
+    for index, text in enumerate(texts):
+        report_job_progress(done=index, total=len(texts), percent=round(100 * index / len(texts), 1))
         user_content = TRANSLATION_USER_PROMPT_TEMPLATE.format(text=str(text))
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0,
-        )
+        with TRANSCRIPTION_POOL.slot():
+            completion = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=0,
+            )
         translated = (completion.choices[0].message.content or "").strip()
         if not translated:
             raise DownloadError("La traducción devolvió un texto vacío")
@@ -1966,16 +5290,37 @@ def build_transcription_download_name(source_name: str, media_format: str) -> st
     return build_download_name(source_name or "transcript", dummy_path, media_format)
 
 
-async def save_upload_file(upload: UploadFile) -> Path:
+async def save_upload_file(upload: UploadFile) -> Tuple[Path, str]:
+    """Vuelca la subida a un temporal y devuelve su ruta y su SHA-256.
+
+    El hash se calcula por bloques mientras se escribe, sin releer el archivo.
+    """
+
     suffix = Path(upload.filename or "upload.bin").suffix or ".bin"
+    digest = hashlib.sha256()
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
         while True:
             chunk = await upload.read(1 << 20)
             if not chunk:
                 break
+            digest.update(chunk)
             tmp.write(chunk)
     await upload.close()
-    return Path(tmp.name)
+    return Path(tmp.name), digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upload_media_identity(content_hash: str) -> str:
+    """Identidad canónica de un archivo local: su contenido, no su nombre."""
+
+    return f"Upload:{content_hash}"
 
 
 def cleanup_path(path: Path) -> None:
@@ -1992,7 +5337,9 @@ def cleanup_dir(path: Path) -> None:
         pass
 
 
-def convert_uploaded_file_with_ffmpeg(source_path: Path, media_format: str) -> Path:
+def convert_uploaded_file_with_ffmpeg(
+    source_path: Path, media_format: str, output_path: Optional[Path] = None
+) -> Path:
     preset = FFMPEG_PRESETS.get(media_format)
     if not preset:
         raise DownloadError("Perfil ffmpeg no soportado")
@@ -2003,8 +5350,9 @@ def convert_uploaded_file_with_ffmpeg(source_path: Path, media_format: str) -> P
             raise DownloadError("El archivo subido está vacío o corrupto")
     except OSError:
         pass
-    with tempfile.NamedTemporaryFile(delete=False, suffix=preset["extension"]) as tmp:
-        output_path = Path(tmp.name)
+    if output_path is None:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=preset["extension"]) as tmp:
+            output_path = Path(tmp.name)
     try:
         run_ffmpeg(source_path, output_path, preset["args"])
     except Exception:
@@ -2046,7 +5394,8 @@ def extract_audio_profile_from_file(source_path: Path, profile_key: str = "audio
         f"{profile.get('preferred_quality', '96')}k",
         str(output_path),
     ]
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with FFMPEG_POOL.slot():
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if result.returncode != 0:
         output_path.unlink(missing_ok=True)
         error_message = result.stderr.decode("utf-8", errors="ignore").strip()
@@ -2064,7 +5413,7 @@ def _call_openai_transcription(
     if not model:
         model = resolve_transcription_model(None)
     client = OpenAI(api_key=TRANSCRIPTION_API_KEY, base_url=TRANSCRIPTION_ENDPOINT)
-    with file_path.open("rb") as audio_stream:
+    with TRANSCRIPTION_POOL.slot(), file_path.open("rb") as audio_stream:
         response = client.audio.transcriptions.create(
             model=model,
             file=audio_stream,
@@ -2090,13 +5439,64 @@ def transcribe_audio_file(
         else resolve_transcription_model(transcription_model)
     )
     try:
-        return _call_openai_transcription(file_path, selected_model)
+        with job_stage("transcription"):
+            # Una sola llamada al API: el avance solo marca inicio y fin.
+            report_job_progress(done=0, total=1, percent=0.0)
+            payload = _call_openai_transcription(file_path, selected_model)
+            report_job_progress(done=1, total=1, percent=100.0, force=True)
+            return payload
     except Exception as exc:  # pragma: no cover - servicios externos
         raise DownloadError(
             f"No se pudo transcribir el audio con el modelo '{selected_model}': {exc}"
         ) from exc
 
 
+def transcription_cache_key(
+    source_ref: str,
+    media_format: str,
+    selected_model: str,
+    effective_diarize: bool,
+    translation: bool,
+) -> str:
+    return cache_key(
+        f"{source_ref}::model={selected_model}::diarize={int(effective_diarize)}"
+        f"::translation={int(translation)}",
+        media_format,
+    )
+
+
+def cached_result_available(
+    url: str,
+    normalized_format: str,
+    transcription_model: Optional[str] = None,
+    diarize: bool = False,
+) -> bool:
+    """Indica, sin tocar la red, si el resultado pedido ya está en caché."""
+
+    source_ref = media_cache_ref(url, allow_network=False)
+    if normalized_format in TRANSCRIPTION_FORMATS:
+        effective_diarize = diarize or is_diarization_format(normalized_format)
+        try:
+            selected_model = (
+                resolve_diarization_model(transcription_model)
+                if effective_diarize
+                else resolve_transcription_model(transcription_model)
+            )
+        except DownloadError:
+            return False
+        key = transcription_cache_key(
+            source_ref,
+            normalized_format,
+            selected_model,
+            effective_diarize,
+            is_translation_format(normalized_format),
+        )
+    else:
+        key = cache_key(source_ref, normalized_format)
+    # Mismas comprobaciones que fetch_cached_file (TTL y archivo), sin contar acceso.
+    return _valid_cached_file(key)[0] is not None
+
+
 def generate_transcription_file(
     url: str,
     media_format: str,
@@ -2112,76 +5512,267 @@ def generate_transcription_file(
         if effective_diarize
         else resolve_transcription_model(transcription_model)
     )
-    model_suffix = f"model={selected_model}"
-    diarize_suffix = f"diarize={int(effective_diarize)}"
-    translation_suffix = f"translation={int(translation)}"
-    key = cache_key(
-        f"{url}::{model_suffix}::{diarize_suffix}::{translation_suffix}",
-        media_format,
+    identity = resolve_request_identity(url)
+    source_ref = f"media:{identity}" if identity else url.strip()
+    key = transcription_cache_key(
+        source_ref, media_format, selected_model, effective_diarize, translation
+    )
+    return coalesced_cache_fill(
+        key,
+        lambda: _render_transcription_into_cache(
+            url, media_format, key, source_ref, selected_model, effective_diarize, translation
+        ),
     )
-    purge_expired_entries()
-    cached_path, cached_meta = fetch_cached_file(key)
-    if cached_path:
-        return cached_path, cached_meta or {}
 
-    audio_path, audio_meta = download_media(url, "audio_med")
-    transcript_payload = transcribe_audio_file(
-        audio_path,
-        media_format,
+
+def load_transcription_payload(
+    source_ref: str,
+    selected_model: str,
+    effective_diarize: bool,
+    translation: bool,
+    fetch_audio: Callable[[], Tuple[Path, Dict[str, Any]]],
+    discard_audio: bool = False,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Payload canónico de (fuente, modelo, diarización), transcrito una sola vez.
+
+    ``fetch_audio`` solo se invoca si hay que transcribir; con ``discard_audio``
+    el audio obtenido se borra después. La traducción se guarda como un segundo
+    payload construido sobre el original, de modo que tampoco se repite.
+    """
+
+    base_ref = f"{source_ref}::model={selected_model}::diarize={int(effective_diarize)}"
+    base_key = cache_key(base_ref, TRANSCRIPT_PAYLOAD_FORMAT)
+    payload_path, payload_meta = coalesced_cache_fill(
+        base_key,
+        lambda: _transcribe_payload_into_cache(
+            base_key, selected_model, effective_diarize, fetch_audio, discard_audio
+        ),
+    )
+    if not translation:
+        return json.loads(payload_path.read_text(encoding="utf-8")), payload_meta
+
+    translated_key = cache_key(f"{base_ref}::translation=1", TRANSCRIPT_PAYLOAD_FORMAT)
+    translated_path, translated_meta = coalesced_cache_fill(
+        translated_key,
+        lambda: _translate_payload_into_cache(payload_path, payload_meta, translated_key),
+    )
+    return json.loads(translated_path.read_text(encoding="utf-8")), translated_meta
+
+
+def _store_transcription_payload(
+    key: str, payload: Dict[str, Any], metadata: Dict[str, Any]
+) -> Tuple[Path, Dict]:
+    payload_path = cache_file_path(f"{key}{TRANSCRIPTION_FILE_SUFFIX}", create=True)
+    payload_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    metadata = {
+        **metadata,
+        "filename": payload_path.name,
+        "media_format": TRANSCRIPT_PAYLOAD_FORMAT,
+        "downloaded_at": time.time(),
+        "cache_key": key,
+        "transcription_stats": estimate_transcription_stats(payload),
+    }
+    metadata["_cache_hit"] = False
+    register_cache_entry(key, metadata, payload_path)
+    return payload_path, metadata
+
+
+def _transcribe_payload_into_cache(
+    key: str,
+    selected_model: str,
+    effective_diarize: bool,
+    fetch_audio: Callable[[], Tuple[Path, Dict[str, Any]]],
+    discard_audio: bool,
+) -> Tuple[Path, Dict]:
+    audio_path, audio_meta = fetch_audio()
+    try:
+        transcript_payload = transcribe_audio_file(
+            audio_path,
+            "transcript_diarized_json" if effective_diarize else "transcript_json",
+            selected_model,
+            diarize=effective_diarize,
+        )
+    finally:
+        if discard_audio:
+            cleanup_path(audio_path)
+    metadata: Dict[str, Any] = {
+        "title": audio_meta.get("title") or "transcript",
+        "source_url": audio_meta.get("source_url"),
+        "transcription_model": selected_model,
+        "diarization": bool(effective_diarize),
+        "translation": False,
+        "media_identity": audio_meta.get("media_identity"),
+    }
+    metadata.update(
+        {
+            name: value
+            for name, value in audio_meta.items()
+            if name in {"audio_bitrate_kbps", "format_id"}
+        }
+    )
+    return _store_transcription_payload(key, transcript_payload, metadata)
+
+
+def _translate_payload_into_cache(
+    payload_path: Path, payload_meta: Dict[str, Any], key: str
+) -> Tuple[Path, Dict]:
+    source_payload = json.loads(payload_path.read_text(encoding="utf-8"))
+    with job_stage("translation"):
+        translated = translate_transcription_payload(source_payload)
+    metadata = {
+        name: value
+        for name, value in payload_meta.items()
+        if not name.startswith("_")
+        and name not in {"filename", "filesize_bytes", "pinned", "access_count", "last_accessed_at"}
+    }
+    metadata.update({"translation": True, "derived_from": payload_meta.get("cache_key")})
+    return _store_transcription_payload(key, translated, metadata)
+
+
+def _render_transcription_into_cache(
+    url: str,
+    media_format: str,
+    key: str,
+    source_ref: str,
+    selected_model: str,
+    effective_diarize: bool,
+    translation: bool,
+) -> Tuple[Path, Dict]:
+    transcript_payload, payload_meta = load_transcription_payload(
+        source_ref,
         selected_model,
-        diarize=effective_diarize,
+        effective_diarize,
+        translation,
+        fetch_audio=lambda: download_media(url, "audio_med"),
     )
-    if translation:
-        transcript_payload = translate_transcription_payload(transcript_payload)
-    transcription_stats = estimate_transcription_stats(transcript_payload)
 
-    if media_format.endswith("_json") or media_format == "transcript_json":
-        if media_format == "transcript_json":
-            transcript_path = CACHE_DIR / f"{key}{TRANSCRIPTION_FILE_SUFFIX}"
-        else:
-            transcript_path = CACHE_DIR / f"{key}.json"
-        transcript_path.write_text(
-            json.dumps(transcript_payload, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-    elif media_format.endswith("_srt") or media_format == "transcript_srt":
-        transcript_path = CACHE_DIR / f"{key}.srt"
-        srt_content = transcription_payload_to_srt(transcript_payload)
-        transcript_path.write_text(srt_content, encoding="utf-8")
+    if media_format == "transcript_json":
+        transcript_path = cache_file_path(f"{key}{TRANSCRIPTION_FILE_SUFFIX}", create=True)
     else:
-        text_only = transcript_payload.get("text") or ""
-        if not isinstance(text_only, str):
-            text_only = str(text_only)
-        transcript_path = CACHE_DIR / f"{key}.txt"
-        transcript_path.write_text(text_only.strip(), encoding="utf-8")
+        extension = FORMAT_EXTENSIONS.get(media_format, ".txt")
+        transcript_path = cache_file_path(f"{key}{extension}", create=True)
+    transcript_path.write_bytes(render_transcription_payload(transcript_payload, media_format))
 
     metadata = {
-        "title": audio_meta.get("title") or "transcript",
+        "title": payload_meta.get("title") or "transcript",
         "filename": transcript_path.name,
         "source_url": url,
         "media_format": media_format,
         "downloaded_at": time.time(),
         "cache_key": key,
-        "transcription_stats": transcription_stats,
+        "transcription_stats": payload_meta.get("transcription_stats")
+        or estimate_transcription_stats(transcript_payload),
         "transcription_model": selected_model,
         "diarization": bool(effective_diarize),
         "translation": bool(translation),
+        "media_identity": payload_meta.get("media_identity"),
+        "derived_from": payload_meta.get("cache_key"),
     }
     metadata.update(
         {
-            key: value
-            for key, value in audio_meta.items()
-            if key
-            in {
-                "audio_bitrate_kbps",
-                "filesize_bytes",
-                "format_id",
-            }
+            name: value
+            for name, value in payload_meta.items()
+            if name in {"audio_bitrate_kbps", "format_id"}
         }
     )
     metadata["_cache_hit"] = False
-    save_meta(key, metadata)
-    return transcript_path, metadata
+    register_cache_entry(key, metadata, transcript_path)
+    # Si el payload ya estaba en caché no ha habido descarga ni llamada al modelo.
+    return transcript_path, {**metadata, "_cache_hit": bool(payload_meta.get("_cache_hit"))}
+
+
+def convert_local_file(
+    source_path: Path,
+    media_format: str,
+    content_hash: Optional[str] = None,
+    title: Optional[str] = None,
+) -> Tuple[Path, Dict]:
+    """Conversión ffmpeg de un archivo local cacheada por el hash de su contenido."""
+
+    if media_format not in FFMPEG_PRESETS:
+        raise DownloadError("Perfil ffmpeg no soportado")
+    digest = content_hash or hash_file(source_path)
+    identity = upload_media_identity(digest)
+    key = cache_key(f"media:{identity}", media_format)
+
+    def produce() -> Tuple[Path, Dict]:
+        preset = FFMPEG_PRESETS[media_format]
+        reserve_cache_budget(
+            key,
+            estimate_encoded_bytes(
+                source_path,
+                {},
+                int(preset.get("video_bitrate_kbps") or 0)
+                + int(preset.get("audio_bitrate_kbps") or 0),
+            ),
+        )
+        output_path = cache_file_path(f"{key}{preset['extension']}", create=True)
+        convert_uploaded_file_with_ffmpeg(source_path, media_format, output_path=output_path)
+        metadata: Dict[str, Any] = {
+            "title": title or "ffmpeg",
+            "filename": output_path.name,
+            "source_url": None,
+            "media_format": media_format,
+            "downloaded_at": time.time(),
+            "cache_key": key,
+            "media_identity": identity,
+        }
+        if preset.get("video_height"):
+            metadata["target_height"] = preset["video_height"]
+        if preset.get("video_bitrate_kbps"):
+            metadata["target_video_bitrate_kbps"] = preset["video_bitrate_kbps"]
+        if preset.get("audio_bitrate_kbps"):
+            metadata["target_audio_bitrate_kbps"] = preset["audio_bitrate_kbps"]
+        try:
+            metadata["filesize_bytes"] = output_path.stat().st_size
+        except OSError:
+            pass
+        metadata["_cache_hit"] = False
+        register_cache_entry(key, metadata, output_path)
+        return output_path, metadata
+
+    return coalesced_cache_fill(key, produce)
+
+
+def transcribe_local_file(
+    source_path: Path,
+    media_format: str,
+    transcription_model: Optional[str] = None,
+    diarize: bool = False,
+    content_hash: Optional[str] = None,
+    title: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Payload de transcripción de un archivo local, cacheado por el hash de su contenido.
+
+    Volver a subir el mismo archivo no vuelve a extraer el audio ni a llamar
+    al modelo; el formato final se renderiza con ``render_transcription_payload``.
+    """
+
+    normalized_format = normalize_media_format(media_format)
+    if normalized_format not in TRANSCRIPTION_FORMATS:
+        raise DownloadError("Formato de transcripción no soportado")
+    translation = is_translation_format(normalized_format)
+    effective_diarize = diarize or is_diarization_format(normalized_format)
+    selected_model = (
+        resolve_diarization_model(transcription_model)
+        if effective_diarize
+        else resolve_transcription_model(transcription_model)
+    )
+    digest = content_hash or hash_file(source_path)
+    identity = upload_media_identity(digest)
+
+    def fetch_audio() -> Tuple[Path, Dict[str, Any]]:
+        audio_path = extract_audio_profile_from_file(source_path, "audio_med")
+        return audio_path, {"title": title, "source_url": None, "media_identity": identity}
+
+    return load_transcription_payload(
+        f"media:{identity}",
+        selected_model,
+        effective_diarize,
+        translation,
+        fetch_audio=fetch_audio,
+        discard_audio=True,
+    )
 
 
 def generate_transcription_file_no_cache(
@@ -2222,35 +5813,641 @@ def generate_transcription_file_no_cache(
         encoding="utf-8",
     )
 
-    metadata = {
-        "title": audio_meta.get("title") or "transcript",
-        "filename": transcript_path.name,
-        "source_url": url,
-        "media_format": media_format,
-        "downloaded_at": time.time(),
-        "_no_cache": True,
-        "transcription_stats": transcription_stats,
-        "transcription_model": selected_model,
-        "diarization": bool(effective_diarize),
-        "translation": bool(translation),
-    }
-    metadata.update(
-        {
-            key: value
-            for key, value in audio_meta.items()
-            if key
-            in {
-                "audio_bitrate_kbps",
-                "filesize_bytes",
-                "format_id",
-            }
-        }
+    metadata = {
+        "title": audio_meta.get("title") or "transcript",
+        "filename": transcript_path.name,
+        "source_url": url,
+        "media_format": media_format,
+        "downloaded_at": time.time(),
+        "_no_cache": True,
+        "transcription_stats": transcription_stats,
+        "transcription_model": selected_model,
+        "diarization": bool(effective_diarize),
+        "translation": bool(translation),
+    }
+    metadata.update(
+        {
+            key: value
+            for key, value in audio_meta.items()
+            if key
+            in {
+                "audio_bitrate_kbps",
+                "filesize_bytes",
+                "format_id",
+            }
+        }
+    )
+    try:
+        metadata["filesize_bytes"] = transcript_path.stat().st_size
+    except OSError:
+        pass
+    return transcript_path, metadata
+
+
+JOB_ACTIVE_STATES = {"queued", "running"}
+JOBS: Dict[str, Dict[str, Any]] = {}
+JOBS_LOCK = threading.Lock()
+_JOB_CONTEXT = threading.local()
+_JOB_PROGRESS_SAVED: Dict[str, float] = {}
+_JOB_TASKS: set = set()
+# Trabajos que este worker está ejecutando: para el resto, el estado en disco
+# manda (otro worker puede haberlos reclamado y terminado).
+_RUNNING_JOBS: set = set()
+# Trabajos de lista en ejecución en este worker: sus entradas guardan aquí su
+# estado para que el trabajo padre lo persista.
+_PLAYLIST_PARENTS: Dict[str, Dict[str, Any]] = {}
+_JOB_SEMAPHORE: Optional[asyncio.Semaphore] = None
+# Orden de las instantáneas de cada trabajo: la asignada al tomarla (bajo
+# JOBS_LOCK) y la última escrita a disco, para no pisar una más reciente.
+_JOB_SNAPSHOT_SEQ: Dict[str, int] = {}
+_JOB_WRITTEN_SEQ: Dict[str, int] = {}
+_JOB_WRITE_LOCK = threading.Lock()
+# Bucle de eventos de los trabajos: los hilos de una lista lo usan para enviar
+# la extracción y cada entrada a REQUEST_SCHEDULER.
+_JOB_LOOP: Optional[asyncio.AbstractEventLoop] = None
+# Hilos de coordinación de las listas: solo esperan a sus entradas, el trabajo
+# pesado corre en los hilos del planificador.
+_PLAYLIST_COORDINATOR: Optional[ThreadPoolExecutor] = None
+
+
+def job_file_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def _valid_job_id(job_id: str) -> bool:
+    return bool(re.fullmatch(r"[0-9a-f]{32}", job_id or ""))
+
+
+def save_job(job: Dict[str, Any]) -> None:
+    """Persiste el estado del trabajo de forma atómica (lo leen otros workers).
+
+    Las entradas de una lista se guardan como parte de su trabajo padre.
+    """
+
+    parent_id = job.get("parent_id")
+    if parent_id:
+        job["updated_at"] = time.time()
+        entry = {
+            name: value
+            for name, value in json.loads(json.dumps(job, ensure_ascii=False)).items()
+            if name not in {"id", "parent_id"}
+        }
+        with JOBS_LOCK:
+            parent = _PLAYLIST_PARENTS.get(parent_id)
+            if parent is not None:
+                parent["entries"][entry["index"] - 1] = entry
+        if parent is not None:
+            save_job(parent)
+        return
+    with JOBS_LOCK:
+        # Instantánea, copia en JOBS y número de orden de una vez: las entradas
+        # de una lista guardan el mismo padre desde varios hilos.
+        job["updated_at"] = time.time()
+        snapshot = json.dumps(job, ensure_ascii=False)
+        JOBS[job["id"]] = json.loads(snapshot)
+        sequence = _JOB_SNAPSHOT_SEQ.get(job["id"], 0) + 1
+        _JOB_SNAPSHOT_SEQ[job["id"]] = sequence
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    path = job_file_path(job["id"])
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        temp_path.write_text(snapshot, encoding="utf-8")
+        with _JOB_WRITE_LOCK:
+            if _JOB_WRITTEN_SEQ.get(job["id"], 0) > sequence:
+                # Otro hilo ya escribió una instantánea posterior.
+                temp_path.unlink(missing_ok=True)
+                return
+            os.replace(temp_path, path)
+            _JOB_WRITTEN_SEQ[job["id"]] = sequence
+    except OSError as exc:
+        temp_path.unlink(missing_ok=True)
+        print(f"[vhs] No se pudo guardar el trabajo {job['id']}: {exc}", file=sys.stderr)
+
+
+def load_job(job_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Estado de un trabajo: de memoria si es de este worker, si no del disco."""
+
+    if not _valid_job_id(job_id):
+        return None
+    with JOBS_LOCK:
+        job = copy.deepcopy(JOBS.get(job_id))
+        running_here = job_id in _RUNNING_JOBS
+    if (
+        job is not None
+        and not refresh
+        and (job.get("status") not in JOB_ACTIVE_STATES or running_here)
+    ):
+        return job
+    try:
+        with job_file_path(job_id).open("r", encoding="utf-8") as handle:
+            stored = json.load(handle)
+    except (OSError, json.JSONDecodeError):
+        return job
+    if not isinstance(stored, dict):
+        return job
+    if job is not None and not running_here:
+        # La copia en memoria de un trabajo activo que no corre aquí puede
+        # haberse quedado atrás: se sustituye por la del disco.
+        with JOBS_LOCK:
+            if job_id not in _RUNNING_JOBS and float(stored.get("updated_at") or 0) >= float(
+                (JOBS.get(job_id) or {}).get("updated_at") or 0
+            ):
+                JOBS[job_id] = copy.deepcopy(stored)
+    return stored
+
+
+def job_fingerprint(params: Dict[str, Any]) -> str:
+    # Misma identidad canónica que las claves de caché: youtu.be/X y
+    # youtube.com/watch?v=X son el mismo trabajo. Una lista se identifica por
+    # su URL, ya que las reglas de identidad apuntan al vídeo.
+    if params.get("playlist"):
+        source_ref = normalize_source_url(params["url"])
+        playlist = f"::playlist={params.get('playlist_limit')}"
+    else:
+        source_ref = media_cache_ref(params["url"], allow_network=False)
+        playlist = ""
+    return cache_key(
+        f"{source_ref}::model={params.get('transcription_model') or ''}"
+        f"::diarize={int(bool(params.get('diarize')))}{playlist}",
+        params["media_format"],
+    )
+
+
+def find_active_job(fingerprint: str) -> Optional[Dict[str, Any]]:
+    with JOBS_LOCK:
+        candidates = [
+            job_id
+            for job_id, job in JOBS.items()
+            if job.get("fingerprint") == fingerprint and job.get("status") in JOB_ACTIVE_STATES
+        ]
+    for job_id in candidates:
+        # load_job vuelve a mirar el disco si otro worker se ha hecho cargo.
+        job = load_job(job_id)
+        if job and job.get("status") in JOB_ACTIVE_STATES:
+            return job
+    return None
+
+
+def create_job(
+    params: Dict[str, Any], source: str, client: str = "-"
+) -> Tuple[Dict[str, Any], bool]:
+    """Registra un trabajo nuevo o devuelve el activo con los mismos parámetros.
+
+    Así los reintentos de un cliente no multiplican el trabajo: reciben el
+    mismo identificador.
+    """
+
+    fingerprint = job_fingerprint(params)
+    existing = find_active_job(fingerprint)
+    if existing:
+        return existing, False
+    now = time.time()
+    job: Dict[str, Any] = {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "url": params["url"],
+        "media_format": params["media_format"],
+        "transcription_model": params.get("transcription_model"),
+        "diarize": bool(params.get("diarize")),
+        "source": source,
+        "client": client,
+        "fingerprint": fingerprint,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "stage": None,
+        "stages": [],
+        "progress": None,
+        "error": None,
+        "result": None,
+    }
+    if params.get("playlist"):
+        job.update(
+            playlist=True,
+            playlist_limit=params.get("playlist_limit") or PLAYLIST_MAX_ENTRIES,
+            playlist_title=None,
+            entries=[],
+        )
+    save_job(job)
+    return job, True
+
+
+def current_job() -> Optional[Dict[str, Any]]:
+    return getattr(_JOB_CONTEXT, "job", None)
+
+
+def report_job_progress(
+    job: Optional[Dict[str, Any]] = None, force: bool = False, **progress: Any
+) -> None:
+    """Actualiza el avance de la etapa en curso del trabajo.
+
+    Se puede llamar desde hilos auxiliares (hooks de yt-dlp) pasando el
+    trabajo; el estado solo se persiste cada JOB_PROGRESS_INTERVAL_SECONDS.
+    """
+
+    job = job or current_job()
+    if job is None:
+        return
+    job["progress"] = {"stage": job.get("stage"), **progress}
+    now = time.monotonic()
+    with JOBS_LOCK:
+        last_saved = _JOB_PROGRESS_SAVED.get(job["id"], 0.0)
+        if not force and now - last_saved < JOB_PROGRESS_INTERVAL_SECONDS:
+            return
+        _JOB_PROGRESS_SAVED[job["id"]] = now
+    save_job(job)
+
+
+def ytdlp_progress_hook(job: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    def hook(status: Dict[str, Any]) -> None:
+        if status.get("status") != "downloading":
+            return
+        downloaded = status.get("downloaded_bytes")
+        total = status.get("total_bytes") or status.get("total_bytes_estimate")
+        progress: Dict[str, Any] = {
+            "downloaded_bytes": downloaded,
+            "total_bytes": total,
+            "speed_bytes": status.get("speed"),
+            "eta_seconds": status.get("eta"),
+        }
+        if downloaded and total:
+            progress["percent"] = round(min(100.0, 100 * downloaded / total), 1)
+        elif status.get("fragment_count"):
+            progress["percent"] = round(
+                100 * (status.get("fragment_index") or 0) / status["fragment_count"], 1
+            )
+        report_job_progress(job, **progress)
+
+    return hook
+
+
+@contextmanager
+def job_stage(name: str) -> Iterator[None]:
+    """Anota el inicio y la duración de una etapa del trabajo en curso.
+
+    Fuera de un trabajo (peticiones síncronas) no hace nada.
+    """
+
+    job = getattr(_JOB_CONTEXT, "job", None)
+    if job is None:
+        yield
+        return
+    stage: Dict[str, Any] = {"name": name, "started_at": time.time(), "finished_at": None}
+    job["stages"].append(stage)
+    job["stage"] = name
+    job["progress"] = {"stage": name}
+    save_job(job)
+    try:
+        yield
+    finally:
+        stage["finished_at"] = time.time()
+        stage["duration_seconds"] = round(stage["finished_at"] - stage["started_at"], 3)
+        save_job(job)
+
+
+@contextmanager
+def _claim_job(job_id: str) -> Iterator[bool]:
+    """Bloqueo no bloqueante del trabajo: solo un worker lo ejecuta a la vez."""
+
+    if fcntl is None:
+        yield True
+        return
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    with (JOBS_DIR / f"{job_id}.lock").open("a+") as handle:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        yield True
+
+
+def run_job_item(job: Dict[str, Any], url: str) -> Dict[str, Any]:
+    """Ejecuta el pipeline de una URL con los parámetros del trabajo."""
+
+    file_path, metadata = run_media_pipeline(
+        url,
+        job["media_format"],
+        job.get("transcription_model"),
+        bool(job.get("diarize")),
+    )
+    record_download_event(
+        job["media_format"],
+        bool(metadata.get("_cache_hit")),
+        metadata.get("transcription_stats"),
+        job.get("source") or "api",
+        provider=metadata.get("extractor_key") or metadata.get("extractor"),
+    )
+    return {
+        "cache_key": metadata.get("cache_key"),
+        "title": metadata.get("title"),
+        "filename": file_path.name,
+        "filesize_bytes": metadata.get("filesize_bytes"),
+        "cache_hit": bool(metadata.get("_cache_hit")),
+    }
+
+
+def _run_playlist_entry(job: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Procesa una entrada de la lista con su propio estado de etapas y progreso."""
+
+    state = {
+        **entry,
+        "id": f"{job['id']}:{entry['index']}",
+        "parent_id": job["id"],
+        "status": "running",
+        "started_at": time.time(),
+    }
+    _JOB_CONTEXT.job = state
+    save_job(state)
+    try:
+        state.update(status="done", result=run_job_item(job, entry["url"]))
+    except Exception as exc:
+        if not isinstance(exc, DownloadError):
+            print(f"[vhs] Error en la entrada {state['id']}: {exc!r}", file=sys.stderr)
+        state.update(status="error", error=str(exc) if isinstance(exc, DownloadError) else "Error interno")
+        record_error_event("job", job.get("source") or "api")
+    finally:
+        _JOB_CONTEXT.job = None
+        with JOBS_LOCK:
+            _JOB_PROGRESS_SAVED.pop(state["id"], None)
+    state.update(finished_at=time.time(), stage=None, progress=None)
+    save_job(state)
+    return state
+
+
+def _submit_scheduled(
+    lane: str, client: str, func: Callable[..., Any], *args: Any
+) -> "Future[Any]":
+    """Envía ``func`` a REQUEST_SCHEDULER desde un hilo de trabajo."""
+
+    if _JOB_LOOP is None:
+        raise DownloadError("El planificador de trabajos no está activo")
+    return asyncio.run_coroutine_threadsafe(
+        REQUEST_SCHEDULER.run(lane, client, func, *args), _JOB_LOOP
+    )
+
+
+def run_playlist_entries(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrae la lista y procesa sus entradas en paralelo, cada una en su caché.
+
+    La extracción y cada entrada ocupan su propio turno de REQUEST_SCHEDULER
+    (con el carril y el cliente del trabajo), de modo que una lista no se
+    salta los límites de admisión ni el reparto entre clientes.
+    """
+
+    source = job.get("source") or "api"
+    client = job.get("client") or "-"
+    with job_stage("extract"):
+        info, found = _submit_scheduled(
+            scheduler_lane(source),
+            client,
+            extract_playlist_entries,
+            job["url"],
+            int(job.get("playlist_limit") or PLAYLIST_MAX_ENTRIES),
+        ).result()
+    job["playlist_title"] = info.get("title")
+    job["entries"] = [
+        {
+            **item,
+            "index": index,
+            "status": "queued",
+            "stage": None,
+            "stages": [],
+            "progress": None,
+            "error": None,
+            "result": None,
+        }
+        for index, item in enumerate(found, start=1)
+    ]
+    total = len(job["entries"])
+    with JOBS_LOCK:
+        _PLAYLIST_PARENTS[job["id"]] = job
+    try:
+        with job_stage("entries"):
+            report_job_progress(job, force=True, done=0, total=total, percent=0.0)
+            queued = iter(job["entries"])
+            pending: set = set()
+            done = 0
+            while True:
+                # Como mucho PLAYLIST_CONCURRENCY entradas en el planificador a la vez.
+                for entry in queued:
+                    cache_hit = cached_result_available(
+                        entry["url"],
+                        job["media_format"],
+                        job.get("transcription_model"),
+                        bool(job.get("diarize")),
+                    )
+                    pending.add(
+                        _submit_scheduled(
+                            scheduler_lane(source, cache_hit),
+                            client,
+                            _run_playlist_entry,
+                            job,
+                            entry,
+                        )
+                    )
+                    if len(pending) >= PLAYLIST_CONCURRENCY:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future.exception() is not None:
+                        print(
+                            f"[vhs] Entrada de {job['id']} no ejecutada: {future.exception()!r}",
+                            file=sys.stderr,
+                        )
+                done += len(finished)
+                report_job_progress(
+                    job,
+                    force=done == total,
+                    done=done,
+                    total=total,
+                    percent=round(100 * done / total, 1),
+                )
+    finally:
+        with JOBS_LOCK:
+            _PLAYLIST_PARENTS.pop(job["id"], None)
+
+    succeeded = [entry for entry in job["entries"] if entry.get("status") == "done"]
+    if not succeeded:
+        raise DownloadError("No se pudo procesar ninguna entrada de la lista")
+    return {
+        "title": job["playlist_title"],
+        "entries": total,
+        "succeeded": len(succeeded),
+        "failed": total - len(succeeded),
+        "cache_hits": sum(1 for entry in succeeded if (entry.get("result") or {}).get("cache_hit")),
+    }
+
+
+def execute_job(job_id: str) -> None:
+    with _claim_job(job_id) as claimed:
+        if not claimed:
+            return
+        job = load_job(job_id, refresh=True)
+        if job is None or job.get("status") not in JOB_ACTIVE_STATES:
+            if job is not None:
+                # Otro worker lo terminó mientras esperaba aquí en cola.
+                with JOBS_LOCK:
+                    JOBS[job_id] = copy.deepcopy(job)
+            return
+        with JOBS_LOCK:
+            _RUNNING_JOBS.add(job_id)
+        job.update(
+            status="running",
+            started_at=time.time(),
+            stage=None,
+            stages=[],
+            progress=None,
+            error=None,
+        )
+        save_job(job)
+        _JOB_CONTEXT.job = job
+        try:
+            if job.get("playlist"):
+                result = run_playlist_entries(job)
+            else:
+                result = run_job_item(job, job["url"])
+        except Exception as exc:
+            message = str(exc) if isinstance(exc, DownloadError) else "Error interno"
+            if not isinstance(exc, DownloadError):
+                print(f"[vhs] Error en el trabajo {job_id}: {exc!r}", file=sys.stderr)
+            job.update(status="error", error=message)
+            record_error_event("job", job.get("source") or "api")
+        else:
+            job.update(status="done", result=result)
+        finally:
+            _JOB_CONTEXT.job = None
+            with JOBS_LOCK:
+                _JOB_PROGRESS_SAVED.pop(job_id, None)
+        job["finished_at"] = time.time()
+        job["stage"] = None
+        job["progress"] = None
+        save_job(job)
+        with JOBS_LOCK:
+            _RUNNING_JOBS.discard(job_id)
+
+
+async def run_job(job_id: str) -> None:
+    global _JOB_SEMAPHORE, _JOB_LOOP, _PLAYLIST_COORDINATOR
+    if _JOB_SEMAPHORE is None:
+        _JOB_SEMAPHORE = asyncio.Semaphore(JOB_MAX_CONCURRENCY)
+    _JOB_LOOP = asyncio.get_running_loop()
+    async with _JOB_SEMAPHORE:
+        try:
+            job = await FILESYSTEM_POOL.run(load_job, job_id)
+            if not job:
+                return
+            if job.get("playlist"):
+                # La lista no ocupa turno: lo piden su extracción y sus entradas.
+                if _PLAYLIST_COORDINATOR is None:
+                    _PLAYLIST_COORDINATOR = ThreadPoolExecutor(
+                        max_workers=JOB_MAX_CONCURRENCY, thread_name_prefix="vhs-playlist"
+                    )
+                await _JOB_LOOP.run_in_executor(_PLAYLIST_COORDINATOR, execute_job, job_id)
+                return
+            cache_hit = await FILESYSTEM_POOL.run(
+                cached_result_available,
+                job["url"],
+                job["media_format"],
+                job.get("transcription_model"),
+                bool(job.get("diarize")),
+            )
+            await REQUEST_SCHEDULER.run(
+                scheduler_lane(job.get("source") or "api", cache_hit),
+                job.get("client") or "-",
+                execute_job,
+                job_id,
+            )
+        except Exception as exc:  # pragma: no cover - el trabajo ya registra sus errores
+            print(f"[vhs] Error ejecutando el trabajo {job_id}: {exc}", file=sys.stderr)
+
+
+def shutdown_job_executors() -> None:
+    global _PLAYLIST_COORDINATOR
+    if _PLAYLIST_COORDINATOR is not None:
+        _PLAYLIST_COORDINATOR.shutdown(wait=False)
+        _PLAYLIST_COORDINATOR = None
+
+
+def schedule_job(job_id: str) -> None:
+    task = asyncio.create_task(run_job(job_id))
+    _JOB_TASKS.add(task)
+    task.add_done_callback(_JOB_TASKS.discard)
+
+
+def _iter_stored_jobs() -> Iterator[Dict[str, Any]]:
+    if not JOBS_DIR.exists():
+        return
+    for path in JOBS_DIR.glob("*.json"):
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                job = json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if isinstance(job, dict) and _valid_job_id(str(job.get("id") or "")):
+            yield job
+
+
+async def resume_pending_jobs() -> int:
+    """Vuelve a encolar los trabajos que un reinicio dejó a medias.
+
+    Con varios workers todos lo intentan, pero el bloqueo de cada trabajo
+    garantiza que solo uno lo ejecuta.
+    """
+
+    pending = await run_in_threadpool(
+        lambda: [job for job in _iter_stored_jobs() if job.get("status") in JOB_ACTIVE_STATES]
     )
-    try:
-        metadata["filesize_bytes"] = transcript_path.stat().st_size
-    except OSError:
-        pass
-    return transcript_path, metadata
+    for job in pending:
+        schedule_job(job["id"])
+    return len(pending)
+
+
+def purge_finished_jobs(limit: Optional[int] = None) -> int:
+    """Olvida los trabajos terminados hace más de JOB_RETENTION_SECONDS."""
+
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with JOBS_LOCK:
+        for job_id in [
+            job_id
+            for job_id, job in JOBS.items()
+            if job.get("status") not in JOB_ACTIVE_STATES
+            and float(job.get("finished_at") or 0) <= cutoff
+        ]:
+            del JOBS[job_id]
+            _JOB_SNAPSHOT_SEQ.pop(job_id, None)
+            with _JOB_WRITE_LOCK:
+                _JOB_WRITTEN_SEQ.pop(job_id, None)
+    removed = 0
+    for job in list(_iter_stored_jobs()):
+        if limit is not None and removed >= limit:
+            break
+        if job.get("status") in JOB_ACTIVE_STATES or float(job.get("finished_at") or 0) > cutoff:
+            continue
+        job_file_path(job["id"]).unlink(missing_ok=True)
+        (JOBS_DIR / f"{job['id']}.lock").unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def job_status_payload(job: Dict[str, Any]) -> Dict[str, Any]:
+    data = {name: value for name, value in job.items() if name != "fingerprint"}
+    created_at = float(job.get("created_at") or 0)
+    started_at = job.get("started_at")
+    finished_at = job.get("finished_at")
+    data["queue_seconds"] = (
+        round(float(started_at) - created_at, 3) if started_at else None
+    )
+    data["total_seconds"] = (
+        round(float(finished_at) - created_at, 3) if finished_at else None
+    )
+    data["status_url"] = f"/api/jobs/{job['id']}"
+    data["result_url"] = (
+        f"/api/jobs/{job['id']}/result" if job.get("status") == "done" else None
+    )
+    return data
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -2309,7 +6506,9 @@ async def probe_endpoint(
     if not url:
         raise HTTPException(status_code=400, detail="Incluye una URL válida en el cuerpo")
     try:
-        info = await run_in_threadpool(probe_media, url)
+        info = await REQUEST_SCHEDULER.run(
+            "fast", request_client_id(request), probe_media, url
+        )
     except DownloadError as exc:
         await run_in_threadpool(
             record_error_event, "probe", detect_request_source(request)
@@ -2339,7 +6538,9 @@ async def search_endpoint(
             status_code=400, detail="La búsqueda debe tener al menos 3 caracteres"
         )
     try:
-        items = await run_in_threadpool(search_media, query, limit)
+        items = await REQUEST_SCHEDULER.run(
+            "fast", request_client_id(request), search_media, query, limit
+        )
     except DownloadError as exc:
         await run_in_threadpool(
             record_error_event, "search", detect_request_source(request)
@@ -2348,12 +6549,9 @@ async def search_endpoint(
     return {"query": query.strip(), "items": items, "services": SUPPORTED_SERVICES}
 
 
-@app.post("/api/download")
-async def download_endpoint(
-    request: Request,
-    payload: Dict[str, Any] = Body(..., description="JSON con url y format"),
-):
-    request.state.source = payload.get("source")
+def parse_download_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Valida el cuerpo de /api/download y /api/jobs y lo normaliza."""
+
     url = (payload.get("url") or "").strip()
     if not url:
         raise HTTPException(status_code=400, detail="Incluye una URL válida en el cuerpo")
@@ -2383,25 +6581,57 @@ async def download_endpoint(
                 resolve_transcription_model(transcription_model)
         except DownloadError as exc:
             raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {
+        "url": url,
+        "media_format": normalized_format,
+        "transcription_model": transcription_model,
+        "diarize": effective_diarize,
+    }
+
 
+def run_media_pipeline(
+    url: str,
+    normalized_format: str,
+    transcription_model: Optional[str] = None,
+    diarize: bool = False,
+) -> Tuple[Path, Dict]:
+    """Descarga, recodificación o transcripción según el formato pedido."""
+
+    ensure_storage_ready()
+    if normalized_format in TRANSCRIPTION_FORMATS:
+        return generate_transcription_file(
+            url, normalized_format, transcription_model, diarize
+        )
+    if normalized_format in FFMPEG_PRESETS:
+        return process_with_ffmpeg(url, normalized_format)
+    return download_media(url, normalized_format)
+
+
+@app.post("/api/download")
+async def download_endpoint(
+    request: Request,
+    payload: Dict[str, Any] = Body(..., description="JSON con url y format"),
+):
+    request.state.source = payload.get("source")
+    params = parse_download_payload(payload)
+    normalized_format = params["media_format"]
+    cache_hit = await FILESYSTEM_POOL.run(
+        cached_result_available,
+        params["url"],
+        normalized_format,
+        params["transcription_model"],
+        params["diarize"],
+    )
     try:
-        ensure_storage_ready()
-        if normalized_format in TRANSCRIPTION_FORMATS:
-            file_path, metadata = await run_in_threadpool(
-                generate_transcription_file,
-                url,
-                normalized_format,
-                transcription_model,
-                effective_diarize,
-            )
-        elif normalized_format in FFMPEG_PRESETS:
-            file_path, metadata = await run_in_threadpool(
-                process_with_ffmpeg, url, normalized_format
-            )
-        else:
-            file_path, metadata = await run_in_threadpool(
-                download_media, url, normalized_format
-            )
+        file_path, metadata = await REQUEST_SCHEDULER.run(
+            scheduler_lane(detect_request_source(request), cache_hit),
+            request_client_id(request),
+            run_media_pipeline,
+            params["url"],
+            normalized_format,
+            params["transcription_model"],
+            params["diarize"],
+        )
     except DownloadError as exc:
         await run_in_threadpool(
             record_error_event, "download", detect_request_source(request)
@@ -2428,6 +6658,60 @@ async def download_endpoint(
     return response
 
 
+async def stream_no_cache_response(
+    request: Request,
+    url: str,
+    normalized_format: str,
+    plan: Dict[str, Any],
+    info: Dict[str, Any],
+    tee_cache: bool,
+) -> StreamingResponse:
+    """Respuesta que reenvía los bytes según llegan, con copia opcional en caché.
+
+    El primer bloque se espera antes de responder para que un fallo de la
+    fuente siga devolviendo 502 en lugar de una descarga truncada.
+    """
+
+    tee_key, tee_metadata = (None, {})
+    if tee_cache:
+        tee_key, tee_metadata = await run_in_threadpool(
+            no_cache_tee_target, url, normalized_format, info
+        )
+    relay = MediaStreamRelay(plan, tee_key, tee_metadata).start()
+    try:
+        first_chunk = await run_in_threadpool(relay.read)
+    except BaseException:
+        relay.close()
+        raise
+
+    async def body() -> Any:
+        try:
+            chunk = first_chunk
+            while chunk:
+                yield chunk
+                chunk = await run_in_threadpool(relay.read)
+        finally:
+            relay.close()
+        # Solo cuenta como descarga si el streaming llegó al final.
+        await run_in_threadpool(
+            record_download_event,
+            normalized_format,
+            False,
+            None,
+            detect_request_source(request),
+            provider=info.get("extractor_key") or info.get("extractor"),
+        )
+
+    download_name = build_download_name(
+        plan["title"], Path(f"stream{plan['extension']}"), normalized_format
+    )
+    return StreamingResponse(
+        body(),
+        media_type=media_type_for_format(normalized_format),
+        headers={"Content-Disposition": build_content_disposition_header(download_name)},
+    )
+
+
 @app.post("/api/no-cache")
 async def no_cache_download_endpoint(
     request: Request,
@@ -2465,9 +6749,35 @@ async def no_cache_download_endpoint(
         except DownloadError as exc:
             raise HTTPException(status_code=400, detail=str(exc)) from exc
 
+    lane = scheduler_lane(detect_request_source(request))
+    client = request_client_id(request)
+    extracted_info: Optional[Dict[str, Any]] = None
+    if (
+        normalized_format in VIDEO_FORMAT_PROFILES or normalized_format in AUDIO_FORMAT_PROFILES
+    ) and parse_bool_flag(payload.get("stream", True)):
+        try:
+            plan, extracted_info = await REQUEST_SCHEDULER.run(
+                lane, client, plan_no_cache_stream, url, normalized_format
+            )
+            if plan:
+                return await stream_no_cache_response(
+                    request,
+                    url,
+                    normalized_format,
+                    plan,
+                    extracted_info,
+                    parse_bool_flag(payload.get("tee_cache")),
+                )
+        except DownloadError as exc:
+            await run_in_threadpool(
+                record_error_event, "download_no_cache", detect_request_source(request)
+            )
+            raise HTTPException(status_code=502, detail=str(exc)) from exc
     try:
         if normalized_format in TRANSCRIPTION_FORMATS:
-            file_path, metadata = await run_in_threadpool(
+            file_path, metadata = await REQUEST_SCHEDULER.run(
+                lane,
+                client,
                 generate_transcription_file_no_cache,
                 url,
                 normalized_format,
@@ -2475,12 +6785,12 @@ async def no_cache_download_endpoint(
                 effective_diarize,
             )
         elif normalized_format in FFMPEG_PRESETS:
-            file_path, metadata = await run_in_threadpool(
-                process_with_ffmpeg_no_cache, url, normalized_format
+            file_path, metadata = await REQUEST_SCHEDULER.run(
+                lane, client, process_with_ffmpeg_no_cache, url, normalized_format
             )
         else:
-            file_path, metadata = await run_in_threadpool(
-                download_media_no_cache, url, normalized_format
+            file_path, metadata = await REQUEST_SCHEDULER.run(
+                lane, client, download_media_no_cache, url, normalized_format, extracted_info
             )
     except DownloadError as exc:
         await run_in_threadpool(
@@ -2511,70 +6821,557 @@ async def no_cache_download_endpoint(
     return response
 
 
-@app.get("/api/cache", response_class=JSONResponse)
-async def cache_status() -> Dict:
-    purge_expired_entries()
-    entries: List[Dict[str, Any]] = []
-    total_bytes = 0
-    for meta_file in META_DIR.glob("*.json"):
-        with meta_file.open("r", encoding="utf-8") as handle:
-            data = json.load(handle)
-        if is_expired(data):
-            delete_cache_entry(meta_file.stem, data)
-            continue
-        key = data.get("cache_key") or meta_file.stem
-        filename = data.get("filename")
-        if not filename:
-            delete_cache_entry(key, data)
+async def iterate_in_filesystem_pool(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Recorre un iterador de bytes que lee de disco sin bloquear el bucle."""
+
+    while True:
+        chunk = await FILESYSTEM_POOL.run(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def parse_batch_payload(payload: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str, int]:
+    """Valida el cuerpo de /api/batch: elementos, tipo de archivo y paralelismo."""
+
+    raw_items = payload.get("items")
+    if not isinstance(raw_items, list) or not raw_items:
+        raise HTTPException(
+            status_code=400, detail="Incluye en items una lista de URLs o de objetos con url y format"
+        )
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Un lote admite como máximo {BATCH_MAX_ITEMS} elementos",
+        )
+    archive = str(payload.get("archive") or "zip").strip().lower()
+    if archive not in BATCH_ARCHIVE_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Archivo inválido. Usa uno de: " + ", ".join(sorted(BATCH_ARCHIVE_TYPES)) + ".",
+        )
+    try:
+        concurrency = int(payload.get("concurrency") or BATCH_CONCURRENCY)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="concurrency debe ser un entero") from exc
+    concurrency = min(BATCH_CONCURRENCY, max(1, concurrency))
+
+    # Los campos del cuerpo sirven de valor por defecto para cada elemento.
+    defaults = {
+        key: payload[key]
+        for key in ("format", "transcription_model", "diarize")
+        if payload.get(key) is not None
+    }
+    items: List[Dict[str, Any]] = []
+    for index, raw in enumerate(raw_items, start=1):
+        if isinstance(raw, str):
+            raw = {"url": raw}
+        if not isinstance(raw, dict):
+            raise HTTPException(
+                status_code=400, detail=f"Elemento {index}: debe ser una URL o un objeto"
+            )
+        try:
+            params = parse_download_payload({**defaults, **raw})
+        except HTTPException as exc:
+            raise HTTPException(
+                status_code=400, detail=f"Elemento {index}: {exc.detail}"
+            ) from exc
+        items.append({"index": index, **params})
+    return items, archive, concurrency
+
+
+@app.post("/api/batch")
+async def batch_download_endpoint(
+    request: Request,
+    payload: Dict[str, Any] = Body(..., description="JSON con items (url y format) y archive"),
+):
+    """Descarga varias URLs por la caché y las devuelve en un ZIP o TAR en streaming.
+
+    Los aciertos de caché entran en el archivo en cuanto empieza la respuesta;
+    el resto se descarga con un paralelismo acotado y se añade según termina.
+    ``manifest.json`` cierra el archivo con el estado de cada elemento.
+    """
+
+    request.state.source = payload.get("source")
+    items, archive, concurrency = parse_batch_payload(payload)
+    source = detect_request_source(request)
+    client = request_client_id(request)
+    cache_hits = await FILESYSTEM_POOL.run(
+        lambda: [
+            cached_result_available(
+                item["url"], item["media_format"], item["transcription_model"], item["diarize"]
+            )
+            for item in items
+        ]
+    )
+    index_width = len(str(len(items)))
+
+    async def run_item(
+        item: Dict[str, Any],
+        cache_hit: bool,
+        limit: asyncio.Semaphore,
+        results: "asyncio.Queue[Tuple[Dict[str, Any], Optional[Path], Dict]]",
+    ) -> None:
+        entry: Dict[str, Any] = {
+            "index": item["index"],
+            "url": item["url"],
+            "format": item["media_format"],
+        }
+        started = time.monotonic()
+        file_path: Optional[Path] = None
+        metadata: Dict = {}
+        try:
+            if cache_hit:
+                file_path, metadata = await REQUEST_SCHEDULER.run(
+                    scheduler_lane(source, True),
+                    client,
+                    run_media_pipeline,
+                    item["url"],
+                    item["media_format"],
+                    item["transcription_model"],
+                    item["diarize"],
+                )
+            else:
+                async with limit:
+                    file_path, metadata = await REQUEST_SCHEDULER.run(
+                        scheduler_lane(source, False),
+                        client,
+                        run_media_pipeline,
+                        item["url"],
+                        item["media_format"],
+                        item["transcription_model"],
+                        item["diarize"],
+                    )
+            entry.update(
+                status="ok",
+                cache_hit=bool(metadata.get("_cache_hit")),
+                cache_key=metadata.get("cache_key"),
+                title=metadata.get("title"),
+            )
+        except DownloadError as exc:
+            entry.update(status="error", error=str(exc))
+        except Exception as exc:  # pragma: no cover - un elemento no tumba el lote
+            entry.update(status="error", error=f"Error inesperado: {exc}")
+        entry["seconds"] = round(time.monotonic() - started, 3)
+        await results.put((entry, file_path, metadata))
+
+    async def body() -> AsyncIterator[bytes]:
+        writer = StreamingArchiveWriter(archive)
+        limit = asyncio.Semaphore(concurrency)
+        results: "asyncio.Queue[Tuple[Dict[str, Any], Optional[Path], Dict]]" = asyncio.Queue()
+        # Primero los aciertos de caché: no esperan al semáforo y salen enseguida.
+        ordered = sorted(zip(items, cache_hits), key=lambda pair: not pair[1])
+        tasks = [
+            asyncio.create_task(run_item(item, hit, limit, results)) for item, hit in ordered
+        ]
+        manifest: List[Dict[str, Any]] = []
+        try:
+            for _ in range(len(items)):
+                entry, file_path, metadata = await results.get()
+                manifest.append(entry)
+                if file_path is None:
+                    await run_in_threadpool(record_error_event, "download", source)
+                    continue
+                name = (
+                    f"{entry['index']:0{index_width}d}_"
+                    + build_download_name(
+                        metadata.get("title", "vhs"), file_path, entry["format"]
+                    )
+                )
+                try:
+                    handle = await FILESYSTEM_POOL.run(file_path.open, "rb")
+                except OSError:
+                    entry.update(status="error", error="La entrada ha salido de la caché")
+                    continue
+                try:
+                    stat = os.fstat(handle.fileno())
+                    entry.update(file=name, size_bytes=stat.st_size)
+                    async for chunk in iterate_in_filesystem_pool(
+                        writer.add_file(name, handle, stat.st_size, stat.st_mtime)
+                    ):
+                        yield chunk
+                finally:
+                    handle.close()
+                await run_in_threadpool(
+                    record_download_event,
+                    entry["format"],
+                    entry["cache_hit"],
+                    metadata.get("transcription_stats"),
+                    source,
+                    provider=metadata.get("extractor_key") or metadata.get("extractor"),
+                )
+
+            manifest.sort(key=lambda item: item["index"])
+            succeeded = sum(1 for item in manifest if item["status"] == "ok")
+            document = {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "archive": archive,
+                "total": len(manifest),
+                "succeeded": succeeded,
+                "failed": len(manifest) - succeeded,
+                "cache_hits": sum(1 for item in manifest if item.get("cache_hit")),
+                "items": manifest,
+            }
+            encoded = json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8")
+            for chunk in writer.add_bytes("manifest.json", encoded):
+                yield chunk
+            for chunk in writer.close():
+                yield chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    archive_name = f"vhs-batch-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{archive}"
+    return StreamingResponse(
+        body(),
+        media_type=BATCH_ARCHIVE_TYPES[archive],
+        headers={
+            "Content-Disposition": build_content_disposition_header(archive_name),
+            "X-VHS-Batch-Items": str(len(items)),
+        },
+    )
+
+
+@app.post("/api/jobs", response_class=JSONResponse, status_code=202)
+async def create_job_endpoint(
+    request: Request,
+    payload: Dict[str, Any] = Body(..., description="JSON con url y format"),
+):
+    request.state.source = payload.get("source")
+    params = parse_download_payload(payload)
+    if parse_bool_flag(payload.get("playlist")):
+        try:
+            limit = int(payload.get("playlist_limit") or PLAYLIST_MAX_ENTRIES)
+        except (TypeError, ValueError) as exc:
+            raise HTTPException(status_code=400, detail="playlist_limit debe ser un entero") from exc
+        params.update(playlist=True, playlist_limit=min(PLAYLIST_MAX_ENTRIES, max(1, limit)))
+    try:
+        ensure_storage_ready()
+    except DownloadError as exc:
+        raise HTTPException(status_code=502, detail=str(exc)) from exc
+    job, created = await run_in_threadpool(
+        create_job, params, detect_request_source(request), request_client_id(request)
+    )
+    if created:
+        schedule_job(job["id"])
+    return job_status_payload(job)
+
+
+@app.get("/api/jobs/{job_id}", response_class=JSONResponse)
+async def job_status_endpoint(job_id: str):
+    job = await FILESYSTEM_POOL.run(load_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job_status_payload(job)
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events_endpoint(request: Request, job_id: str):
+    """Server-Sent Events con el estado del trabajo hasta que termina.
+
+    Cada cambio se envía como evento ``progress`` y el último como ``done`` o
+    ``error``; el cuerpo es el mismo JSON que ``GET /api/jobs/{id}``.
+    """
+
+    if not await FILESYSTEM_POOL.run(load_job, job_id):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    async def stream() -> Any:
+        last_update = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            job = await FILESYSTEM_POOL.run(load_job, job_id)
+            if not job:
+                return
+            status = job.get("status")
+            if job.get("updated_at") != last_update:
+                last_update = job.get("updated_at")
+                last_sent = time.monotonic()
+                event = status if status in {"done", "error"} else "progress"
+                data = json.dumps(job_status_payload(job), ensure_ascii=False)
+                yield f"event: {event}\ndata: {data}\n\n"
+                if event != "progress":
+                    return
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(JOB_PROGRESS_INTERVAL_SECONDS)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def playlist_archive_chunks(job: Dict[str, Any], archive: str) -> Iterator[bytes]:
+    """ZIP/TAR con las entradas de una lista que siguen en caché y su manifiesto."""
+
+    writer = StreamingArchiveWriter(archive)
+    entries = job.get("entries") or []
+    index_width = len(str(len(entries)))
+    manifest: List[Dict[str, Any]] = []
+    for entry in entries:
+        item: Dict[str, Any] = {
+            "index": entry.get("index"),
+            "url": entry.get("url"),
+            "title": entry.get("title"),
+            "status": "ok" if entry.get("status") == "done" else "error",
+            "error": entry.get("error"),
+        }
+        manifest.append(item)
+        result = entry.get("result") or {}
+        if entry.get("status") != "done" or not result.get("cache_key"):
             continue
-        file_path = CACHE_DIR / filename
-        if not file_path.exists():
-            delete_cache_entry(key, data)
+        item.update(cache_key=result["cache_key"], cache_hit=result.get("cache_hit"))
+        file_path, metadata = fetch_cached_file(result["cache_key"])
+        handle = None
+        if file_path and metadata:
+            try:
+                handle = file_path.open("rb")
+            except OSError:
+                handle = None
+        if handle is None:
+            item.update(status="expired", error="La entrada ya no está en caché")
             continue
-        downloaded_at = float(data.get("downloaded_at") or 0)
-        age_seconds = max(0, int(time.time() - downloaded_at))
-        size = file_path.stat().st_size
-        total_bytes += size
-        iso_timestamp = (
-            datetime.fromtimestamp(downloaded_at, tz=timezone.utc).isoformat()
-            if downloaded_at
-            else None
+        with handle:
+            stat = os.fstat(handle.fileno())
+            name = f"{item['index']:0{index_width}d}_" + build_download_name(
+                metadata.get("title") or entry.get("title") or "vhs",
+                file_path,
+                job["media_format"],
+            )
+            item.update(file=name, size_bytes=stat.st_size)
+            yield from writer.add_file(name, handle, stat.st_size, stat.st_mtime)
+    document = {
+        "title": job.get("playlist_title"),
+        "url": job.get("url"),
+        "format": job.get("media_format"),
+        "archive": archive,
+        "total": len(manifest),
+        "succeeded": sum(1 for item in manifest if item["status"] == "ok"),
+        "items": manifest,
+    }
+    yield from writer.add_bytes(
+        "manifest.json", json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8")
+    )
+    yield from writer.close()
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def job_result_endpoint(
+    job_id: str,
+    archive: str = Query("zip", description="zip o tar (solo trabajos de lista)"),
+):
+    job = await FILESYSTEM_POOL.run(load_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if job.get("status") == "error":
+        raise HTTPException(status_code=502, detail=job.get("error") or "El trabajo falló")
+    if job.get("status") != "done":
+        raise HTTPException(status_code=409, detail="El trabajo aún no ha terminado")
+    if job.get("playlist"):
+        archive = archive.strip().lower()
+        if archive not in BATCH_ARCHIVE_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail="Archivo inválido. Usa uno de: " + ", ".join(sorted(BATCH_ARCHIVE_TYPES)) + ".",
+            )
+        archive_name = build_download_name(
+            job.get("playlist_title") or "vhs-playlist", Path(f"lista.{archive}"), archive
         )
-        entries.append(
-            {
-                "cache_key": key,
-                "title": data.get("title") or "descarga",
-                "media_format": data.get("media_format"),
-                "source_url": data.get("source_url"),
-                "filename": filename,
-                "filesize_bytes": size,
-                "width": data.get("width"),
-                "height": data.get("height") or data.get("target_height"),
-                "video_bitrate_kbps": data.get("video_bitrate_kbps")
-                or data.get("target_video_bitrate_kbps"),
-                "audio_bitrate_kbps": data.get("audio_bitrate_kbps")
-                or data.get("target_audio_bitrate_kbps"),
-                "format_id": data.get("format_id"),
-                "age_seconds": age_seconds,
-                "downloaded_at": downloaded_at,
-                "downloaded_at_iso": iso_timestamp,
-                "download_url": f"/api/cache/{key}/download",
-                "delete_url": f"/api/cache/{key}",
-            }
+        return StreamingResponse(
+            iterate_in_filesystem_pool(playlist_archive_chunks(job, archive)),
+            media_type=BATCH_ARCHIVE_TYPES[archive],
+            headers={"Content-Disposition": build_content_disposition_header(archive_name)},
+        )
+    result = job.get("result") or {}
+    file_path, metadata = (None, None)
+    if result.get("cache_key"):
+        file_path, metadata = await FILESYSTEM_POOL.run(fetch_cached_file, result["cache_key"])
+    if not file_path or not metadata:
+        raise HTTPException(
+            status_code=410,
+            detail="El resultado ya no está en caché; crea un trabajo nuevo",
         )
+    media_format = metadata.get("media_format") or job["media_format"]
+    return FileResponse(
+        path=file_path,
+        filename=build_download_name(metadata.get("title", "vhs"), file_path, media_format),
+        media_type=media_type_for_format(media_format),
+    )
 
-    entries.sort(key=lambda item: item.get("downloaded_at", 0), reverse=True)
+
+CACHE_LIST_DEFAULT_LIMIT = 100
+CACHE_LIST_MAX_LIMIT = 500
+
+
+def _encode_cache_cursor(sort: str, descending: bool, after: Tuple[Any, str]) -> str:
+    raw = json.dumps({"s": sort, "d": descending, "v": after[0], "k": after[1]})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cache_cursor(cursor: str, sort: str, descending: bool) -> Tuple[Any, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if data["s"] != sort or bool(data["d"]) != descending:
+            raise ValueError("orden distinto")
+        return data["v"], str(data["k"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(
+            status_code=400, detail="Cursor inválido para este orden del listado"
+        ) from exc
+
+
+def _split_csv(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def build_cache_filters(
+    media_format: Optional[str] = None,
+    category: Optional[str] = None,
+    min_age_seconds: Optional[float] = None,
+    max_age_seconds: Optional[float] = None,
+    min_size_bytes: Optional[int] = None,
+    max_size_bytes: Optional[int] = None,
+    title: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Traduce los parámetros de ``GET /api/cache`` al filtro del catálogo."""
+
+    media_formats: Optional[set] = None
+    requested_formats = _split_csv(media_format)
+    if requested_formats:
+        media_formats = {normalize_media_format(item) for item in requested_formats}
+    categories = set(_split_csv(category))
+    if categories:
+        in_categories = {
+            name for name in FORMAT_EXTENSIONS if categorize_media_format(name) in categories
+        }
+        media_formats = in_categories if media_formats is None else media_formats & in_categories
+    now = time.time()
+    return {
+        "media_formats": media_formats,
+        # Edad mínima = descargado antes de; edad máxima = descargado después de.
+        "downloaded_before": now - min_age_seconds if min_age_seconds is not None else None,
+        "downloaded_after": now - max_age_seconds if max_age_seconds is not None else None,
+        "min_size": min_size_bytes,
+        "max_size": max_size_bytes,
+        "title": (title or "").strip() or None,
+    }
+
+
+def _cache_listing_item(data: Dict[str, Any], now: float) -> Dict[str, Any]:
+    key = data["cache_key"]
+    downloaded_at = float(data.get("downloaded_at") or 0)
+    iso_timestamp = (
+        datetime.fromtimestamp(downloaded_at, tz=timezone.utc).isoformat()
+        if downloaded_at
+        else None
+    )
+    return {
+        "cache_key": key,
+        "title": data.get("title") or "descarga",
+        "media_format": data.get("media_format"),
+        "category": categorize_media_format(data.get("media_format") or "video"),
+        "source_url": data.get("source_url"),
+        "filename": data.get("filename"),
+        "filesize_bytes": int(data.get("filesize_bytes") or 0),
+        "width": data.get("width"),
+        "height": data.get("height") or data.get("target_height"),
+        "video_bitrate_kbps": data.get("video_bitrate_kbps")
+        or data.get("target_video_bitrate_kbps"),
+        "audio_bitrate_kbps": data.get("audio_bitrate_kbps")
+        or data.get("target_audio_bitrate_kbps"),
+        "format_id": data.get("format_id"),
+        "pinned": bool(data.get("pinned")),
+        "access_count": int(data.get("access_count") or 0),
+        "last_accessed_at": data.get("last_accessed_at"),
+        "age_seconds": max(0, int(now - downloaded_at)),
+        "downloaded_at": downloaded_at,
+        "downloaded_at_iso": iso_timestamp,
+        "download_url": f"/api/cache/{key}/download",
+        "delete_url": f"/api/cache/{key}",
+    }
+
+
+def list_cache_entries(
+    filters: Dict[str, Any],
+    sort: str = "downloaded_at",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = CACHE_LIST_DEFAULT_LIMIT,
+) -> Dict[str, Any]:
+    """Página del listado de la caché servida desde el catálogo, sin tocar disco.
+
+    Los tamaños salen de ``filesize_bytes``; las entradas cuyo archivo haya
+    desaparecido se limpian al acceder a ellas o con el barrido periódico.
+    """
+
+    if sort not in CACHE_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Orden no soportado. Usa uno de: {', '.join(CACHE_SORT_FIELDS)}",
+        )
+    descending = order.lower() != "asc"
+    limit = max(1, min(int(limit), CACHE_LIST_MAX_LIMIT))
+    after = _decode_cache_cursor(cursor, sort, descending) if cursor else None
+    items, next_after, aggregates = CACHE_CATALOG.query_entries(
+        filters, sort=sort, descending=descending, after=after, limit=limit
+    )
+    now = time.time()
+    catalog_stats = CACHE_CATALOG.stats()
     return {
-        "items": entries,
+        "items": [_cache_listing_item(data, now) for data in items],
+        "next_cursor": _encode_cache_cursor(sort, descending, next_after) if next_after else None,
+        "sort": sort,
+        "order": "desc" if descending else "asc",
+        "limit": limit,
+        "total_count": aggregates["count"],
+        "total_bytes": aggregates["total_bytes"],
+        "catalog_entries": catalog_stats.get("entries"),
+        "catalog_bytes": catalog_stats.get("total_bytes"),
         "ttl_seconds": CACHE_TTL_SECONDS,
-        "total_bytes": total_bytes,
+        "max_bytes": CACHE_MAX_BYTES or None,
+        "eviction_policy": CACHE_EVICTION_POLICY,
+        "eviction": {
+            name: value
+            for name, value in CACHE_CATALOG.counters().items()
+            if not name.startswith("negative_")
+        },
+        "catalog": CACHE_CATALOG.backend,
     }
 
 
+@app.get("/api/cache", response_class=JSONResponse)
+async def cache_status(
+    media_format: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    min_age_seconds: Optional[float] = Query(None, ge=0),
+    max_age_seconds: Optional[float] = Query(None, ge=0),
+    min_size_bytes: Optional[int] = Query(None, ge=0),
+    max_size_bytes: Optional[int] = Query(None, ge=0),
+    title: Optional[str] = Query(None),
+    sort: str = Query("downloaded_at"),
+    order: str = Query("desc"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(CACHE_LIST_DEFAULT_LIMIT, ge=1),
+) -> Dict:
+    filters = build_cache_filters(
+        media_format=media_format,
+        category=category,
+        min_age_seconds=min_age_seconds,
+        max_age_seconds=max_age_seconds,
+        min_size_bytes=min_size_bytes,
+        max_size_bytes=max_size_bytes,
+        title=title,
+    )
+    return await FILESYSTEM_POOL.run(list_cache_entries, filters, sort, order, cursor, limit)
+
+
 @app.get("/api/cache/{cache_key}/download")
 async def download_cached_entry(request: Request, cache_key: str):
-    purge_expired_entries()
-    file_path, metadata = fetch_cached_file(cache_key)
+    file_path, metadata = await FILESYSTEM_POOL.run(fetch_cached_file, cache_key)
     if not file_path or not metadata:
         raise HTTPException(status_code=404, detail="Entrada de caché no disponible")
 
@@ -2600,17 +7397,49 @@ async def download_cached_entry(request: Request, cache_key: str):
 
 @app.delete("/api/cache/{cache_key}", response_class=JSONResponse)
 async def remove_cached_entry(cache_key: str) -> Dict[str, Any]:
-    purge_expired_entries()
-    metadata = load_meta(cache_key)
+    metadata = await FILESYSTEM_POOL.run(load_meta, cache_key)
     if not metadata:
         raise HTTPException(status_code=404, detail="Entrada de caché no disponible")
-    await run_in_threadpool(delete_cache_entry, cache_key, metadata)
+    await FILESYSTEM_POOL.run(delete_cache_entry, cache_key, metadata)
     return {"status": "deleted", "cache_key": cache_key}
 
 
+@app.post("/api/cache/{cache_key}/pin", response_class=JSONResponse)
+async def pin_cached_entry(cache_key: str) -> Dict[str, Any]:
+    metadata = await FILESYSTEM_POOL.run(set_cache_entry_pinned, cache_key, True)
+    if not metadata:
+        raise HTTPException(status_code=404, detail="Entrada de caché no disponible")
+    return {"status": "pinned", "cache_key": cache_key}
+
+
+@app.delete("/api/cache/{cache_key}/pin", response_class=JSONResponse)
+async def unpin_cached_entry(cache_key: str) -> Dict[str, Any]:
+    metadata = await FILESYSTEM_POOL.run(set_cache_entry_pinned, cache_key, False)
+    if not metadata:
+        raise HTTPException(status_code=404, detail="Entrada de caché no disponible")
+    return {"status": "unpinned", "cache_key": cache_key}
+
+
 @app.get("/api/stats/usage", response_class=JSONResponse)
 async def usage_stats() -> Dict[str, Any]:
-    return summarize_usage()
+    return {
+        **(await FILESYSTEM_POOL.run(summarize_usage)),
+        "negative_cache": negative_cache_stats(),
+        "lookup_cache": {
+            "probe": PROBE_CACHE.stats(),
+            "search": SEARCH_CACHE.stats(),
+            "info_dict": INFO_CACHE.stats(),
+        },
+    }
+
+
+@app.get("/api/stats/pools", response_class=JSONResponse)
+async def resource_pool_stats() -> Dict[str, Any]:
+    return {
+        "pools": {name: pool.stats() for name, pool in RESOURCE_POOLS.items()},
+        "scheduler": REQUEST_SCHEDULER.stats(),
+        "ytdlp": YTDLP_POOL.stats(),
+    }
 
 
 @app.post("/api/ffmpeg/upload")
@@ -2636,9 +7465,15 @@ async def ffmpeg_upload(
     temp_path: Optional[Path] = None
     try:
         ensure_storage_ready()
-        temp_path = await save_upload_file(file)
-        output_path = await run_in_threadpool(
-            convert_uploaded_file_with_ffmpeg, temp_path, format_value
+        temp_path, content_hash = await save_upload_file(file)
+        output_path, metadata = await REQUEST_SCHEDULER.run(
+            scheduler_lane(detect_request_source(request)),
+            request_client_id(request),
+            convert_local_file,
+            temp_path,
+            format_value,
+            content_hash,
+            Path(file.filename).stem,
         )
     except DownloadError as exc:
         await run_in_threadpool(
@@ -2650,7 +7485,6 @@ async def ffmpeg_upload(
             cleanup_path(temp_path)
 
     download_name = build_download_name(file.filename or "ffmpeg", output_path, format_value)
-    background_tasks.add_task(cleanup_path, output_path)
     response = FileResponse(
         path=output_path,
         media_type=media_type_for_format(format_value),
@@ -2660,7 +7494,7 @@ async def ffmpeg_upload(
     await run_in_threadpool(
         record_download_event,
         format_value,
-        False,
+        bool(metadata.get("_cache_hit")),
         None,
         detect_request_source(request),
     )
@@ -2678,7 +7512,6 @@ async def transcribe_upload(
     format_value = media_format.lower()
     requested_diarize = parse_bool_flag(diarize)
     effective_diarize = requested_diarize or is_diarization_format(format_value)
-    translation_enabled = is_translation_format(format_value)
     requested_model = (transcription_model or "").strip() or None
     if format_value not in TRANSCRIPTION_FORMATS:
         raise HTTPException(
@@ -2698,28 +7531,18 @@ async def transcribe_upload(
     temp_path: Optional[Path] = None
     try:
         ensure_storage_ready()
-        temp_path = await save_upload_file(file)
-        audio_path = await run_in_threadpool(
-            extract_audio_profile_from_file, temp_path, "audio_med"
+        temp_path, content_hash = await save_upload_file(file)
+        payload, payload_meta = await REQUEST_SCHEDULER.run(
+            scheduler_lane(detect_request_source(request)),
+            request_client_id(request),
+            transcribe_local_file,
+            temp_path,
+            format_value,
+            requested_model,
+            effective_diarize,
+            content_hash,
+            Path(file.filename).stem,
         )
-        try:
-            payload = await run_in_threadpool(
-                transcribe_audio_file,
-                audio_path,
-                format_value,
-                requested_model,
-                effective_diarize,
-            )
-            if translation_enabled:
-                payload = await run_in_threadpool(
-                    translate_transcription_payload,
-                    payload,
-                )
-        finally:
-            try:
-                audio_path.unlink(missing_ok=True)
-            except OSError:
-                pass
     except DownloadError as exc:
         await run_in_threadpool(
             record_error_event, "transcription_upload", detect_request_source(request)
@@ -2744,7 +7567,7 @@ async def transcribe_upload(
     await run_in_threadpool(
         record_download_event,
         format_value,
-        False,
+        bool(payload_meta.get("_cache_hit")),
         transcription_stats,
         detect_request_source(request),
     )